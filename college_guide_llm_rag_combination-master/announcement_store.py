@@ -0,0 +1,208 @@
+"""
+Persistent store of the announcement emails, filled incrementally over IMAP.
+
+read_announcements used to log in, download every "announcements" email with
+its full body, rewrite static/announcements.txt and then keep only the last
+few. Now the emails live in a small WAL-mode sqlite database, keyed by their
+IMAP UID, along with the highest UID seen so far (the watermark) and the
+folder's UIDVALIDITY:
+
+- refresh() searches only for UIDs above the watermark and bulk-fetches just
+  the new emails, without marking them as seen;
+- the mailbox is checked at most every ANNOUNCEMENT_REFRESH_INTERVAL seconds,
+  shared by every worker through the database, so reading the latest
+  announcements in between costs no IMAP round trip at all;
+- if UIDVALIDITY changes the stored emails are replaced by a full fetch;
+- when the mailbox cannot be read, the next check waits, doubling from
+  ANNOUNCEMENT_REFRESH_INTERVAL up to RETRY_MAX_INTERVAL, so an unreachable
+  Gmail does not cost every request an IMAP login timeout.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+import telemetry
+
+ANNOUNCEMENT_DB = os.getenv("ANNOUNCEMENT_DB", "static/announcements.db")
+ANNOUNCEMENT_REFRESH_INTERVAL = int(os.getenv("ANNOUNCEMENT_REFRESH_INTERVAL", "60"))
+BUSY_TIMEOUT = 30
+# the longest wait after failed mailbox checks before the next one
+RETRY_MAX_INTERVAL = 15 * 60
+
+_local = threading.local()
+_refresh_lock = threading.Lock()
+# db_path -> (consecutive failed checks, time of the last one)
+_failures = {}
+
+
+def _connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS announcements ("
+        " uid INTEGER PRIMARY KEY,"
+        " date TEXT NOT NULL,"
+        " content TEXT NOT NULL)"
+    )
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    return conn
+
+
+def get_connection(db_path=ANNOUNCEMENT_DB):
+    """Returns this thread's connection to the store (one per thread and process, as in link_store)."""
+    connections = getattr(_local, "connections", None)
+    if connections is None or _local.pid != os.getpid():
+        connections = _local.connections = {}
+        _local.pid = os.getpid()
+    conn = connections.get(db_path)
+    if conn is None:
+        conn = connections[db_path] = _connect(db_path)
+    return conn
+
+
+def _meta(conn):
+    return dict(conn.execute("SELECT key, value FROM meta").fetchall())
+
+
+def watermark(db_path=ANNOUNCEMENT_DB):
+    """
+    Returns:
+        tuple[int | None, int]: (the UIDVALIDITY the stored UIDs belong to, the highest stored UID)
+    """
+    meta = _meta(get_connection(db_path))
+    validity = meta.get("uid_validity")
+    return (int(validity) if validity else None), int(meta.get("last_uid") or 0)
+
+
+def add(validity, emails, db_path=ANNOUNCEMENT_DB, last_uid=0):
+    """
+    Stores newly fetched emails and moves the watermark, in one transaction.
+
+    Args:
+        validity (int): The folder's UIDVALIDITY when the emails were fetched.
+        emails (list[dict]): {"uid", "date", "content"} dicts.
+        db_path (str): The database file.
+        last_uid (int): The highest UID searched, which may belong to an email
+            that was skipped for having no text.
+
+    Returns:
+        int: The number of emails added.
+    """
+    conn = get_connection(db_path)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        meta = _meta(conn)
+        if meta.get("uid_validity") != str(validity):
+            # the old UIDs no longer refer to the same messages
+            conn.execute("DELETE FROM announcements")
+            meta["last_uid"] = "0"
+        before = conn.total_changes
+        conn.executemany(
+            "INSERT OR IGNORE INTO announcements (uid, date, content) VALUES (?, ?, ?)",
+            [(email["uid"], email["date"], email["content"]) for email in emails],
+        )
+        added = conn.total_changes - before
+        last_uid = max([int(meta.get("last_uid") or 0), last_uid] + [email["uid"] for email in emails])
+        conn.executemany(
+            "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+            [("uid_validity", str(validity)), ("last_uid", str(last_uid)), ("last_checked", str(time.time()))],
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return added
+
+
+def _mark_checked(db_path):
+    get_connection(db_path).execute(
+        "INSERT INTO meta (key, value) VALUES ('last_checked', ?) "
+        "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+        (str(time.time()),),
+    )
+
+
+def is_fresh(max_age=ANNOUNCEMENT_REFRESH_INTERVAL, db_path=ANNOUNCEMENT_DB):
+    """True if the mailbox was checked less than max_age seconds ago, by any worker."""
+    last_checked = _meta(get_connection(db_path)).get("last_checked")
+    return last_checked is not None and time.time() - float(last_checked) < max_age
+
+
+def _retry_wait(failures):
+    return min(ANNOUNCEMENT_REFRESH_INTERVAL * 2 ** (failures - 1), RETRY_MAX_INTERVAL)
+
+
+def _backing_off(db_path):
+    """True while the last failed mailbox check is too recent to try again."""
+    failures, last = _failures.get(db_path, (0, 0.0))
+    return failures > 0 and time.time() - last < _retry_wait(failures)
+
+
+def _record_failure(db_path):
+    failures = _failures.get(db_path, (0, 0.0))[0] + 1
+    _failures[db_path] = (failures, time.time())
+    print(f"Could not check the mailbox, serving stored announcements; next check in {_retry_wait(failures)}s")
+
+
+def refresh(force=False, fetch=None, db_path=ANNOUNCEMENT_DB):
+    """
+    Pulls the announcement emails that arrived since the watermark.
+
+    Args:
+        force (bool): Check the mailbox even if it was checked recently, or
+            failed recently.
+        fetch (callable): fetch(last_uid, last_validity) -> (validity, emails, new last_uid)
+            or None; defaults to email_body_extractor.fetch_new_emails.
+        db_path (str): The database file.
+
+    Returns:
+        int: The number of new emails stored (0 if the mailbox was not checked).
+    """
+    if not force and (is_fresh(db_path=db_path) or _backing_off(db_path)):
+        return 0
+    with _refresh_lock:
+        # another thread may have checked while we waited for the lock
+        if not force and (is_fresh(db_path=db_path) or _backing_off(db_path)):
+            return 0
+        if fetch is None:
+            import email_body_extractor
+            fetch = email_body_extractor.fetch_new_emails
+        validity, last_uid = watermark(db_path)
+        with telemetry.span("imap.fetch") as fetch_span:
+            try:
+                result = fetch(last_uid, validity)
+            except Exception:
+                _record_failure(db_path)
+                raise
+            if result is None:
+                fetch_span.outcome = "error"
+            else:
+                fetch_span.set(emails=len(result[1]))
+        if result is None:
+            # the mailbox could not be read; keep serving what is stored
+            _record_failure(db_path)
+            return 0
+        _failures.pop(db_path, None)
+        new_validity, emails, new_last_uid = result
+        if not emails and new_validity == validity and new_last_uid == last_uid:
+            _mark_checked(db_path)
+            return 0
+        return add(new_validity, emails, db_path, last_uid=new_last_uid)
+
+
+def latest(how_many, db_path=ANNOUNCEMENT_DB):
+    """
+    Returns:
+        list[dict]: The newest how_many announcements as {"date", "content"}, newest first.
+    """
+    rows = get_connection(db_path).execute(
+        "SELECT date, content FROM announcements ORDER BY uid DESC LIMIT ?", (max(int(how_many), 0),)
+    ).fetchall()
+    return [{"date": date, "content": content} for date, content in rows]
+
+
+def version(db_path=ANNOUNCEMENT_DB):
+    """Changes whenever new announcements are stored; used to invalidate cached answers."""
+    return watermark(db_path)
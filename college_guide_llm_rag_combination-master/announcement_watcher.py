@@ -0,0 +1,279 @@
+"""
+Background watcher that keeps the latest announcements in memory.
+
+Even with the incremental fetch in announcement_store, a chat request that
+finds the store stale waits for an IMAP login and search. The watcher moves
+that off the request path: a daemon thread keeps one IMAP connection open,
+waits for new mail with IDLE (or polls every ANNOUNCEMENT_POLL_INTERVAL
+seconds when the server has no IDLE), fetches only the new emails, saves them
+to the store and pushes them into a ring buffer of the newest
+ANNOUNCEMENT_BUFFER_SIZE announcements. read_announcements then only slices
+the buffer, O(howMany), without touching the network or the database.
+
+When the connection fails the watcher reconnects after an exponential
+backoff with jitter, capped at RECONNECT_MAX_DELAY, and keeps serving the
+buffer meanwhile.
+
+Gmail allows only a few IMAP sessions per account at once, so under gunicorn
+only one worker runs the watcher: the first to take an exclusive lock on
+"<ANNOUNCEMENT_DB>.watcher.lock". The other workers read the store it keeps
+current, and skip their own mailbox checks while the lock is held. On Windows,
+which has no fcntl, every process runs its own watcher.
+"""
+import itertools
+import os
+import random
+import threading
+import time
+from collections import deque
+
+try:
+    import fcntl
+except ImportError:  # Windows: every process runs its own watcher
+    fcntl = None
+
+import announcement_store
+import email_body_extractor
+import telemetry
+
+ANNOUNCEMENT_WATCHER = os.getenv("ANNOUNCEMENT_WATCHER", "on")
+ANNOUNCEMENT_BUFFER_SIZE = int(os.getenv("ANNOUNCEMENT_BUFFER_SIZE", "50"))
+ANNOUNCEMENT_POLL_INTERVAL = int(os.getenv("ANNOUNCEMENT_POLL_INTERVAL", "60"))
+# servers drop an IDLE after about 30 minutes; renew well before that
+IDLE_TIMEOUT = 5 * 60
+RECONNECT_BASE_DELAY = 1.0
+RECONNECT_MAX_DELAY = 5 * 60
+
+_lock = threading.Lock()
+_watcher = None
+# the open lock file while this process is the one running the watcher
+_lock_file = None
+
+
+def backoff_delay(failures, base=RECONNECT_BASE_DELAY, cap=RECONNECT_MAX_DELAY):
+    """Seconds to wait before reconnect number `failures`: exponential, capped, with full jitter."""
+    return random.uniform(0, min(cap, base * 2 ** (failures - 1)))
+
+
+class AnnouncementWatcher:
+    """
+    Keeps a ring buffer of the newest announcements up to date from a background thread.
+
+    Args:
+        connect (callable): Returns a logged-in mailbox (usable as a context manager);
+            defaults to email_body_extractor.connect.
+        capacity (int): How many announcements the buffer holds.
+        poll_interval (float): Seconds between checks when the server has no IDLE.
+        idle_timeout (float): The longest one IDLE wait lasts before it is renewed.
+        db_path (str): The announcement store; None keeps announcements in memory only.
+    """
+
+    def __init__(self, connect=None, capacity=ANNOUNCEMENT_BUFFER_SIZE, poll_interval=ANNOUNCEMENT_POLL_INTERVAL,
+                 idle_timeout=IDLE_TIMEOUT, db_path=announcement_store.ANNOUNCEMENT_DB):
+        self.connect = connect or email_body_extractor.connect
+        self.capacity = capacity
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+        self.db_path = db_path
+        self.buffer = deque(maxlen=capacity)
+        self.validity = None
+        self.last_uid = 0
+        self.connected = False
+        self.mode = None
+        self.checks = 0
+        self.reconnects = 0
+        self.failures = 0
+        self.last_check = None
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _seed(self):
+        """Fills the buffer from the store, so a restart does not start empty."""
+        if self.db_path is None:
+            return
+        self.validity, self.last_uid = announcement_store.watermark(self.db_path)
+        stored = announcement_store.latest(self.capacity, self.db_path)
+        with self._lock:
+            self.buffer.extend(reversed(stored))
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._seed()
+        self._thread = threading.Thread(target=self._run, name="announcement-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        """Asks the thread to stop; an IDLE wait in progress ends at its timeout."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def latest(self, how_many):
+        """
+        Returns:
+            list[dict]: The newest how_many announcements as {"date", "content"}, newest first.
+        """
+        with self._lock:
+            return list(itertools.islice(reversed(self.buffer), max(int(how_many), 0)))
+
+    def check(self, mailbox):
+        """
+        Fetches the emails newer than the watermark from an open mailbox into the buffer.
+
+        Returns:
+            int: The number of new announcements.
+        """
+        with telemetry.span("imap.check", mode=self.mode) as check_span:
+            validity, emails, last_uid = email_body_extractor.fetch_new_from_mailbox(
+                mailbox, self.last_uid, self.validity)
+            check_span.set(emails=len(emails))
+        self.checks += 1
+        self.last_check = time.time()
+        if self.db_path is not None and (emails or validity != self.validity or last_uid != self.last_uid):
+            announcement_store.add(validity, emails, self.db_path, last_uid=last_uid)
+        with self._lock:
+            if validity != self.validity:
+                # the UIDs were renumbered and everything was fetched again
+                self.buffer.clear()
+            self.buffer.extend({"date": email["date"], "content": email["content"]} for email in emails)
+        self.validity = validity
+        # past emails without text too, so they are not fetched again
+        self.last_uid = last_uid
+        return len(emails)
+
+    def _session(self):
+        """One connection: check, then wait for new mail, until it fails or the watcher stops."""
+        with self.connect() as mailbox:
+            self.connected = True
+            self.mode = "idle" if email_body_extractor.supports_idle(mailbox) else "poll"
+            while not self._stop.is_set():
+                self.check(mailbox)
+                self.failures = 0
+                if self.mode == "idle":
+                    mailbox.idle.wait(timeout=self.idle_timeout)
+                else:
+                    self._stop.wait(self.poll_interval)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._session()
+            except Exception as e:
+                self.failures += 1
+                self.last_error = {"message": str(e), "time": time.time()}
+                print(f"Announcement watcher lost the mailbox, reconnecting: {e}")
+            finally:
+                self.connected = False
+            if not self._stop.is_set():
+                self.reconnects += 1
+                self._stop.wait(backoff_delay(max(self.failures, 1)))
+
+    def status(self):
+        return {
+            "alive": self.is_alive(),
+            "connected": self.connected,
+            "mode": self.mode,
+            "buffered": len(self.buffer),
+            "last_uid": self.last_uid,
+            "checks": self.checks,
+            "reconnects": self.reconnects,
+            "last_check": self.last_check,
+            "last_error": self.last_error,
+        }
+
+
+def _gauges():
+    watcher = running()
+    if watcher is None:
+        return []
+    return [("college_guide_announcement_watcher_connected", int(watcher.connected), {}),
+            ("college_guide_announcement_watcher_buffered", len(watcher.buffer), {}),
+            ("college_guide_announcement_watcher_reconnects", watcher.reconnects, {})]
+
+
+telemetry.register(_gauges, help={
+    "college_guide_announcement_watcher_connected": "1 while the watcher holds an IMAP connection.",
+    "college_guide_announcement_watcher_buffered": "Announcements in the watcher's memory buffer.",
+    "college_guide_announcement_watcher_reconnects": "Times the watcher reconnected to the mailbox.",
+})
+
+
+def _lock_path(db_path):
+    return f"{db_path}.watcher.lock"
+
+
+def _claim(db_path):
+    """
+    Takes the lock that lets one process watch the mailbox for a store.
+
+    Returns:
+        bool: True if this process may run the watcher.
+    """
+    global _lock_file
+    if fcntl is None or db_path is None or _lock_file is not None:
+        return True
+    lock_file = open(_lock_path(db_path), "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _lock_file = lock_file
+    return True
+
+
+def watching_elsewhere(db_path=announcement_store.ANNOUNCEMENT_DB):
+    """True if another process runs the watcher that keeps this store current."""
+    if fcntl is None or _lock_file is not None or not os.path.exists(_lock_path(db_path)):
+        return False
+    with open(_lock_path(db_path), "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except OSError:
+            return True
+    return False
+
+
+def start(**kwargs):
+    """
+    Starts the process-wide watcher once, unless ANNOUNCEMENT_WATCHER=off, no
+    mailbox is configured, or another process already runs it.
+
+    Returns:
+        AnnouncementWatcher: The watcher, or None if it is not started.
+    """
+    global _watcher
+    if ANNOUNCEMENT_WATCHER == "off" or (not email_body_extractor.gmail and "connect" not in kwargs):
+        return None
+    with _lock:
+        if not _claim(kwargs.get("db_path", announcement_store.ANNOUNCEMENT_DB)):
+            print("Another process watches the mailbox; announcements are read from the store")
+            return None
+        if _watcher is None or not _watcher.is_alive():
+            _watcher = AnnouncementWatcher(**kwargs).start()
+    return _watcher
+
+
+def stop():
+    global _watcher, _lock_file
+    with _lock:
+        if _watcher is not None:
+            _watcher.stop()
+            _watcher = None
+        if _lock_file is not None:
+            _lock_file.close()
+            _lock_file = None
+
+
+def running():
+    """The process-wide watcher if its thread is running, else None."""
+    watcher = _watcher
+    return watcher if watcher is not None and watcher.is_alive() else None
@@ -0,0 +1,338 @@
+"""
+Cache of answers to questions that open a conversation.
+
+Students ask the same things every day ("where is room 6320", "syllabus of
+maths sem 1"), and each answer costs two or more Gemini round trips plus
+Drive fetches. Answers are cached by their normalized question text, and a
+question that is worded a little differently still hits through a MinHash
+near-duplicate lookup over character shingles:
+
+- each question gets NUM_HASHES min-hashes of its 4-character shingles;
+- the signature is split into BANDS bands, and questions sharing any band
+  are candidates (locality-sensitive hashing);
+- a candidate counts as a hit only when the exact Jaccard similarity of the
+  shingle sets is at least NEAR_DUPLICATE_THRESHOLD, both questions have
+  the same numbers, and every word one of them has is the other's word or a
+  typo of it; so "maths sem 1" never answers "maths sem 2", and "timetable
+  of cse" never answers "timetable of ece".
+
+Filler words ("is", "the", "please", ...) are dropped before shingling, so
+"where's room 6320" and "where is the room 6320?" are the same question.
+
+Entries expire after ANSWER_CACHE_TTL seconds, and the whole cache is cleared
+when the data behind the answers changes: the drive file list, the
+announcements, the holidays, or the date. Without the announcement watcher
+the announcement store only refreshes when read_announcements runs, which a
+cache hit never does, so answers that used it expire after
+ANNOUNCEMENT_REFRESH_INTERVAL instead. The date is part of the version, but
+not the time of day, so answers that ran a date tool or ask about the present
+moment ("is the office open now", "my next lecture") expire after
+ANSWER_CACHE_TIME_TTL.
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict, defaultdict
+
+import announcement_store
+import announcement_watcher
+import holiday_store
+import telemetry
+from trigram_index import trigrams
+
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", str(6 * 60 * 60)))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.8"))
+ANSWER_CACHE_TIME_TTL = int(os.getenv("ANSWER_CACHE_TIME_TTL", str(15 * 60)))
+
+# the files whose content the answers depend on, besides the announcement and holiday stores
+SOURCE_FILES = ("static/paths.txt",)
+
+# tools whose results depend on the date or time
+TIME_DEPENDENT_TOOLS = frozenset({"holidays_between"})
+# words of a question that asks about the present moment
+TIME_WORDS = frozenset({"now", "currently", "current", "open", "closed", "next", "ongoing"})
+
+# words that do not change what is asked
+STOP_WORDS = frozenset({
+    "a", "an", "the", "is", "are", "was", "s", "do", "does", "to", "i", "me", "you",
+    "can", "could", "would", "will", "tell", "please", "pls", "hi", "hey",
+})
+# the trigram Dice score two differing words need to count as a typo of each other
+WORD_SIMILARITY = 0.5
+
+SHINGLE_SIZE = 4
+NUM_HASHES = 64
+BANDS = 16
+_ROWS = NUM_HASHES // BANDS
+_PRIME = (1 << 61) - 1
+# fixed coefficients, so signatures are the same in every process
+_COEFFICIENTS = [
+    (int.from_bytes(hashlib.sha256(f"a{i}".encode()).digest()[:8], "big") % _PRIME or 1,
+     int.from_bytes(hashlib.sha256(f"b{i}".encode()).digest()[:8], "big") % _PRIME)
+    for i in range(NUM_HASHES)
+]
+
+
+def normalize(question):
+    """Lowercases, drops punctuation and filler words, and collapses whitespace."""
+    words = re.sub(r"[^\w\s]", " ", question.lower()).split()
+    return " ".join(word for word in words if word not in STOP_WORDS)
+
+
+def shingles(text):
+    """The set of character shingles of normalized text."""
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def minhash(shingle_set):
+    """The MinHash signature of a shingle set."""
+    hashes = [zlib.crc32(shingle.encode("utf-8")) for shingle in shingle_set]
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _COEFFICIENTS)
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def _numbers(text):
+    return tuple(re.findall(r"\d+", text))
+
+
+def _dice(a, b):
+    a, b = trigrams(a), trigrams(b)
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+def words_agree(a, b):
+    """True if every word only one of the normalized texts has is a typo of a word in the other."""
+    a, b = set(a.split()), set(b.split())
+    for extra, other in ((a - b, b), (b - a, a)):
+        for word in extra:
+            if not any(_dice(word, candidate) >= WORD_SIMILARITY for candidate in other):
+                return False
+    return True
+
+
+class AnswerCache:
+    """
+    An LRU of answers with TTLs, exact and near-duplicate lookups, and
+    invalidation by source version.
+
+    Args:
+        ttl (float): Seconds an answer stays valid.
+        max_entries (int): The most answers kept; the least recently used go first.
+        threshold (float): The Jaccard similarity a near duplicate needs.
+    """
+
+    def __init__(self, ttl=ANSWER_CACHE_TTL, max_entries=ANSWER_CACHE_SIZE, threshold=NEAR_DUPLICATE_THRESHOLD):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.version = None
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bands = defaultdict(set)
+
+    def _check_version(self, version):
+        if version != self.version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._bands.clear()
+            self.version = version
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        for band in entry["bands"]:
+            self._bands[band].discard(key)
+            if not self._bands[band]:
+                del self._bands[band]
+
+    def _live(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if now - entry["time"] > entry["ttl"]:
+            self._drop(key)
+            return None
+        return entry
+
+    def get(self, question, version):
+        """
+        Looks up the answer to a question.
+
+        Args:
+            question (str): The question as the student typed it.
+            version: The current source version (see source_version()).
+
+        Returns:
+            str: The cached answer, or None on a miss.
+        """
+        key = normalize(question)
+        now = time.time()
+        with self._lock:
+            self._check_version(version)
+            entry = self._live(key, now)
+            if entry is not None:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry["answer"]
+
+            grams = shingles(key)
+            signature = minhash(grams)
+            candidates = set()
+            for band in self._band_keys(signature):
+                candidates |= self._bands.get(band, set())
+            numbers = _numbers(key)
+            best, best_score = None, self.threshold
+            for candidate in candidates:
+                entry = self._live(candidate, now)
+                if entry is None or entry["numbers"] != numbers:
+                    continue
+                score = jaccard(grams, entry["shingles"])
+                if score >= best_score and words_agree(key, candidate):
+                    best, best_score = candidate, score
+            if best is not None:
+                self.near_hits += 1
+                self._entries.move_to_end(best)
+                return self._entries[best]["answer"]
+            self.misses += 1
+            return None
+
+    def put(self, question, answer, version, ttl=None):
+        """
+        Stores the answer to a question, computed while version was current.
+
+        ttl (float, optional) shortens the cache's TTL for this answer.
+        """
+        key = normalize(question)
+        if not key or not answer:
+            return
+        grams = shingles(key)
+        bands = self._band_keys(minhash(grams))
+        with self._lock:
+            self._check_version(version)
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = {"answer": answer, "time": time.time(), "ttl": min(ttl or self.ttl, self.ttl),
+                                  "shingles": grams, "numbers": _numbers(key), "bands": bands}
+            for band in bands:
+                self._bands[band].add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    @staticmethod
+    def _band_keys(signature):
+        return [(i, signature[i * _ROWS:(i + 1) * _ROWS]) for i in range(BANDS)]
+
+    def stats(self):
+        """Hit and miss counters and the current size."""
+        lookups = self.hits + self.near_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.near_hits) / lookups, 3) if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+_source_hashes = {}
+
+
+def _file_version(path):
+    """A content hash of a file, recomputed only when its size or mtime changes."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = _source_hashes.get(path)
+    if cached is None or cached[0] != key:
+        with open(path, "rb") as f:
+            # a file may be rewritten with the same content, so compare content, not mtime
+            cached = _source_hashes[path] = (key, hashlib.md5(f.read()).hexdigest())
+    return cached[1]
+
+
+def source_version():
+    """The version of everything the cached answers depend on, including today's date."""
+    return ((time.strftime("%Y-%m-%d"), announcement_store.version(), holiday_store.version())
+            + tuple(_file_version(path) for path in SOURCE_FILES))
+
+
+cache = AnswerCache()
+
+
+def is_first_question(conversation):
+    """Only a question that opens a conversation is answered from, or stored in, the cache."""
+    return not conversation["turns"] and not conversation["summary"]
+
+
+def turn_entries(question, answer):
+    """The conversation entries of a turn answered from the cache."""
+    return [{"role": "user", "parts": [question]}, {"role": "model", "parts": [answer]}]
+
+
+def get(question):
+    """Looks up a question in the process-wide cache."""
+    with telemetry.span("answer_cache") as lookup:
+        answer = cache.get(question, source_version())
+        lookup.set(cache="miss" if answer is None else "hit")
+    return answer
+
+
+def answer_ttl(tools, question=""):
+    """
+    The TTL of an answer that ran these tools, or None for the cache's own.
+
+    read_announcements answers only go stale as fast as the store refreshes
+    when no watcher, in this process or another, keeps it current. Answers that ran a date tool, or whose
+    question asks about the present moment, hold only for ANSWER_CACHE_TIME_TTL.
+    """
+    ttls = []
+    if ("read_announcements" in tools and announcement_watcher.running() is None
+            and not announcement_watcher.watching_elsewhere()):
+        ttls.append(announcement_store.ANNOUNCEMENT_REFRESH_INTERVAL)
+    if TIME_DEPENDENT_TOOLS.intersection(tools) or TIME_WORDS.intersection(normalize(question).split()):
+        ttls.append(ANSWER_CACHE_TIME_TTL)
+    return min(ttls) if ttls else None
+
+
+def put(question, answer, tools=()):
+    """
+    Stores an answer in the process-wide cache.
+
+    Args:
+        question (str): The question as the student typed it.
+        answer (str): The model's answer.
+        tools (collection[str]): The names of the tools run for the answer.
+    """
+    cache.put(question, answer, source_version(), ttl=answer_ttl(tools, question))
+
+
+def stats():
+    return cache.stats()
+
+
+def _gauges():
+    current = cache.stats()
+    return [("college_guide_answer_cache_entries", current["entries"], {}),
+            ("college_guide_answer_cache_hit_rate", current["hit_rate"], {})]
+
+
+telemetry.register(_gauges, help={
+    "college_guide_answer_cache_entries": "Answers in the answer cache.",
+    "college_guide_answer_cache_hit_rate": "Share of answer cache lookups that hit, exact or near-duplicate.",
+})
@@ -1,48 +1,151 @@
-from flask import Flask, render_template, request, session,jsonify
+import json
+
+from flask import Flask, Response, render_template, request, session, jsonify, stream_with_context
+import answer_cache
+import clients
+import conversation_store
 import llm_functions
+import telemetry
 app = Flask(__name__)
-app.secret_key = 'super secret key!@#$@$%&^*(^&&$^*67586589924859023$#@%@#$%@#$%QWFKDSAFKEDEOFJDSAjdfhkjasflkj$@#%^%^'
-llm_functions.initialize()
-llm_functions.reload_hierarchy()
+app.secret_key = conversation_store.SECRET_KEY
+# authentication and the drive sync run in the background; see /readyz.
+# The text extraction processes re-import this file as __mp_main__ and must not.
+if __name__ != "__mp_main__":
+    llm_functions.start_warm_up()
 @app.route('/')
 def index():
+    conversation_store.delete(session.get('sid'))
     session.clear()
     return render_template("main.html")
 
+def _load_conversation():
+    """Returns the session id and the stored conversation of this session."""
+    # The cookie only holds the session id; the history is kept server side.
+    if 'sid' not in session:
+        session['sid'] = conversation_store.new_session_id()
+    with telemetry.span("conversation.load"):
+        return session['sid'], conversation_store.load(session['sid'])
+
+
+def _cached_answer(sid, conversation, user_message):
+    """
+    Answers the first question of a conversation from the answer cache.
+
+    Later questions may depend on the earlier turns, so they always go to the model.
+    Returns the answer, or None on a miss.
+    """
+    if not answer_cache.is_first_question(conversation):
+        return None
+    answer = answer_cache.get(user_message)
+    if answer is not None:
+        conversation_store.append(sid, conversation, answer_cache.turn_entries(user_message, answer))
+    return answer
+
+
+def _start_chat(conversation):
+    """Re-creates the Gemini model from the bounded history (recent turns + summary)."""
+    history = conversation_store.model_history(conversation)
+    with telemetry.span("gemini.start_chat", turns=len(history)):
+        return history, llm_functions.initialize_gemini_model(history)
+
+
+def _save_chat(sid, conversation, history, chat_model, user_message, answer, cacheable, tools):
+    """Saves the 'user' and 'model' entries the request added, and caches a first answer."""
+    first_question = answer_cache.is_first_question(conversation)
+    with telemetry.span("conversation.save"):
+        # the store trims older turns into a summary
+        new_entries = conversation_store.entries_from_history(chat_model.history[len(history):])
+        conversation_store.append(sid, conversation, new_entries)
+        if first_question and cacheable:
+            answer_cache.put(user_message, answer, tools)
+
+
 @app.route('/api', methods=['POST'])
 def api():
     session.permanent = False
-    llm_functions.initialize()
+    with telemetry.span("api", route="/api") as request_span:
+        sid, conversation = _load_conversation()
+        user_message = request.json['message']
+
+        cached = _cached_answer(sid, conversation, user_message)
+        request_span.set(answered_from_cache=cached is not None)
+        if cached is not None:
+            return jsonify({"response": cached})
+
+        # Get the response from the model.
+        history, chat_model = _start_chat(conversation)
+        response_gemini, cacheable, tools = "", True, set()
+        with telemetry.span("gemini.response"):
+            for event, data in llm_functions.gemini_response_events(user_message, chat_model):
+                if event == "tool":
+                    tools.add(data["name"])
+                    cacheable = cacheable and data["status"] != "error"
+                elif event == "done":
+                    response_gemini, cacheable = data["text"], cacheable and data["complete"]
+
+        _save_chat(sid, conversation, history, chat_model, user_message, response_gemini, cacheable, tools)
+        return jsonify({"response": response_gemini})
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.route('/api/stream', methods=['POST'])
+def api_stream():
+    """
+    Same as /api, but answers with Server-Sent Events: "token" events as the
+    model writes, "tool" events while functions run, then one "done" event.
+    """
+    session.permanent = False
+    sid, conversation = _load_conversation()
+    user_message = request.json['message']
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
 
-    # 1. Get the simple history from the session.
-    simple_history = session.get('chat_history', [])
+    cached = _cached_answer(sid, conversation, user_message)
+    if cached is not None:
+        body = _sse("token", {"text": cached}) + _sse("done", {"text": cached, "complete": True})
+        return Response(body, mimetype="text/event-stream", headers=headers)
 
-    # 2. Re-create the Gemini model for this request.
-    chat_model = llm_functions.initialize_gemini_model(simple_history)
+    history, chat_model = _start_chat(conversation)
 
-    # 3. Get the new message.
-    user_message = request.json['message']
+    def generate():
+        answer, cacheable, tools = "", True, set()
+        # the generator runs in this request's thread, so the span can stay current across its yields
+        with telemetry.span("api.stream", route="/api/stream") as stream_span:
+            try:
+                for event, data in llm_functions.gemini_response_events(user_message, chat_model):
+                    if event == "tool":
+                        tools.add(data["name"])
+                        cacheable = cacheable and data["status"] != "error"
+                    elif event == "done":
+                        answer, cacheable = data["text"], cacheable and data["complete"]
+                    yield _sse(event, data)
+            except Exception as e:
+                print(f"An error occurred while streaming the response: {e}")
+                stream_span.outcome = "error"
+                yield _sse("error", {"text": "Sorry, something went wrong while answering. Please try again."})
+                return
+            _save_chat(sid, conversation, history, chat_model, user_message, answer, cacheable, tools)
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers=headers)
+
+
+@app.route('/healthz')
+def healthz():
+    return jsonify(dict(clients.health(), answer_cache=answer_cache.stats()))
 
-    # 4. Get the response from the model.
-    response_gemini = llm_functions.gemini_main_response(user_message, chat_model)
 
-    # 5. --- MODIFIED SECTION ---
-    # Create a NEW simple history, keeping only 'user' and 'model' roles.
-    # We use a list comprehension for a clean and efficient implementation.
-    updated_simple_history = [
-        {
-            "role": content.role,
-            "parts": [part.text for part in content.parts]
-        }
-        for content in chat_model.history
-        if content.role in ('user', 'model')  # This condition filters out other roles
-    ]
+@app.route('/metrics')
+def metrics():
+    """Latency histograms and counters of every stage, in the Prometheus text format."""
+    return Response(telemetry.render(), content_type=telemetry.CONTENT_TYPE)
 
-    # 6. Save the filtered, JSON-friendly list back to the session.
-    session['chat_history'] = updated_simple_history
 
-    # 7. Send the response back to the frontend.
-    return jsonify({"response": response_gemini})
+@app.route('/readyz')
+def readyz():
+    ready, status = clients.readiness()
+    return jsonify(status), (200 if ready else 503)
 
 
 if __name__ == '__main__':
@@ -54,10 +157,7 @@ if __name__ == '__main__':
 '''to do
 Tutoring mode add
 
-Update for range of dates
 $$DEBUG$$ fix
-Give me notes from 10-08-2025
-to 12-08-2025
 
 Fix , book request
 
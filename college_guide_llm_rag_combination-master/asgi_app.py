@@ -0,0 +1,190 @@
+"""
+Async serving mode: the same chat app as app.py, on Starlette and uvicorn.
+
+A gunicorn sync worker is blocked for the whole Gemini, Drive and IMAP wait
+of a request. Here the Gemini calls are awaited through the SDK's async
+methods and the synchronous work (tools, the conversation store, building
+the chat) is offloaded to threads, so one process holds many concurrent chats.
+
+Run it with
+    uvicorn asgi_app:app --host 0.0.0.0 --port 80
+
+Routes: / (the chat page), /api (JSON), /api/stream (Server-Sent Events),
+/healthz, /readyz and /metrics, with the same behaviour as the Flask app.
+"""
+import contextlib
+import json
+import os
+
+import anyio
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.sessions import SessionMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from starlette.templating import Jinja2Templates
+
+import announcement_watcher
+import answer_cache
+import clients
+import conversation_store
+import llm_functions
+import telemetry
+
+# how many blocking calls may run in threads at once (anyio's default is 40)
+ASGI_THREADS = int(os.getenv("ASGI_THREADS", "200"))
+
+templates = Jinja2Templates(directory="templates")
+
+
+async def _load_conversation(request):
+    """Returns the session id and the stored conversation of this session."""
+    session = request.session
+    if 'sid' not in session:
+        session['sid'] = conversation_store.new_session_id()
+    sid = session['sid']
+    with telemetry.span("conversation.load"):
+        return sid, await anyio.to_thread.run_sync(conversation_store.load, sid)
+
+
+async def _cached_answer(sid, conversation, user_message):
+    """Answers the first question of a conversation from the answer cache, or returns None."""
+    if not answer_cache.is_first_question(conversation):
+        return None
+    answer = await anyio.to_thread.run_sync(answer_cache.get, user_message)
+    if answer is not None:
+        entries = answer_cache.turn_entries(user_message, answer)
+        await anyio.to_thread.run_sync(conversation_store.append, sid, conversation, entries)
+    return answer
+
+
+async def _start_chat(conversation):
+    """Starts a Gemini chat from the conversation's bounded history."""
+    history = conversation_store.model_history(conversation)
+    with telemetry.span("gemini.start_chat", turns=len(history)):
+        chat_model = await anyio.to_thread.run_sync(llm_functions.initialize_gemini_model, history)
+    return history, chat_model
+
+
+async def _save_chat(sid, conversation, history, chat_model, user_message, answer, cacheable, tools):
+    """Saves the 'user' and 'model' entries the request added, and caches a first answer."""
+    first_question = answer_cache.is_first_question(conversation)
+    with telemetry.span("conversation.save"):
+        new_entries = conversation_store.entries_from_history(chat_model.history[len(history):])
+        await anyio.to_thread.run_sync(conversation_store.append, sid, conversation, new_entries)
+        if first_question and cacheable:
+            await anyio.to_thread.run_sync(answer_cache.put, user_message, answer, tools)
+
+
+async def index(request):
+    await anyio.to_thread.run_sync(conversation_store.delete, request.session.get('sid'))
+    request.session.clear()
+    return templates.TemplateResponse(request, "main.html")
+
+
+async def api(request):
+    with telemetry.span("api", route="/api") as request_span:
+        sid, conversation = await _load_conversation(request)
+        user_message = (await request.json())['message']
+
+        cached = await _cached_answer(sid, conversation, user_message)
+        request_span.set(answered_from_cache=cached is not None)
+        if cached is not None:
+            return JSONResponse({"response": cached})
+
+        history, chat_model = await _start_chat(conversation)
+        answer, cacheable, tools = "", True, set()
+        with telemetry.span("gemini.response"):
+            async for event, data in llm_functions.gemini_response_events_async(user_message, chat_model):
+                if event == "tool":
+                    tools.add(data["name"])
+                    cacheable = cacheable and data["status"] != "error"
+                elif event == "done":
+                    answer, cacheable = data["text"], cacheable and data["complete"]
+
+        await _save_chat(sid, conversation, history, chat_model, user_message, answer, cacheable, tools)
+        return JSONResponse({"response": answer})
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def api_stream(request):
+    """
+    Same as /api, but answers with Server-Sent Events: "token" events as the
+    model writes, "tool" events while functions run, then one "done" event.
+    """
+    sid, conversation = await _load_conversation(request)
+    user_message = (await request.json())['message']
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+    cached = await _cached_answer(sid, conversation, user_message)
+    if cached is not None:
+        body = _sse("token", {"text": cached}) + _sse("done", {"text": cached, "complete": True})
+        return StreamingResponse(iter([body]), media_type="text/event-stream", headers=headers)
+
+    history, chat_model = await _start_chat(conversation)
+
+    async def generate():
+        answer, cacheable, tools = "", True, set()
+        # Starlette iterates the body in one task, so the span can stay current across the yields
+        with telemetry.span("api.stream", route="/api/stream") as stream_span:
+            try:
+                async for event, data in llm_functions.gemini_response_events_async(user_message, chat_model):
+                    if event == "tool":
+                        tools.add(data["name"])
+                        cacheable = cacheable and data["status"] != "error"
+                    elif event == "done":
+                        answer, cacheable = data["text"], cacheable and data["complete"]
+                    yield _sse(event, data)
+            except Exception as e:
+                print(f"An error occurred while streaming the response: {e}")
+                stream_span.outcome = "error"
+                yield _sse("error", {"text": "Sorry, something went wrong while answering. Please try again."})
+                return
+            await _save_chat(sid, conversation, history, chat_model, user_message, answer, cacheable, tools)
+
+    return StreamingResponse(generate(), media_type="text/event-stream", headers=headers)
+
+
+async def healthz(request):
+    return JSONResponse(dict(clients.health(), answer_cache=answer_cache.stats()))
+
+
+async def metrics(request):
+    """Latency histograms and counters of every stage, in the Prometheus text format."""
+    return Response(telemetry.render(), media_type=telemetry.CONTENT_TYPE)
+
+
+async def readyz(request):
+    ready, status = clients.readiness()
+    return JSONResponse(status, status_code=200 if ready else 503)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    anyio.to_thread.current_default_thread_limiter().total_tokens = ASGI_THREADS
+    # authenticating and syncing the drive index run in the background; see /readyz
+    llm_functions.start_warm_up()
+    yield
+    announcement_watcher.stop()
+
+
+app = Starlette(
+    routes=[
+        Route('/', index),
+        Route('/api', api, methods=['POST']),
+        Route('/api/stream', api_stream, methods=['POST']),
+        Route('/healthz', healthz),
+        Route('/readyz', readyz),
+        Route('/metrics', metrics),
+    ],
+    middleware=[Middleware(SessionMiddleware, secret_key=conversation_store.SECRET_KEY, https_only=False)],
+    lifespan=lifespan,
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", "8000")))
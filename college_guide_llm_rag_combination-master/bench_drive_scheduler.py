@@ -0,0 +1,147 @@
+"""
+Benchmark: a burst of students fetching the same files, with and without drive_scheduler.
+
+A FakeDrive with a per-user quota (--quota calls per second, the rest fail
+with 403 userRateLimitExceeded) and a fixed latency per call holds a few
+popular files. --students threads start at the same moment and each fetches
+--files-per-student of them through get_upload_ready_files_by_path (path
+resolution, download, extraction) with a cold text cache, so every student
+needs Drive. Paths are resolved from the drive index, as in the app; with
+--no-index every path is walked on Drive too. Two runs are compared:
+
+- unscheduled: no coalescing and no rate limit, only the retries;
+- scheduled: single-flight plus a token bucket of --rate calls per second.
+
+For each the Drive calls sent, the calls Drive refused, the retries, the
+failed files and the p50 / p99 time per student are reported. Run it from
+this folder:
+
+    python bench_drive_scheduler.py --students 60 --quota 50 --rate 40
+"""
+import argparse
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+# a private text cache, emptied before every run
+TEXT_CACHE_DIR = tempfile.mkdtemp(prefix="bench_drive_scheduler_")
+os.environ["TEXT_CACHE_DIR"] = TEXT_CACHE_DIR
+
+import contextlib  # noqa: E402
+import io  # noqa: E402
+
+import drive_index  # noqa: E402
+import drive_scheduler  # noqa: E402
+import fake_drive  # noqa: E402
+import file_management_base  # noqa: E402
+
+
+def percentile(samples, p):
+    """The nearest-rank percentile of samples, p in 0..100."""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)] if ordered else float("nan")
+
+
+def build_drive(n_popular, latency, quota):
+    """DTU/<subject>/ folders with one syllabus each, the files every student asks for."""
+    drive = fake_drive.FakeDrive()
+    dtu = drive.create_folder("DTU", drive.root_id)
+    paths = []
+    for i in range(n_popular):
+        subject = f"subject-{i}"
+        folder = drive.create_folder(subject, dtu)
+        name = f"$$SYSTEM$$syllabus-{subject}.txt"
+        drive.create_file(name, folder, f"Syllabus of {subject}: units 1 to 5. ".encode() * 200,
+                          mime_type="text/plain")
+        paths.append(f"DTU/{subject}/{name}")
+    drive.latency = latency
+    drive.rate_limit = quota
+    return drive, paths
+
+
+def run(scheduler, args):
+    """Starts every student at once and waits for all of them."""
+    shutil.rmtree(TEXT_CACHE_DIR, ignore_errors=True)
+    drive, paths = build_drive(args.popular, 0.0, None)
+    file_management_base.DRIVE_INDEX = None if args.no_index else drive_index.DriveIndex.build(drive, drive.root_id)
+    file_management_base.TARGET_FOLDER_ID = drive.root_id
+    drive.latency, drive.rate_limit, drive.calls = args.latency, args.quota, 0
+    drive_scheduler.scheduler = scheduler
+
+    rng = random.Random(args.seed)
+    # a few files are much more popular than the rest
+    weights = [1 / (rank + 1) for rank in range(len(paths))]
+    wanted = [rng.choices(paths, weights, k=args.files_per_student) for _ in range(args.students)]
+    barrier = threading.Barrier(args.students)
+    times, failures = [], []
+    lock = threading.Lock()
+
+    def student(requested):
+        barrier.wait()
+        started = time.perf_counter()
+        parts = file_management_base.get_upload_ready_files_by_path(drive, requested)
+        elapsed = time.perf_counter() - started
+        failed = sum(1 for part in parts if "Error" in str(part))
+        with lock:
+            times.append(elapsed)
+            failures.append(failed)
+
+    threads = [threading.Thread(target=student, args=(requested,)) for requested in wanted]
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    stats = scheduler.stats()
+    return {
+        "drive calls": drive.calls,
+        "refused (403)": drive.rejected,
+        "coalesced": stats["coalesced"],
+        "retries": stats["retries"],
+        "failed files": sum(failures),
+        "p50 s": percentile(times, 50),
+        "p99 s": percentile(times, 99),
+        "wall s": time.perf_counter() - started,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=60, help="concurrent requests")
+    parser.add_argument("--files-per-student", type=int, default=3)
+    parser.add_argument("--popular", type=int, default=8, help="distinct files the students ask for")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per Drive API call")
+    parser.add_argument("--quota", type=int, default=50, help="Drive calls allowed per second")
+    parser.add_argument("--rate", type=float, default=40, help="the scheduler's calls per second")
+    parser.add_argument("--burst", type=int, default=20, help="the scheduler's burst")
+    parser.add_argument("--no-index", action="store_true", help="resolve every path on Drive")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    runs = {
+        "unscheduled": drive_scheduler.DriveScheduler(rate=0, single_flight=False),
+        "scheduled": drive_scheduler.DriveScheduler(rate=args.rate, burst=args.burst),
+    }
+    results = {name: run(scheduler, args) for name, scheduler in runs.items()}
+    shutil.rmtree(TEXT_CACHE_DIR, ignore_errors=True)
+
+    print(f"{args.students} students x {args.files_per_student} of {args.popular} files, "
+          f"quota {args.quota}/s, latency {args.latency * 1000:.0f} ms{', no drive index' if args.no_index else ''}")
+    columns = list(next(iter(results.values())))
+    print(f"{'':<13}" + "".join(f"{column:>15}" for column in columns))
+    for name, result in results.items():
+        print(f"{name:<13}" + "".join(
+            f"{value:>15.2f}" if isinstance(value, float) else f"{value:>15}" for value in result.values()))
+    if results["scheduled"]["drive calls"] > results["unscheduled"]["drive calls"]:
+        print("FAILED: the scheduler sent more Drive calls")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
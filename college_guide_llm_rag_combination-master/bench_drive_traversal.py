@@ -0,0 +1,118 @@
+"""
+Benchmark: the old two-pass recursive Drive walk against drive_traversal.
+
+Builds a FakeDrive with tens of thousands of files, gives every API call a
+fixed latency, and times producing static/paths.txt and static/hierarchy.txt
+both ways. Run it from this folder:
+
+    python bench_drive_traversal.py --files 30000 --latency 0.005
+"""
+import argparse
+import io
+import time
+
+import drive_index
+import fake_drive
+
+FOLDER_MIME_TYPE = fake_drive.FOLDER_MIME_TYPE
+
+
+def build_fake_drive(n_files, files_per_folder, latency, big_folder_files):
+    """Lays out DTU/<subject>/semester-<n>/ folders and fills them with notes."""
+    drive = fake_drive.FakeDrive(latency=0.0)
+    dtu = drive.create_folder("DTU", drive.root_id)
+    n_folders = max(1, n_files // files_per_folder)
+    semesters_per_subject = 8
+    subject = None
+    for i in range(n_folders):
+        if i % semesters_per_subject == 0:
+            subject = drive.create_folder(f"subject-{i // semesters_per_subject}", dtu)
+        semester = drive.create_folder(f"semester-{i % semesters_per_subject + 1}", subject)
+        for j in range(files_per_folder):
+            drive.create_file(f"$$USER-NOTES$$by-user{j}_subject-{i}_lecture-{j}_2025-08-05_topic.pdf", semester)
+    if big_folder_files:
+        big = drive.create_folder("books", dtu)
+        for j in range(big_folder_files):
+            drive.create_file(f"$$USER-BOOK$$book-{j}.pdf", big)
+    drive.latency = latency
+    return drive
+
+
+def legacy_two_pass(service, root_id):
+    """The walks reload_hierarchy used to do: paths first, then the tree again."""
+    paths, tree = io.StringIO(), io.StringIO()
+
+    def _list_recursively(current_folder_id, current_path):
+        results = service.files().list(
+            q=f"'{current_folder_id}' in parents and trashed = false",
+            pageSize=1000,
+            fields="nextPageToken, files(id, name, mimeType)"
+        ).execute()
+        for item in results.get('files', []):
+            new_path = f"{current_path}/{item['name']}" if current_path else item['name']
+            if item['mimeType'] == FOLDER_MIME_TYPE:
+                _list_recursively(item['id'], new_path)
+            else:
+                print(new_path, file=paths)
+
+    def _list_items_recursively(folder_id, indent=""):
+        page_token = None
+        while True:
+            results = service.files().list(
+                q=f"'{folder_id}' in parents and trashed=false",
+                pageSize=100,
+                fields="nextPageToken, files(id, name, mimeType)",
+                pageToken=page_token,
+            ).execute()
+            for item in results.get("files", []):
+                print(f"{indent}├── {item['name']}", file=tree)
+                if item["mimeType"] == FOLDER_MIME_TYPE:
+                    _list_items_recursively(item["id"], indent + "    ")
+            page_token = results.get("nextPageToken", None)
+            if page_token is None:
+                break
+
+    _list_recursively(root_id, "")
+    _list_items_recursively(root_id)
+    return paths.getvalue(), tree.getvalue()
+
+
+def single_pass(service, root_id, max_workers):
+    """One parallel, fully paginated walk feeding both outputs."""
+    index = drive_index.DriveIndex.build(service, root_id, max_workers=max_workers)
+    paths, tree = io.StringIO(), io.StringIO()
+    index.write_paths(f=paths)
+    index.write_hierarchy(f=tree)
+    return paths.getvalue(), tree.getvalue()
+
+
+def _timed(drive, func, *args):
+    drive.calls = 0
+    start = time.perf_counter()
+    paths, tree = func(drive, drive.root_id, *args)
+    return time.perf_counter() - start, drive.calls, paths.count("\n"), tree.count("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=30000, help="files spread over the semester folders")
+    parser.add_argument("--files-per-folder", type=int, default=50)
+    parser.add_argument("--big-folder-files", type=int, default=2500,
+                        help="files in one extra folder, to show pagination past 1000 items")
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds per Drive API call")
+    parser.add_argument("--workers", type=int, default=16)
+    args = parser.parse_args()
+
+    drive = build_fake_drive(args.files, args.files_per_folder, args.latency, args.big_folder_files)
+    print(f"fake drive: {len(drive.files_by_id)} items, {args.latency * 1000:.1f} ms per call")
+
+    legacy = _timed(drive, legacy_two_pass)
+    new = _timed(drive, single_pass, args.workers)
+    print(f"{'':<28}{'seconds':>10}{'api calls':>12}{'paths':>10}{'tree lines':>12}")
+    print(f"{'legacy two-pass recursion':<28}{legacy[0]:>10.2f}{legacy[1]:>12}{legacy[2]:>10}{legacy[3]:>12}")
+    print(f"{'parallel single pass':<28}{new[0]:>10.2f}{new[1]:>12}{new[2]:>10}{new[3]:>12}")
+    print(f"speedup: {legacy[0] / new[0]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+Benchmark: the /api code paths end to end, offline.
+
+Every Google service is replaced by a local stand-in:
+
+- Drive: fake_drive.FakeDrive (files().list/get/get_media, permissions().create,
+  changes and batches), every call delayed by --drive-latency;
+- IMAP: fake_imap.FakeImapServer behind the announcement watcher;
+- Gemini: fake_gemini.ScriptedChat, which asks for files, links and
+  announcements through function calls before answering, each turn delayed
+  by --gemini-latency.
+
+For every corpus size a fresh process builds a fake drive of that many
+files in a temporary copy of static/, then times, --iterations times each:
+
+    reload_hierarchy (full walk and incremental sync), match_percent_rag,
+    request_files_for_context, request_files_id_2sharable_link_gemini_rag
+    and gemini_main_response
+
+and reports p50 and p99 latency and the Drive calls per operation. Queries
+are drawn from a seeded random generator, so runs are comparable. Run it
+from this folder:
+
+    python bench_e2e.py --sizes 500,5000,20000 --iterations 50
+"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SUBJECTS = ["maths", "physics", "chemistry", "cad", "electrical", "programming", "mechanics", "economics",
+            "biology", "environmental"]
+USERS = ["hitesh", "ananya", "rohan", "priya", "kabir", "meera", "arjun", "isha"]
+TOPICS = ["limits", "matrices", "hyperbolic-functions", "thermodynamics", "circuits", "recursion", "optics",
+          "isometric-views", "organic-reactions", "demand-curves"]
+FILES_PER_FOLDER = 25
+SEMESTERS = 8
+
+
+def percentile(samples, p):
+    """The nearest-rank percentile of samples, p in 0..100."""
+    ordered = sorted(samples)
+    if not ordered:
+        return float("nan")
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def build_corpus(n_files, rng):
+    """
+    A fake drive laid out like the real one:
+    DTU/<subject>/semester-<n>/ folders of user notes, plus one syllabus per subject.
+
+    Returns:
+        tuple[FakeDrive, list[str]]: the drive and the paths of the note files.
+    """
+    import fake_drive
+    drive = fake_drive.FakeDrive()
+    dtu = drive.create_folder("DTU", drive.root_id)
+    n_folders = max(1, n_files // FILES_PER_FOLDER)
+    subjects = SUBJECTS + [f"subject{i}" for i in range(max(0, n_folders // SEMESTERS - len(SUBJECTS)))]
+    paths = []
+    subject_folders = {}
+    for i in range(n_folders):
+        subject = subjects[(i // SEMESTERS) % len(subjects)]
+        if subject not in subject_folders:
+            subject_folders[subject] = drive.create_folder(subject, dtu)
+            drive.create_file(f"$$SYSTEM$$syllabus-{subject}.txt", subject_folders[subject],
+                              f"Syllabus of {subject}: units 1 to 5.".encode(), mime_type="text/plain")
+        semester_name = f"semester-{i % SEMESTERS + 1}"
+        semester = drive.create_folder(semester_name, subject_folders[subject])
+        for j in range(FILES_PER_FOLDER):
+            user, topic = rng.choice(USERS), rng.choice(TOPICS)
+            name = f"$$USER-NOTES$$by-{user}_{subject}_lecture-{j + 1}_2025-08-{j % 28 + 1:02d}_{topic}.txt"
+            text = f"Lecture {j + 1} of {subject} by {user} on {topic}. " * 40
+            drive.create_file(name, semester, text.encode(), mime_type="text/plain")
+            paths.append(f"DTU/{subject}/{semester_name}/{name}")
+    return drive, paths
+
+
+def _install_fakes(drive, mail_server):
+    """Points the client registry, the announcement watcher and the holiday store at the fakes."""
+    import datetime
+    import types
+
+    import announcement_watcher
+    import email_body_extractor
+    import file_management_base
+    import holiday_store
+
+    def authenticate():
+        file_management_base.CREDENTIALS = types.SimpleNamespace(
+            token="benchmark", expiry=datetime.datetime.utcnow() + datetime.timedelta(days=1))
+        file_management_base.TARGET_FOLDER_ID = drive.root_id
+        return drive
+
+    file_management_base.authenticate_and_return_service = authenticate
+    file_management_base.new_drive_service = lambda: drive
+    email_body_extractor.connect = lambda *args, **kwargs: mail_server.connect()
+    holiday_store.refresh = lambda **kwargs: []
+    announcement_watcher.start(connect=mail_server.connect, idle_timeout=1)
+
+
+def _timed(drive, func, *args):
+    calls = drive.calls
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        func(*args)
+    return (time.perf_counter() - start) * 1000, drive.calls - calls
+
+
+def _random_query(rng):
+    query = {"tag": None, "subject": None, "by_user": None, "lecture_no": None, "date": None,
+             "context": None, "semester": None}
+    kind = rng.randrange(4)
+    if kind == 0:
+        query.update(tag="$$USER-NOTES$$", subject=rng.choice(SUBJECTS), semester=str(rng.randint(1, SEMESTERS)))
+    elif kind == 1:
+        query.update(subject=rng.choice(SUBJECTS), by_user=rng.choice(USERS), lecture_no=str(rng.randint(1, 5)))
+    elif kind == 2:
+        query.update(tag="$$SYSTEM$$", subject=rng.choice(SUBJECTS), context="syllabus")
+    else:
+        query.update(subject=rng.choice(SUBJECTS), context=rng.choice(TOPICS).replace("-", " "),
+                     semester=str(rng.randint(1, SEMESTERS)))
+    return query
+
+
+def run_size(n_files, iterations, drive_latency, gemini_latency, seed):
+    """Times every operation against one corpus size, in this process."""
+    import fake_gemini
+    import fake_imap
+    import file_management_base
+    import llm_functions
+
+    rng = random.Random(seed)
+    drive, paths = build_corpus(n_files, rng)
+    mail = fake_imap.FakeImapServer()
+    for i in range(20):
+        mail.deliver(f"Announcement {i}: lab {i % 5} moves to room {6300 + i}.")
+    _install_fakes(drive, mail)
+    drive.latency = drive_latency
+    samples = {}
+
+    def record(name, func, *args):
+        samples.setdefault(name, []).append(_timed(drive, func, *args))
+
+    for _ in range(max(1, iterations // 10)):
+        # a cold process: no index in memory and no sync state on disk
+        file_management_base.DRIVE_INDEX = None
+        with contextlib.suppress(FileNotFoundError):
+            os.remove("static/drive_index.json")
+        record("reload_hierarchy (full)", llm_functions.reload_hierarchy)
+
+    folders = [item["id"] for item in drive.files_by_id.values() if item["mimeType"] == "application/vnd.google-apps.folder"]
+    for i in range(iterations):
+        drive.create_file(f"$$USER-NOTES$$by-{rng.choice(USERS)}_new_lecture-{i}_2025-09-01_update.txt",
+                          rng.choice(folders), b"new notes", mime_type="text/plain")
+        record("reload_hierarchy (incremental)", llm_functions.reload_hierarchy)
+
+    for _ in range(iterations):
+        record("match_percent_rag", llm_functions.match_percent_rag, _random_query(rng))
+    for _ in range(iterations):
+        record("request_files_for_context", llm_functions.request_files_for_context,
+               rng.sample(paths, rng.randint(1, 3)))
+    for _ in range(iterations):
+        record("request_files_id_2sharable_link_gemini_rag",
+               llm_functions.request_files_id_2sharable_link_gemini_rag, _random_query(rng))
+
+    for i in range(iterations):
+        mail.deliver(f"Announcement {20 + i}: quiz {i} is on Friday.")
+        chat = fake_gemini.ScriptedChat([
+            [fake_gemini.function_call("request_files_for_context", query=rng.sample(paths, 2)),
+             fake_gemini.function_call("read_announcements", howMany=3)],
+            [fake_gemini.function_call("request_files_id_2sharable_link_gemini_rag", query=_random_query(rng))],
+            "Here are the notes you asked for, with their links and the latest announcements.",
+        ], latency=gemini_latency)
+        record("gemini_main_response", llm_functions.gemini_main_response, "give me the notes and any news", chat)
+
+    return {
+        name: {
+            "n": len(runs),
+            "p50_ms": percentile([ms for ms, _ in runs], 50),
+            "p99_ms": percentile([ms for ms, _ in runs], 99),
+            "drive_calls": sum(calls for _, calls in runs) / len(runs),
+        }
+        for name, runs in samples.items()
+    }
+
+
+def _run_child(n_files, args):
+    workdir = tempfile.mkdtemp(prefix="bench_e2e_")
+    try:
+        for folder in ("static", "templates"):
+            shutil.copytree(os.path.join(HERE, folder), os.path.join(workdir, folder))
+        env = dict(os.environ, WARM_UP="off", ANNOUNCEMENT_WATCHER="on",
+                   HOLIDAY_CACHE_DIR=os.path.join(workdir, "cache", "holidays"))
+        command = [sys.executable, os.path.abspath(__file__), "--child", str(n_files),
+                   "--iterations", str(args.iterations), "--drive-latency", str(args.drive_latency),
+                   "--gemini-latency", str(args.gemini_latency), "--seed", str(args.seed)]
+        result = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    line = next((line for line in result.stdout.splitlines() if line.startswith("RESULT ")), None)
+    if result.returncode != 0 or line is None:
+        raise RuntimeError(f"the benchmark for {n_files} files failed:\n{result.stdout[-2000:]}\n{result.stderr[-3000:]}")
+    return json.loads(line[len("RESULT "):])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="500,5000,20000", help="comma separated corpus sizes, in files")
+    parser.add_argument("--iterations", type=int, default=30, help="timed runs per operation and size")
+    parser.add_argument("--drive-latency", type=float, default=0.005, help="seconds per Drive API call")
+    parser.add_argument("--gemini-latency", type=float, default=0.05, help="seconds to the first chunk of a model turn")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        results = run_size(args.child, args.iterations, args.drive_latency, args.gemini_latency, args.seed)
+        print("RESULT " + json.dumps(results))
+        return
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    results = {size: _run_child(size, args) for size in sizes}
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"drive latency {args.drive_latency * 1000:.1f} ms per call, "
+          f"gemini latency {args.gemini_latency * 1000:.0f} ms per turn, {args.iterations} iterations")
+    print(f"{'files':>7}  {'operation':<46}{'n':>4}{'p50 ms':>10}{'p99 ms':>10}{'drive calls':>13}")
+    for size, operations in results.items():
+        for name, stats in operations.items():
+            print(f"{size:>7}  {name:<46}{stats['n']:>4}{stats['p50_ms']:>10.1f}{stats['p99_ms']:>10.1f}"
+                  f"{stats['drive_calls']:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
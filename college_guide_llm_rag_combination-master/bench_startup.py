@@ -0,0 +1,206 @@
+"""
+Benchmark: cold start of the web process.
+
+Every measurement runs in a fresh interpreter, so nothing is already
+imported or cached:
+
+- import time: `python -X importtime -c "import app"` (and asgi_app),
+  reported per module, largest first, with a check that none of the heavy
+  SDKs (Gemini, googleapiclient, pypdf, docx) is imported with the app;
+- time to first request: the process starts, imports app against a
+  FakeDrive and a scripted Gemini chat, and serves GET / and POST /api
+  through Flask's test client; the time until /readyz turns ready (the
+  background warm-up) is reported separately.
+
+The child process works in a temporary copy of static/ and templates/, so
+the fake drive never overwrites the real paths.txt. Run it from this folder:
+
+    python bench_startup.py --repeat 5 --max-import-ms 600 --max-first-request-ms 1500
+
+With the --max-* budgets it exits with status 1 when a budget is exceeded,
+so it can run in CI to catch import-time regressions.
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# modules that must only be imported when they are used
+HEAVY_MODULES = ("google.generativeai", "google.genai", "googleapiclient.discovery", "googleapiclient.http",
+                 "google_auth_oauthlib", "pypdf", "docx")
+_IMPORTTIME_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def _child_env(workdir):
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": HERE + os.pathsep + env.get("PYTHONPATH", ""),
+        "ANNOUNCEMENT_WATCHER": "off",
+        "GMAIL": "",
+        "GEMINI_API_KEY": "benchmark",
+        "HOLIDAY_CACHE_DIR": os.path.join(workdir, "cache", "holidays"),
+    })
+    return env
+
+
+def _workdir():
+    workdir = tempfile.mkdtemp(prefix="bench_startup_")
+    for folder in ("static", "templates"):
+        shutil.copytree(os.path.join(HERE, folder), os.path.join(workdir, folder))
+    return workdir
+
+
+def measure_imports(module):
+    """
+    Imports module in a fresh interpreter under -X importtime.
+
+    Returns:
+        tuple[float, list[tuple[str, float, float, int]], set[str]]:
+        (total ms, (module, self ms, cumulative ms, depth) rows, every module imported)
+    """
+    workdir = _workdir()
+    try:
+        env = _child_env(workdir)
+        env["WARM_UP"] = "off"  # only the import itself
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                cwd=workdir, env=env, capture_output=True, text=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{result.stderr[-2000:]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((name, int(self_us) / 1000, int(cumulative_us) / 1000, len(indent) // 2))
+    total = next((cumulative for name, _, cumulative, _ in rows if name == module), 0.0)
+    return total, rows, {name for name, _, _, _ in rows}
+
+
+_CHILD = r'''
+import datetime, json, sys, time, types
+started = time.time()
+import fake_drive, fake_gemini, file_management_base, holiday_store
+
+drive = fake_drive.FakeDrive()
+dtu = drive.create_folder("DTU", drive.root_id)
+for s in range(20):
+    subject = drive.create_folder(f"subject-{s}", dtu)
+    for n in range(25):
+        drive.create_file(f"$$USER-NOTES$$by-user{n}_subject-{s}_lecture-{n}_2025-08-05_topic.pdf", subject)
+
+
+def authenticate():
+    # credentials that never need a refresh, so readiness sees an authenticated drive
+    file_management_base.CREDENTIALS = types.SimpleNamespace(
+        token="benchmark", expiry=datetime.datetime.utcnow() + datetime.timedelta(days=1))
+    file_management_base.TARGET_FOLDER_ID = drive.root_id
+    return drive
+
+
+file_management_base.authenticate_and_return_service = authenticate
+file_management_base.new_drive_service = lambda: drive
+holiday_store.refresh = lambda **kwargs: []
+
+import app
+import clients, llm_functions
+llm_functions.initialize_gemini_model = lambda history: fake_gemini.ScriptedChat(
+    history=history, responder=lambda message, history: "Room 6320 is on the third floor of the main block.")
+imported = time.time()
+
+client = app.app.test_client()
+client.get("/")
+first_page = time.time()
+response = client.post("/api", json={"message": "where is room 6320?"})
+assert response.status_code == 200, response.status_code
+first_answer = time.time()
+
+deadline = time.time() + 30
+while not clients.readiness()[0] and time.time() < deadline:
+    time.sleep(0.005)
+ready = time.time()
+print("RESULT " + json.dumps({"started": started, "imported": imported, "first_page": first_page,
+                              "first_answer": first_answer, "ready": ready, "ready_ok": clients.readiness()[0]}))
+'''
+
+
+def measure_first_request():
+    """
+    Starts a fresh process and times it up to its first answered request.
+
+    Returns:
+        dict: milliseconds from launching the interpreter to: app imported,
+        first page, first /api answer, and /readyz ready.
+    """
+    workdir = _workdir()
+    try:
+        launched = time.time()
+        result = subprocess.run([sys.executable, "-c", _CHILD], cwd=workdir, env=_child_env(workdir),
+                                capture_output=True, text=True, timeout=120)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    line = next((line for line in result.stdout.splitlines() if line.startswith("RESULT ")), None)
+    if result.returncode != 0 or line is None:
+        raise RuntimeError(f"the benchmark process failed:\n{result.stdout[-2000:]}\n{result.stderr[-2000:]}")
+    times = json.loads(line[len("RESULT "):])
+    return {
+        "interpreter": (times["started"] - launched) * 1000,
+        "import app": (times["imported"] - launched) * 1000,
+        "first page": (times["first_page"] - launched) * 1000,
+        "first answer": (times["first_answer"] - launched) * 1000,
+        "ready": (times["ready"] - launched) * 1000,
+        "ready_ok": times["ready_ok"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement; medians are reported")
+    parser.add_argument("--top", type=int, default=15, help="modules to list per app")
+    parser.add_argument("--max-import-ms", type=float, help="fail if importing app takes longer")
+    parser.add_argument("--max-first-request-ms", type=float, help="fail if the first answer takes longer")
+    args = parser.parse_args()
+    failures = []
+
+    for module in ("app", "asgi_app"):
+        runs = [measure_imports(module) for _ in range(args.repeat)]
+        total = statistics.median(run[0] for run in runs)
+        rows, imported = runs[-1][1], runs[-1][2]
+        print(f"\nimport {module}: {total:.0f} ms (median of {args.repeat})")
+        print(f"  {'module':<40} {'self ms':>8} {'cumulative ms':>14}")
+        # the direct imports of the app, largest first
+        top_level = [row for row in rows if row[3] == 1]
+        for name, self_ms, cumulative_ms, _ in sorted(top_level, key=lambda row: -row[2])[:args.top]:
+            print(f"  {name:<40} {self_ms:>8.1f} {cumulative_ms:>14.1f}")
+        heavy = sorted(name for name in imported if name in HEAVY_MODULES)
+        print(f"  heavy SDKs imported eagerly: {', '.join(heavy) or 'none'}")
+        if heavy:
+            failures.append(f"{module} imports {', '.join(heavy)}")
+        if module == "app" and args.max_import_ms and total > args.max_import_ms:
+            failures.append(f"import app took {total:.0f} ms > {args.max_import_ms:.0f} ms")
+
+    runs = [measure_first_request() for _ in range(args.repeat)]
+    print(f"\ncold start with FakeDrive and a scripted Gemini chat (median of {args.repeat}, ms after launch)")
+    for key in ("interpreter", "import app", "first page", "first answer", "ready"):
+        print(f"  {key:<14} {statistics.median(run[key] for run in runs):>8.0f}")
+    if not all(run["ready_ok"] for run in runs):
+        failures.append("the warm-up did not make /readyz ready")
+    first_answer = statistics.median(run["first answer"] for run in runs)
+    if args.max_first_request_ms and first_answer > args.max_first_request_ms:
+        failures.append(f"first answer took {first_answer:.0f} ms > {args.max_first_request_ms:.0f} ms")
+
+    if failures:
+        print("\nFAILED: " + "; ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Process-wide registry of the Drive and Gemini clients.
+
+Everything here is built once per process, on first use, and then reused by
+every request:
+
+- the service account credentials, refreshed under a lock shortly before they
+  expire so concurrent requests do not all refresh at once;
+- the ID of the target folder, looked up once (or taken from the
+  TARGET_FOLDER_ID environment variable) instead of searching all drives;
+- a pool of Drive services. googleapiclient services are not thread-safe, so
+  a request checks one out with `with clients.drive_service() as service:`
+  and puts it back afterwards, keeping its warm HTTP connection;
+- the Gemini API key and clients, with .env read only once.
+
+health() and readiness() report on the registry for the /healthz and
+/readyz routes.
+"""
+import datetime
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import file_management_base
+
+# refresh the access token when it has less than this many seconds left
+REFRESH_MARGIN = 300
+
+_lock = threading.RLock()
+_refresh_lock = threading.Lock()
+_services = queue.LifoQueue()
+_primary_service = None
+_gemini_api_key = None
+_genai_client = None
+_env_loaded = False
+_started = time.time()
+_last_error = None
+
+
+def load_env():
+    """Reads .env into the environment once per process."""
+    global _env_loaded
+    if _env_loaded:
+        return
+    with _lock:
+        if not _env_loaded:
+            from dotenv import load_dotenv
+            load_dotenv(override=True)
+            _env_loaded = True
+
+
+def _record_error(message):
+    global _last_error
+    _last_error = {"message": message, "time": time.time()}
+    print(message)
+
+
+def primary_service():
+    """
+    Authenticates once and returns the process's first Drive service.
+
+    This also loads the credentials and finds the target folder ID, which
+    file_management_base keeps in CREDENTIALS and TARGET_FOLDER_ID.
+
+    Returns:
+        The Drive service, or None if authentication failed.
+    """
+    global _primary_service
+    if _primary_service is not None:
+        return _primary_service
+    load_env()
+    with _lock:
+        if _primary_service is None:
+            _primary_service = file_management_base.authenticate_and_return_service()
+            if _primary_service is None:
+                _record_error("❌ Drive authentication failed.")
+    return _primary_service
+
+
+def refresh_credentials(force=False):
+    """
+    Refreshes the shared credentials if they are missing a token or close to expiry.
+
+    Args:
+        force (bool): Refresh even if the token is still valid.
+
+    Returns:
+        bool: True if the credentials are usable afterwards.
+    """
+    creds = file_management_base.CREDENTIALS
+    if creds is None:
+        return False
+    if not force and not _needs_refresh(creds):
+        return True
+    with _refresh_lock:
+        # another thread may have refreshed while we waited for the lock
+        if not force and not _needs_refresh(creds):
+            return True
+        try:
+            from google.auth.transport.requests import Request
+            creds.refresh(Request())
+            return True
+        except Exception as e:
+            _record_error(f"An error occurred while refreshing the Drive credentials: {e}")
+            return False
+
+
+def _needs_refresh(creds):
+    if not creds.token or creds.expiry is None:
+        return True
+    # google-auth keeps expiry as a naive UTC datetime
+    remaining = creds.expiry - datetime.datetime.utcnow()
+    return remaining.total_seconds() < REFRESH_MARGIN
+
+
+@contextmanager
+def drive_service():
+    """
+    Checks a Drive service out of the pool for the duration of a with block.
+
+    A new service is built only when every pooled one is in use, so the
+    number of services grows to the peak number of concurrent requests.
+
+    Yields:
+        An authenticated Drive service, or None if authentication failed.
+    """
+    if primary_service() is None:
+        yield None
+        return
+    refresh_credentials()
+    try:
+        service = _services.get_nowait()
+    except queue.Empty:
+        service = file_management_base.new_drive_service()
+    try:
+        yield service
+    finally:
+        _services.put(service)
+
+
+def gemini_api_key():
+    """Reads GEMINI_API_KEY (from .env on first use) and configures google.generativeai."""
+    global _gemini_api_key
+    if _gemini_api_key is not None:
+        return _gemini_api_key
+    with _lock:
+        if _gemini_api_key is None:
+            import google.generativeai as gen
+            load_env()
+            api_key = os.getenv('GEMINI_API_KEY')
+            if not api_key:
+                _record_error("❌ GEMINI_API_KEY is not set.")
+            gen.configure(api_key=api_key)
+            _gemini_api_key = api_key or ""
+    return _gemini_api_key
+
+
+def genai_client():
+    """Returns the shared google.genai client."""
+    global _genai_client
+    if _genai_client is not None:
+        return _genai_client
+    with _lock:
+        if _genai_client is None:
+            from google import genai
+            _genai_client = genai.Client(api_key=gemini_api_key())
+    return _genai_client
+
+
+def reset():
+    """Drops every client, so the next use authenticates again (e.g. after a key rotation)."""
+    global _primary_service, _gemini_api_key, _genai_client, _env_loaded
+    with _lock:
+        _env_loaded = False
+        _primary_service = None
+        _gemini_api_key = None
+        _genai_client = None
+        file_management_base.CREDENTIALS = None
+        while True:
+            try:
+                _services.get_nowait()
+            except queue.Empty:
+                break
+
+
+def health():
+    """Liveness: the process is up and serving."""
+    return {"status": "ok", "uptime": round(time.time() - _started, 1)}
+
+
+def readiness():
+    """
+    Readiness: every dependency a chat request needs is in place.
+
+    Nothing is initialized here, so the probe is cheap and does not call out.
+
+    Returns:
+        tuple[bool, dict]: (ready, the individual checks and the last error)
+    """
+    creds = file_management_base.CREDENTIALS
+    checks = {
+        "drive_authenticated": _primary_service is not None and creds is not None,
+        "drive_credentials_valid": creds is not None and bool(creds.token) and not _needs_refresh(creds),
+        "target_folder": bool(file_management_base.TARGET_FOLDER_ID),
+        "drive_index": file_management_base.DRIVE_INDEX is not None,
+        "gemini_api_key": bool(_gemini_api_key),
+    }
+    # an expiring token is refreshed on the next checkout; it does not make the process unready
+    ready = all(value for key, value in checks.items() if key != "drive_credentials_valid")
+    return ready, {"ready": ready, "checks": checks, "pooled_drive_services": _services.qsize(),
+                   "last_error": _last_error}
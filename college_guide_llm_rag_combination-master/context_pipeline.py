@@ -0,0 +1,99 @@
+"""
+A small staged pipeline for fetching several files at once.
+
+Every item goes through the stages in order (for request_files_for_context:
+resolve the path, download the file, extract the text). Each stage runs on
+its own bounded executor and an item moves to the next stage as soon as the
+previous one finishes, so one file can be downloading while another is being
+resolved and a third is being parsed. Results come back in input order, and
+every item has its own deadline so one slow file cannot hold up the answer.
+The stages run in a copy of the caller's context, so their tracing spans
+nest under the request that started them.
+"""
+import contextvars
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+IO_WORKERS = int(os.getenv("CONTEXT_IO_WORKERS", "8"))
+EXTRACT_WORKERS = int(os.getenv("CONTEXT_EXTRACT_WORKERS", "2"))
+FILE_TIMEOUT = float(os.getenv("CONTEXT_FILE_TIMEOUT", "60"))
+
+# shared by every request in the process; threads are only started when used
+IO_EXECUTOR = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="context-io")
+EXTRACT_EXECUTOR = ThreadPoolExecutor(max_workers=EXTRACT_WORKERS, thread_name_prefix="context-extract")
+
+
+class Done:
+    """Returned by a stage to finish an item early, e.g. on a cache hit."""
+
+    def __init__(self, value):
+        self.value = value
+
+
+class Stage:
+    """One step of the pipeline: func(previous_value) run on executor."""
+
+    def __init__(self, name, func, executor):
+        self.name = name
+        self.func = func
+        self.executor = executor
+
+
+def run(items, stages, timeout=FILE_TIMEOUT, on_error=None):
+    """
+    Pushes every item through the stages and returns the results in order.
+
+    Args:
+        items (list): The inputs of the first stage.
+        stages (list[Stage]): The stages, in order.
+        timeout (float): Seconds each item may take from the moment it is queued.
+        on_error (callable, optional): on_error(item, exception) builds the
+            result for an item that failed or timed out. Without it the
+            exception is raised.
+
+    Returns:
+        list: One result per item, in the order of items.
+    """
+    results = [Future() for _ in items]
+    context = contextvars.copy_context()
+
+    def _advance(i, stage_no, value):
+        if isinstance(value, Done):
+            results[i].set_result(value.value)
+            return
+        if stage_no == len(stages):
+            results[i].set_result(value)
+            return
+        try:
+            # a context runs in one thread at a time, so every stage gets its own copy
+            future = stages[stage_no].executor.submit(context.copy().run, stages[stage_no].func, value)
+        except RuntimeError as e:  # executor shut down while the app stops
+            results[i].set_exception(e)
+            return
+        future.add_done_callback(lambda f: _finished(i, stage_no, f))
+
+    def _finished(i, stage_no, future):
+        if future.exception() is not None:
+            results[i].set_exception(future.exception())
+        else:
+            _advance(i, stage_no + 1, future.result())
+
+    start = time.monotonic()
+    for i, item in enumerate(items):
+        _advance(i, 0, item)
+
+    output = []
+    for item, result in zip(items, results):
+        try:
+            output.append(result.result(timeout=max(0.0, start + timeout - time.monotonic())))
+        except FutureTimeoutError:
+            if on_error is None:
+                raise
+            output.append(on_error(item, TimeoutError(f"timed out after {timeout:g}s")))
+        except Exception as e:
+            if on_error is None:
+                raise
+            output.append(on_error(item, e))
+    return output
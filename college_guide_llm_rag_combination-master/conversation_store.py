@@ -0,0 +1,341 @@
+"""
+Server-side store of chat conversations, keyed by session id.
+
+The Flask cookie only carries a random session id; the conversation itself
+lives here. A conversation is
+
+    {"summary": str, "turns": [{"role": "user" | "model", "parts": [str]}, ...],
+     "updated": float}
+
+and the history policy keeps it bounded: the last MAX_TURNS turns (a user
+message and the replies to it) are kept verbatim, and older turns are folded
+into a short plain-text summary capped at SUMMARY_MAX_CHARS. What is sent to
+the model per request therefore stops growing after a few turns.
+
+Two backends share one interface:
+
+- SqliteStore, a WAL-mode sqlite file shared by every worker on the machine
+  (the default), so a request that lands on another gunicorn worker still
+  finds its conversation;
+- MemoryStore, a dict in this process, chosen with CONVERSATION_STORE=memory
+  (only right for a single worker). It is also used when the database cannot
+  be opened.
+
+Both hand out copies, and append() reads, extends and saves the stored
+conversation in one locked step, so two requests of the same session do
+not overwrite each other's turns.
+
+Conversations untouched for CONVERSATION_TTL seconds are dropped.
+"""
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+# signs the session cookie that carries the session id; shared by app.py and
+# asgi_app.py, and the same in every worker and after a restart
+SECRET_KEY = os.getenv("SECRET_KEY", 'super secret key!@#$@$%&^*(^&&$^*67586589924859023$#@%@#$%@#$%QWFKDSAFKEDEOFJDSAjdfhkjasflkj$@#%^%^')
+CONVERSATION_STORE = os.getenv("CONVERSATION_STORE", "sqlite")
+CONVERSATION_DB = os.getenv("CONVERSATION_DB", "cache/conversations.db")
+CONVERSATION_TTL = int(os.getenv("CONVERSATION_TTL", str(60 * 60)))
+MAX_TURNS = int(os.getenv("CONVERSATION_MAX_TURNS", "6"))
+SUMMARY_MAX_CHARS = int(os.getenv("CONVERSATION_SUMMARY_MAX_CHARS", "2000"))
+# how much of each older message goes into the summary
+SUMMARY_SNIPPET_CHARS = 160
+# expired conversations are swept at most this often
+PURGE_INTERVAL = 60
+
+
+def new_session_id():
+    """Returns a new random session id."""
+    return uuid.uuid4().hex
+
+
+def empty_conversation():
+    return {"summary": "", "turns": [], "updated": time.time()}
+
+
+class MemoryStore:
+    """Conversations in a dict, for a single process."""
+
+    def __init__(self, ttl=CONVERSATION_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conversations = {}
+        self._last_purge = time.time()
+
+    def _live(self, session_id):
+        # the stored conversation itself; the caller holds the lock
+        conversation = self._conversations.get(session_id)
+        if conversation is not None and time.time() - conversation["updated"] > self.ttl:
+            del self._conversations[session_id]
+            return None
+        return conversation
+
+    def get(self, session_id):
+        """Returns a copy of the conversation, or None if there is none or it expired."""
+        with self._lock:
+            conversation = self._live(session_id)
+            return copy.deepcopy(conversation) if conversation is not None else None
+
+    def put(self, session_id, conversation):
+        """Saves a copy of the conversation and stamps it with the current time."""
+        conversation["updated"] = time.time()
+        with self._lock:
+            self._conversations[session_id] = copy.deepcopy(conversation)
+        self.purge()
+
+    def update(self, session_id, change, default):
+        """
+        Applies change() to the stored conversation and saves it, under the lock.
+
+        Args:
+            session_id (str): The session id.
+            change (callable): change(conversation) modifies it in place.
+            default (dict): The conversation to start from when none is stored.
+
+        Returns:
+            dict: A copy of the saved conversation.
+        """
+        with self._lock:
+            conversation = self._live(session_id) or copy.deepcopy(default)
+            change(conversation)
+            conversation["updated"] = time.time()
+            self._conversations[session_id] = conversation
+            saved = copy.deepcopy(conversation)
+        self.purge()
+        return saved
+
+    def delete(self, session_id):
+        with self._lock:
+            self._conversations.pop(session_id, None)
+
+    def purge(self, force=False):
+        """Drops expired conversations; runs at most every PURGE_INTERVAL seconds unless forced."""
+        now = time.time()
+        if not force and now - self._last_purge < PURGE_INTERVAL:
+            return 0
+        with self._lock:
+            self._last_purge = now
+            expired = [sid for sid, c in self._conversations.items() if now - c["updated"] > self.ttl]
+            for sid in expired:
+                del self._conversations[sid]
+        return len(expired)
+
+    def __len__(self):
+        return len(self._conversations)
+
+
+class SqliteStore:
+    """Conversations in a WAL-mode sqlite file, shared by every worker on the machine."""
+
+    def __init__(self, db_path=CONVERSATION_DB, ttl=CONVERSATION_TTL):
+        self.db_path = db_path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._last_purge = time.time()
+        self._connection()  # fail early if the database cannot be opened
+
+    def _connection(self):
+        # one connection per thread and process, as in link_store
+        if getattr(self._local, "pid", None) != os.getpid():
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS conversations ("
+                " session_id TEXT PRIMARY KEY,"
+                " data TEXT NOT NULL,"
+                " updated REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS conversations_updated ON conversations (updated)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return self._local.conn
+
+    def get(self, session_id):
+        row = self._connection().execute(
+            "SELECT data FROM conversations WHERE session_id = ? AND updated >= ?",
+            (session_id, time.time() - self.ttl),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _write(self, conn, session_id, conversation):
+        conversation["updated"] = time.time()
+        conn.execute(
+            "INSERT INTO conversations (session_id, data, updated) VALUES (?, ?, ?) "
+            "ON CONFLICT (session_id) DO UPDATE SET data = excluded.data, updated = excluded.updated",
+            (session_id, json.dumps(conversation), conversation["updated"]),
+        )
+
+    def put(self, session_id, conversation):
+        self._write(self._connection(), session_id, conversation)
+        self.purge()
+
+    def update(self, session_id, change, default):
+        """Same as MemoryStore.update, in one write transaction shared by every worker."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT data FROM conversations WHERE session_id = ? AND updated >= ?",
+                (session_id, time.time() - self.ttl),
+            ).fetchone()
+            conversation = json.loads(row[0]) if row else copy.deepcopy(default)
+            change(conversation)
+            self._write(conn, session_id, conversation)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self.purge()
+        return conversation
+
+    def delete(self, session_id):
+        self._connection().execute("DELETE FROM conversations WHERE session_id = ?", (session_id,))
+
+    def purge(self, force=False):
+        now = time.time()
+        if not force and now - self._last_purge < PURGE_INTERVAL:
+            return 0
+        self._last_purge = now
+        cursor = self._connection().execute("DELETE FROM conversations WHERE updated < ?", (now - self.ttl,))
+        return cursor.rowcount
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+
+
+def _make_store():
+    if CONVERSATION_STORE == "sqlite":
+        try:
+            return SqliteStore()
+        except (sqlite3.Error, OSError) as e:
+            print(f"Could not open the conversation database, keeping conversations in memory: {e}")
+    return MemoryStore()
+
+
+store = _make_store()
+
+
+def _text(entry):
+    return " ".join(part for part in entry["parts"] if part).strip()
+
+
+def _snippet(text, limit=SUMMARY_SNIPPET_CHARS):
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+def split_turns(entries):
+    """Groups history entries into turns, each starting at a user message."""
+    turns = []
+    for entry in entries:
+        if entry["role"] == "user" or not turns:
+            turns.append([])
+        turns[-1].append(entry)
+    return turns
+
+
+def summarize_turn(turn):
+    """One summary line for an older turn: what was asked and what was answered."""
+    asked = " ".join(_text(entry) for entry in turn if entry["role"] == "user")
+    answered = " ".join(_text(entry) for entry in turn if entry["role"] == "model")
+    return f"- Student asked: {_snippet(asked)} | Assistant answered: {_snippet(answered)}"
+
+
+def compact(conversation, max_turns=MAX_TURNS, summary_max_chars=SUMMARY_MAX_CHARS):
+    """
+    Applies the history policy in place.
+
+    Turns beyond the last max_turns are summarized into conversation["summary"];
+    when the summary gets longer than summary_max_chars its oldest lines go first.
+
+    Returns:
+        dict: The conversation.
+    """
+    turns = split_turns(conversation["turns"])
+    if len(turns) > max_turns:
+        older, recent = turns[:-max_turns], turns[-max_turns:]
+        lines = [line for line in conversation["summary"].split("\n") if line]
+        lines.extend(summarize_turn(turn) for turn in older)
+        while lines and len("\n".join(lines)) > summary_max_chars:
+            lines.pop(0)
+        conversation["summary"] = "\n".join(lines)
+        conversation["turns"] = [entry for turn in recent for entry in turn]
+    return conversation
+
+
+def load(session_id):
+    """Returns the stored conversation of a session, or a new empty one."""
+    if not session_id:
+        return empty_conversation()
+    return store.get(session_id) or empty_conversation()
+
+
+def model_history(conversation):
+    """
+    The history to start the Gemini chat with.
+
+    The summary, if any, goes first as a user/model exchange so the roles
+    still alternate.
+    """
+    history = []
+    if conversation["summary"]:
+        history.append({"role": "user", "parts": ["Summary of our earlier conversation:\n" + conversation["summary"]]})
+        history.append({"role": "model", "parts": ["Understood, I will keep that in mind."]})
+    return history + conversation["turns"]
+
+
+def entries_from_history(contents):
+    """
+    Turns Gemini chat history contents into stored {"role", "parts"} entries.
+
+    Only 'user' and 'model' contents are kept. User turns keep only the
+    message itself; the per-turn context that was sent with it is rebuilt
+    fresh for every turn instead of piling up.
+    """
+    return [
+        {
+            "role": content.role,
+            "parts": [part.text for part in (content.parts[:1] if content.role == 'user' else content.parts)]
+        }
+        for content in contents
+        if content.role in ('user', 'model')  # This condition filters out other roles
+    ]
+
+
+def append(session_id, conversation, entries):
+    """
+    Adds the new history entries of a request, compacts and saves.
+
+    The entries go onto the conversation as it is stored now, which may have
+    gained turns from another request of the same session since load();
+    conversation is updated to the saved result.
+
+    Args:
+        session_id (str): The session id.
+        conversation (dict): The conversation returned by load().
+        entries (list[dict]): The new {"role", "parts"} entries, oldest first.
+            Entries without text (function calls and responses) are skipped.
+    """
+    entries = [entry for entry in entries if _text(entry)]
+
+    def _add(current):
+        current["turns"].extend(entries)
+        compact(current)
+
+    saved = store.update(session_id, _add, conversation)
+    conversation.clear()
+    conversation.update(saved)
+
+
+def delete(session_id):
+    if session_id:
+        store.delete(session_id)
@@ -0,0 +1,79 @@
+"""
+Batched Drive API calls.
+
+Drive accepts up to 100 API calls in one multipart HTTP request
+(service.new_batch_http_request). Every part still counts against the quota,
+but the round trips collapse: sharing 40 files costs one request instead of
+80. Parts fail independently, so parts that failed with a retryable status
+are sent again in a smaller batch after a backoff, and the rest of the batch
+is kept. Every part takes a token of the drive_scheduler rate limit.
+"""
+import random
+import time
+
+import drive_scheduler
+
+MAX_BATCH_SIZE = 100
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5
+
+
+def execute(service, requests, max_batch_size=MAX_BATCH_SIZE, max_retries=MAX_RETRIES,
+            backoff_base=BACKOFF_BASE):
+    """
+    Executes many Drive requests in as few batch calls as possible.
+
+    Args:
+        service: An authenticated Google Drive API service object.
+        requests (dict): key -> unexecuted request, e.g.
+            {"id1": service.files().get(fileId="id1", fields="webViewLink")}.
+            Keys must be strings.
+        max_batch_size (int): The most parts per batch call; Drive allows 100.
+        max_retries (int): How many times a failed part is retried.
+        backoff_base (float): Seconds before the first retry; doubled every
+            round, with jitter.
+
+    Returns:
+        tuple[dict, dict]: (key -> response, key -> exception) for the parts
+        that succeeded and the parts that finally failed.
+    """
+    results = {}
+    errors = {}
+    pending = dict(requests)
+    attempt = 0
+    while pending:
+        retry = {}
+        keys = list(pending)
+        for start in range(0, len(keys), max_batch_size):
+            chunk = keys[start:start + max_batch_size]
+
+            def _callback(request_id, response, exception):
+                if exception is None:
+                    results[request_id] = response
+                    errors.pop(request_id, None)
+                else:
+                    errors[request_id] = exception
+                    if drive_scheduler.is_retryable(exception):
+                        retry[request_id] = pending[request_id]
+
+            batch = service.new_batch_http_request(callback=_callback)
+            for key in chunk:
+                batch.add(pending[key], request_id=key)
+            drive_scheduler.throttle(len(chunk))
+            try:
+                batch.execute()
+            except Exception as e:
+                # the whole call failed; every part in it is retried if the
+                # cause was the network or a retryable status
+                for key in chunk:
+                    if key not in results:
+                        errors[key] = e
+                        if drive_scheduler.status_of(e) is None or drive_scheduler.is_retryable(e):
+                            retry[key] = pending[key]
+
+        attempt += 1
+        if not retry or attempt > max_retries:
+            break
+        time.sleep(backoff_base * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5))
+        pending = retry
+    return results, errors
@@ -0,0 +1,257 @@
+import sys
+
+import drive_traversal
+
+FOLDER_MIME_TYPE = drive_traversal.FOLDER_MIME_TYPE
+
+# Every field the rest of the app needs, so one listing per folder is enough.
+INDEX_FIELDS = "nextPageToken, files(id, name, parents, mimeType, size, modifiedTime, md5Checksum, webViewLink)"
+
+
+class DriveIndex:
+    """
+    In-memory index of everything below the target Drive folder.
+
+    The index is built with a single parallel walk of the tree. After that, path to id,
+    id to name and folder listings are plain dictionary lookups instead of one
+    files().list round trip per path segment.
+
+    Every entry is a dict with the keys: id, name, parent, path, mimeType,
+    size, modifiedTime, md5Checksum and webViewLink.
+
+    incomplete is True when a folder listing failed while the index was built
+    or updated, so some items may be missing.
+    """
+
+    def __init__(self, root_id):
+        self.root_id = root_id
+        self.incomplete = False
+        self.entries = {}
+        self.by_path = {}
+        self.children = {root_id: []}
+
+    @classmethod
+    def build(cls, service, root_id, page_size=1000, max_workers=drive_traversal.DEFAULT_WORKERS,
+              service_factory=None):
+        """
+        Builds the index by walking the tree under root_id breadth-first.
+
+        Args:
+            service: An authenticated Google Drive API service object.
+            root_id (str): The ID of the folder to index.
+            page_size (int): How many items to ask for per files().list page.
+            max_workers (int): The most folder listings in flight at once.
+            service_factory (callable, optional): Returns a per-thread service.
+
+        Returns:
+            DriveIndex: The populated index.
+        """
+        index = cls(root_id)
+        index.index_subtree(service, root_id, page_size=page_size, max_workers=max_workers,
+                            service_factory=service_factory)
+        return index
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuilds an index saved with to_dict()."""
+        index = cls(data["root_id"])
+        for entry in data["entries"]:
+            index.add(entry, entry["parent"])
+        return index
+
+    def to_dict(self):
+        """Returns a JSON-friendly snapshot of the index, parents before children."""
+        return {"root_id": self.root_id, "entries": [entry for _, entry in self.iter_tree()]}
+
+    def index_subtree(self, service, folder_id, page_size=1000, max_workers=drive_traversal.DEFAULT_WORKERS,
+                      service_factory=None):
+        """
+        Walks the tree under folder_id and adds every item found.
+
+        Folder listings run in parallel through drive_traversal.walk and
+        follow every result page.
+
+        Args:
+            service: An authenticated Google Drive API service object.
+            folder_id (str): The ID of a folder that is the root or already indexed.
+            page_size (int): How many items to ask for per files().list page.
+            max_workers (int): The most folder listings in flight at once.
+            service_factory (callable, optional): Returns a per-thread service.
+        """
+        failed = []
+        for parent_id, items in drive_traversal.walk(service, folder_id, fields=INDEX_FIELDS, page_size=page_size,
+                                                     max_workers=max_workers, service_factory=service_factory,
+                                                     failed=failed):
+            for item in items:
+                self.add(item, parent_id)
+        if failed:
+            self.incomplete = True
+
+    def add(self, item, parent_id):
+        """
+        Adds one Drive item below parent_id and returns its index entry.
+
+        An item that is already indexed is moved: listing a folder that just
+        appeared in the changes feed can return files the index still has
+        under their old folder.
+        """
+        if item["id"] in self.entries:
+            self.remove(item["id"])
+        parent = self.entries.get(parent_id)
+        parent_path = parent["path"] if parent else ""
+        path = f"{parent_path}/{item['name']}" if parent_path else item["name"]
+        entry = {
+            "id": item["id"],
+            "name": item["name"],
+            "parent": parent_id,
+            "path": path,
+            "mimeType": item.get("mimeType"),
+            "size": int(item["size"]) if item.get("size") is not None else None,
+            "modifiedTime": item.get("modifiedTime"),
+            "md5Checksum": item.get("md5Checksum"),
+            "webViewLink": item.get("webViewLink"),
+        }
+        self.entries[entry["id"]] = entry
+        # Drive allows duplicate names in a folder; like the old path walk,
+        # the first item returned for a path wins.
+        self.by_path.setdefault(path, entry["id"])
+        self.children.setdefault(parent_id, []).append(entry["id"])
+        if entry["mimeType"] == FOLDER_MIME_TYPE:
+            self.children.setdefault(entry["id"], [])
+        return entry
+
+    def upsert(self, item):
+        """
+        Applies an added, renamed, moved or updated Drive item to the index.
+
+        Items whose parents are all outside the indexed tree are removed, so a
+        move out of the target folder behaves like a delete.
+
+        Args:
+            item (dict): A Drive file resource with at least id, name and parents.
+
+        Returns:
+            dict: The entry for the item, or None if it is not in the tree.
+        """
+        parent_id = next((p for p in item.get("parents", []) if p in self.children), None)
+        if parent_id is None:
+            self.remove(item["id"])
+            return None
+
+        entry = self.entries.get(item["id"])
+        if entry is None:
+            return self.add(item, parent_id)
+
+        entry["mimeType"] = item.get("mimeType", entry["mimeType"])
+        entry["size"] = int(item["size"]) if item.get("size") is not None else entry["size"]
+        entry["modifiedTime"] = item.get("modifiedTime", entry["modifiedTime"])
+        entry["md5Checksum"] = item.get("md5Checksum", entry.get("md5Checksum"))
+        entry["webViewLink"] = item.get("webViewLink", entry["webViewLink"])
+
+        if entry["parent"] != parent_id or entry["name"] != item["name"]:
+            if entry["parent"] != parent_id:
+                self.children[entry["parent"]].remove(entry["id"])
+                self.children[parent_id].append(entry["id"])
+            self._unlink_path(entry)
+            entry["parent"] = parent_id
+            entry["name"] = item["name"]
+            self._repath(entry["id"])
+        return entry
+
+    def remove(self, file_id):
+        """
+        Removes an item and everything below it.
+
+        Returns:
+            bool: True if the item was in the index.
+        """
+        entry = self.entries.get(file_id)
+        if entry is None:
+            return False
+        for child_id in list(self.children.get(file_id, [])):
+            self.remove(child_id)
+        self._unlink_path(entry)
+        self.children.pop(file_id, None)
+        siblings = self.children.get(entry["parent"], [])
+        if file_id in siblings:
+            siblings.remove(file_id)
+        del self.entries[file_id]
+        return True
+
+    def _unlink_path(self, entry):
+        """Drops the path mapping of entry, handing it to a same-named sibling if one exists."""
+        if self.by_path.get(entry["path"]) != entry["id"]:
+            return
+        del self.by_path[entry["path"]]
+        for sibling_id in self.children.get(entry["parent"], []):
+            if sibling_id != entry["id"] and self.entries[sibling_id]["path"] == entry["path"]:
+                self.by_path[entry["path"]] = sibling_id
+                break
+
+    def _repath(self, file_id):
+        """Recomputes the path of file_id and of everything below it."""
+        entry = self.entries[file_id]
+        parent = self.entries.get(entry["parent"])
+        entry["path"] = f"{parent['path']}/{entry['name']}" if parent else entry["name"]
+        self.by_path.setdefault(entry["path"], file_id)
+        for child_id in self.children.get(file_id, []):
+            self._unlink_path(self.entries[child_id])
+            self._repath(child_id)
+
+    def get_id(self, file_path):
+        """Returns the ID for a path relative to the root folder, or None."""
+        if not file_path:
+            return None
+        return self.by_path.get(file_path.strip("/"))
+
+    def get_entry(self, file_id):
+        """Returns the index entry for a file ID, or None."""
+        return self.entries.get(file_id)
+
+    def get_name(self, file_id):
+        """Returns the name of a file ID, or None."""
+        entry = self.entries.get(file_id)
+        return entry["name"] if entry else None
+
+    def list_folder(self, folder):
+        """
+        Lists the direct children of a folder.
+
+        Args:
+            folder (str): A folder ID, or a folder path relative to the root.
+                          An empty string lists the root folder.
+
+        Returns:
+            list[dict]: The index entries of the children, in Drive order.
+        """
+        if not folder:
+            folder_id = self.root_id
+        elif folder in self.children:
+            folder_id = folder
+        else:
+            folder_id = self.get_id(folder)
+        return [self.entries[child] for child in self.children.get(folder_id, [])]
+
+    def iter_tree(self, folder_id=None, depth=0):
+        """Yields (depth, entry) pairs depth-first, in Drive order."""
+        folder_id = self.root_id if folder_id is None else folder_id
+        for child_id in self.children.get(folder_id, []):
+            entry = self.entries[child_id]
+            yield depth, entry
+            if entry["mimeType"] == FOLDER_MIME_TYPE:
+                yield from self.iter_tree(child_id, depth + 1)
+
+    def file_paths(self):
+        """Returns the full path of every non-folder item, depth-first."""
+        return [entry["path"] for _, entry in self.iter_tree() if entry["mimeType"] != FOLDER_MIME_TYPE]
+
+    def write_paths(self, f=sys.stdout):
+        """Writes one file path per line, the format of static/paths.txt."""
+        for path in self.file_paths():
+            print(path, file=f)
+
+    def write_hierarchy(self, f=sys.stdout):
+        """Writes the indented tree view, the format of static/hierarchy.txt; folder names end with "/"."""
+        for depth, entry in self.iter_tree():
+            slash = "/" if entry["mimeType"] == FOLDER_MIME_TYPE else ""
+            print(f"{'    ' * depth}├── {entry['name']}{slash}", file=f)
@@ -0,0 +1,249 @@
+"""
+Scheduler in front of the Drive API calls.
+
+Under a burst of students, many requests resolve the same paths and download
+the same syllabus at the same moment. Called independently, they multiply
+the Drive traffic, run into the per-user rate limit and then all back off
+with 403s. Every Drive call of file_management_base (and the listings of
+drive_traversal, drive_sync and drive_batch) goes through here instead:
+
+- single-flight: a call whose key matches a call already in flight (say
+  ("media", file_id)) does not go to Drive; it waits for that call and
+  shares its result or its error;
+- a token bucket admits DRIVE_RATE calls per second on average, in bursts
+  of up to DRIVE_BURST; callers over the rate wait their turn instead of
+  being refused by Drive;
+- rate limit (429, 403 rateLimitExceeded / userRateLimitExceeded), 5xx and
+  network errors are retried with exponential backoff and full jitter
+  (the backoff library), at most DRIVE_MAX_TRIES times.
+
+So more concurrent load means more coalesced calls, not more Drive calls.
+"""
+import os
+import threading
+import time
+
+import backoff
+
+import telemetry
+
+DRIVE_RATE = float(os.getenv("DRIVE_RATE", "100"))
+DRIVE_BURST = int(os.getenv("DRIVE_BURST", "200"))
+DRIVE_MAX_TRIES = int(os.getenv("DRIVE_MAX_TRIES", "5"))
+# seconds a call may spend retrying in total
+DRIVE_MAX_RETRY_TIME = float(os.getenv("DRIVE_MAX_RETRY_TIME", "60"))
+# seconds before the first retry; doubled every retry, then jittered
+RETRY_BASE = 0.5
+
+# 403 is only retried for the rate limit reasons, see is_retryable
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = ("rateLimitExceeded", "userRateLimitExceeded")
+
+
+def status_of(error):
+    """The HTTP status of a googleapiclient HttpError (or the fake's), or None."""
+    status = getattr(error, "status", None)
+    if status is None:
+        status = getattr(getattr(error, "resp", None), "status", None)
+    try:
+        return int(status)
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error):
+    """Whether a failed Drive call may succeed if it is sent again later."""
+    status = status_of(error)
+    if status is None:
+        # no HTTP answer at all: a dropped connection or a timeout
+        return isinstance(error, (OSError, TimeoutError))
+    if status in RETRYABLE_STATUSES:
+        return True
+    return status == 403 and any(reason in str(error) for reason in RATE_LIMIT_REASONS)
+
+
+class TokenBucket:
+    """
+    rate tokens per second, at most burst banked.
+
+    acquire() reserves its tokens at once and then sleeps off any deficit, so
+    waiting callers are admitted in the order they arrived.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = max(int(burst), 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, cost=1):
+        """
+        Takes cost tokens, waiting until they are available.
+
+        Returns:
+            float: The seconds waited.
+        """
+        if self.rate <= 0 or cost <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # a batch bigger than the bucket waits for a full bucket, not forever
+            self._tokens -= min(cost, self.burst)
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; overlapping callers share its outcome."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def do(self, key, func):
+        """
+        Returns:
+            tuple: (func's result, True if it came from another caller's call).
+            func's exception is raised in every caller that shared it.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+        try:
+            flight.result = func()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, False
+
+
+class DriveScheduler:
+    """
+    Coalesces, rate limits and retries Drive calls.
+
+    Args:
+        rate (float): Calls per second on average; 0 turns the rate limit off.
+        burst (int): The most calls admitted at once after a quiet period.
+        max_tries (int): Attempts per call, the first one included.
+        max_time (float): Seconds a call may spend retrying.
+        single_flight (bool): Coalesce calls with the same key.
+    """
+
+    def __init__(self, rate=DRIVE_RATE, burst=DRIVE_BURST, max_tries=DRIVE_MAX_TRIES,
+                 max_time=DRIVE_MAX_RETRY_TIME, single_flight=True):
+        self.bucket = TokenBucket(rate, burst)
+        self.flights = SingleFlight()
+        self.single_flight = single_flight
+        self.calls = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.throttled_seconds = 0.0
+        self._stats_lock = threading.Lock()
+        self._retrying = backoff.on_exception(
+            backoff.expo, Exception,
+            max_tries=max_tries, max_time=max_time, factor=RETRY_BASE,
+            jitter=backoff.full_jitter, giveup=lambda e: not is_retryable(e),
+            on_backoff=self._on_backoff, logger=None,
+        )(self._attempt)
+
+    def _on_backoff(self, details):
+        with self._stats_lock:
+            self.retries += 1
+        print(f"Drive call failed, retry {details['tries']} in {details['wait']:.2f}s: {details['exception']}")
+
+    def throttle(self, cost=1):
+        """Waits for cost tokens of the rate limit, for calls made outside call()."""
+        waited = self.bucket.acquire(cost)
+        with self._stats_lock:
+            self.calls += cost
+            self.throttled_seconds += waited
+
+    def _attempt(self, func, cost):
+        self.throttle(cost)
+        return func()
+
+    def call(self, key, func, cost=1, retry=True):
+        """
+        Runs one Drive call through the scheduler.
+
+        Args:
+            key: Identifies the call, e.g. ("media", file_id); callers that overlap
+                with a call of the same key share its outcome. None never coalesces.
+            func (callable): Makes the call, e.g. lambda: request.execute().
+            cost (int): Rate limit tokens to take per attempt; 0 when func
+                throttles itself (see drive_batch).
+            retry (bool): Retry retryable errors; off when func retries itself.
+
+        Returns:
+            func's result, which may be shared with other callers: do not modify it.
+        """
+        run = (lambda: self._retrying(func, cost)) if retry else (lambda: self._attempt(func, cost))
+        if key is None or not self.single_flight:
+            return run()
+        result, shared = self.flights.do(key, run)
+        if shared:
+            with self._stats_lock:
+                self.coalesced += 1
+            telemetry.annotate(coalesced=True)
+        return result
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "retries": self.retries,
+                "throttled_seconds": round(self.throttled_seconds, 3),
+            }
+
+
+scheduler = DriveScheduler()
+
+
+def call(key, func, cost=1, retry=True):
+    """Runs a Drive call through the process-wide scheduler; see DriveScheduler.call."""
+    return scheduler.call(key, func, cost, retry)
+
+
+def throttle(cost=1):
+    scheduler.throttle(cost)
+
+
+def stats():
+    return scheduler.stats()
+
+
+def _gauges():
+    current = scheduler.stats()
+    return [(f"college_guide_drive_scheduler_{name}", value, {}) for name, value in current.items()]
+
+
+telemetry.register(_gauges, help={
+    "college_guide_drive_scheduler_calls": "Drive calls admitted by the rate limit (batch parts count one each).",
+    "college_guide_drive_scheduler_coalesced": "Drive calls answered by an identical call already in flight.",
+    "college_guide_drive_scheduler_retries": "Drive calls retried after a rate limit, server or network error.",
+    "college_guide_drive_scheduler_throttled_seconds": "Seconds callers waited for the Drive rate limit.",
+})
@@ -0,0 +1,146 @@
+"""
+Incremental sync of the Drive index through the Drive changes feed.
+
+A full walk of the target folder costs one files().list call per folder. After
+the first walk we keep the index on disk together with a changes page token,
+and later refreshes only ask Drive for what changed since that token.
+"""
+import json
+import os
+
+import drive_index
+import drive_scheduler
+
+SYNC_STATE_FILE = "static/drive_index.json"
+
+CHANGE_FIELDS = (
+    "nextPageToken, newStartPageToken, "
+    "changes(fileId, removed, file(id, name, parents, mimeType, size, modifiedTime, md5Checksum, webViewLink, trashed))"
+)
+
+
+def get_start_page_token(service):
+    """Returns the token that marks 'now' in the changes feed."""
+    response = drive_scheduler.call(("start_page_token",),
+                                    lambda: service.changes().getStartPageToken(supportsAllDrives=True).execute())
+    return response["startPageToken"]
+
+
+def load_state(path=SYNC_STATE_FILE):
+    """
+    Loads a saved index and page token.
+
+    Returns:
+        tuple: (DriveIndex, token), or (None, None) if nothing usable is saved.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return drive_index.DriveIndex.from_dict(data["index"]), data["start_page_token"]
+    except FileNotFoundError:
+        return None, None
+    except Exception as e:
+        print(f"Could not read the drive sync state, a full reload will be done: {e}")
+        return None, None
+
+
+def save_state(index, token, path=SYNC_STATE_FILE):
+    """Saves the index and page token, replacing the old state atomically."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"start_page_token": token, "index": index.to_dict()}, f)
+    os.replace(tmp_path, path)
+
+
+def apply_changes(service, index, page_token, page_size=1000, service_factory=None):
+    """
+    Applies every change after page_token to the index.
+
+    Adds, renames, moves and updates go through DriveIndex.upsert. Trashed and
+    removed files, and files moved out of the tree, are dropped. A folder that
+    shows up for the first time has its contents listed, because the feed does
+    not repeat the files that were already inside a folder moved into the tree.
+
+    Args:
+        service: An authenticated Google Drive API service object.
+        index (DriveIndex): The index to update in place.
+        page_token (str): The token saved after the previous sync.
+        page_size (int): How many changes to ask for per page.
+        service_factory (callable, optional): Returns a per-thread service
+            for listing the contents of new folders.
+
+    Returns:
+        tuple: (new page token, number of changes that touched the index)
+    """
+    changed = 0
+    while True:
+        response = drive_scheduler.call(("changes", page_token, page_size), lambda: service.changes().list(
+            pageToken=page_token,
+            pageSize=page_size,
+            fields=CHANGE_FIELDS,
+            includeItemsFromAllDrives=True,
+            supportsAllDrives=True,
+        ).execute())
+
+        for change in response.get("changes", []):
+            file_id = change.get("fileId")
+            item = change.get("file")
+            if change.get("removed") or item is None or item.get("trashed"):
+                changed += index.remove(file_id)
+                continue
+
+            was_indexed = file_id in index.entries
+            entry = index.upsert(item)
+            if entry is None:
+                changed += was_indexed
+                continue
+            changed += 1
+            if not was_indexed and entry["mimeType"] == drive_index.FOLDER_MIME_TYPE:
+                index.index_subtree(service, file_id, service_factory=service_factory)
+
+        if "newStartPageToken" in response:
+            return response["newStartPageToken"], changed
+        page_token = response["nextPageToken"]
+
+
+def sync(service, root_id, path=SYNC_STATE_FILE, service_factory=None):
+    """
+    Brings the saved index up to date, doing a full walk only when needed.
+
+    A full walk happens when there is no saved state, it belongs to another
+    root folder, or the saved token is rejected by Drive. An index with a
+    folder that could not be listed is returned but not saved, so the next
+    sync starts again from the last complete state (or walks the tree again).
+
+    Args:
+        service: An authenticated Google Drive API service object.
+        root_id (str): The ID of the target folder.
+        path (str): Where the index and token are stored.
+        service_factory (callable, optional): Returns a per-thread service
+            for the parallel folder walks.
+
+    Returns:
+        tuple: (DriveIndex, number of changes applied; -1 after a full walk)
+    """
+    index, token = load_state(path)
+    if index is not None and index.root_id == root_id:
+        try:
+            new_token, changed = apply_changes(service, index, token, service_factory=service_factory)
+            # a new token is kept even when nothing in the tree changed, so the
+            # next sync does not read the same stretch of the feed again
+            if index.incomplete:
+                print("Some new drive folders could not be listed; the sync state is not saved")
+            elif changed or new_token != token:
+                save_state(index, new_token, path)
+            return index, changed
+        except Exception as e:
+            print(f"Incremental drive sync failed, doing a full reload: {e}")
+
+    # take the token before walking so nothing that changes mid-walk is lost
+    token = get_start_page_token(service)
+    index = drive_index.DriveIndex.build(service, root_id, service_factory=service_factory)
+    if index.incomplete:
+        print("Some drive folders could not be listed; the index is not saved and the next sync walks again")
+    else:
+        save_state(index, token, path)
+    return index, -1
@@ -0,0 +1,120 @@
+"""
+Breadth-first, parallel traversal of a Drive folder tree.
+
+Each folder listing is one task in a bounded thread pool, and every task
+follows nextPageToken to the end, so folders with more than one page of items
+are listed completely. Folders found in a listing are queued as soon as that
+listing finishes, so the whole width of the tree is fetched at once instead of
+one folder at a time.
+"""
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import drive_scheduler
+
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+
+DEFAULT_FIELDS = "nextPageToken, files(id, name, parents, mimeType, size, modifiedTime, webViewLink)"
+DEFAULT_WORKERS = 8
+
+
+def list_folder(service, folder_id, fields=DEFAULT_FIELDS, page_size=1000):
+    """
+    Lists every item directly inside a folder, following all result pages.
+
+    Args:
+        service: An authenticated Google Drive API service object.
+        folder_id (str): The ID of the folder to list.
+        fields (str): The fields to request for every page.
+        page_size (int): How many items to ask for per page.
+
+    Returns:
+        list[dict]: The items of the folder, in Drive order.
+    """
+    items = []
+    for page in _pages(service, folder_id, fields, page_size):
+        items.extend(page)
+    return items
+
+
+def _pages(service, folder_id, fields, page_size):
+    """Yields the items of each result page of a folder listing, in order."""
+    page_token = None
+    while True:
+        results = drive_scheduler.call(("list", folder_id, fields, page_size, page_token), lambda: service.files().list(
+            q=f"'{folder_id}' in parents and trashed = false",
+            pageSize=page_size,
+            fields=fields,
+            pageToken=page_token,
+        ).execute())
+        yield results.get("files", [])
+        page_token = results.get("nextPageToken")
+        if page_token is None:
+            return
+
+
+def walk(service, root_id, fields=DEFAULT_FIELDS, page_size=1000, max_workers=DEFAULT_WORKERS,
+         service_factory=None, failed=None):
+    """
+    Walks the tree under root_id and yields every folder listing as it completes.
+
+    A folder is only listed after the listing that contains it has been
+    yielded, so consumers always see a parent before its children. The
+    order in which sibling folders are yielded is not fixed. When a page of
+    a listing fails, the folder is yielded with the items of the pages
+    before it, and its ID goes into failed, so the caller knows the walk
+    is incomplete.
+
+    Args:
+        service: An authenticated Google Drive API service object.
+        root_id (str): The ID of the folder to start from.
+        fields (str): The fields to request for every page.
+        page_size (int): How many items to ask for per page.
+        max_workers (int): The most folder listings in flight at once.
+        service_factory (callable, optional): Returns a service object for
+            the calling thread. googleapiclient services are not thread-safe,
+            so pass one when service is a real client; fakes can be shared.
+        failed (list, optional): The IDs of folders that could not be listed
+            completely are appended to it.
+
+    Yields:
+        tuple: (folder_id, list of item dicts in that folder)
+    """
+    local = threading.local()
+
+    def _service():
+        if service_factory is None:
+            return service
+        if not hasattr(local, "service"):
+            local.service = service_factory()
+        return local.service
+
+    def _list(folder_id):
+        # a failed page keeps the pages listed before it
+        items = []
+        try:
+            for page in _pages(_service(), folder_id, fields, page_size):
+                items.extend(page)
+        except Exception as e:
+            print(f"An error occurred while listing folder {folder_id}, keeping {len(items)} items: {e}")
+            if failed is not None:
+                failed.append(folder_id)
+        return items
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="drive-walk") as pool:
+        running = {pool.submit(_list, root_id): root_id}
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                folder_id = running.pop(future)
+                try:
+                    items = future.result()
+                except Exception as e:
+                    print(f"An error occurred while listing folder {folder_id}: {e}")
+                    if failed is not None:
+                        failed.append(folder_id)
+                    continue
+                for item in items:
+                    if item.get("mimeType") == FOLDER_MIME_TYPE:
+                        running[pool.submit(_list, item["id"])] = item["id"]
+                yield folder_id, items
@@ -1,6 +1,6 @@
 # IMPORTANT: You need to install the 'imap-tools' library first.
 # Run this command in your terminal: pip install imap-tools
-from imap_tools import MailBox, A
+from imap_tools import MailBox, A, U
 from dotenv import load_dotenv
 import os
 
@@ -10,6 +10,10 @@ password = os.getenv('GMAIL_PASS')
 
 
 
+def _message_dict(msg):
+    return {"date": msg.date.strftime("%Y-%m-%d and time-%H:%M"), "content": msg.text.strip("\n")}
+
+
 def read_emails_with_subject_alternative(username=gmail, password=password, subject_to_find="announcements", imap_server="imap.gmail.com"):
     """
     Connects to an email account using the 'imap-tools' library,
@@ -45,7 +49,7 @@ def read_emails_with_subject_alternative(username=gmail, password=password, subj
 
                 # The 'text' property automatically finds the plain text body
                 if msg.text:
-                    extracted_contents.append({"date":msg.date.strftime("%Y-%m-%d and time-%H:%M"), "content":msg.text.strip("\n")})
+                    extracted_contents.append(_message_dict(msg))
                     #print("Successfully extracted content.")
                 else:
                     print("Could not extract plain text content from this email.")
@@ -57,6 +61,79 @@ def read_emails_with_subject_alternative(username=gmail, password=password, subj
     return extracted_contents
 
 
+def connect(username=gmail, password=password, imap_server="imap.gmail.com"):
+    """Logs in and selects INBOX; use the mailbox as a context manager to log out."""
+    return MailBox(imap_server).login(username, password, 'INBOX')
+
+
+def supports_idle(mailbox):
+    """True if the server lets the connection wait for new mail with IDLE."""
+    return 'IDLE' in mailbox.client.capabilities
+
+
+def uid_validity(mailbox):
+    """
+    The UIDVALIDITY of the selected folder.
+
+    SELECT already returned it, so normally this costs no extra round trip.
+    """
+    values = mailbox.client.untagged_responses.get('UIDVALIDITY')
+    if values:
+        return int(values[-1])
+    return int(mailbox.folder.status(mailbox.folder.get(), ['UIDVALIDITY'])['UIDVALIDITY'])
+
+
+def fetch_new_from_mailbox(mailbox, last_uid=0, last_validity=None, subject_to_find="announcements"):
+    """
+    Fetches the emails with the subject that arrived after last_uid, in one logged-in mailbox.
+
+    Only the UIDs are searched first; the bodies of new emails are then fetched
+    in a single bulk FETCH, without marking them as seen. If the folder's
+    UIDVALIDITY changed, the old UIDs mean nothing any more and every matching
+    email is fetched again.
+
+    Returns:
+        tuple[int, list[dict], int]: (the folder's UIDVALIDITY, new emails oldest
+        first, each {"uid", "date", "content"}, the new watermark). The watermark
+        is the highest UID searched, so emails without plain text are not
+        searched for again.
+    """
+    validity = uid_validity(mailbox)
+    if validity != last_validity:
+        last_uid = 0
+    # "n:*" always matches the newest message, even when its UID is below n
+    criteria = A(subject=subject_to_find, uid=U(last_uid + 1, '*')) if last_uid else A(subject=subject_to_find)
+    new_uids = [uid for uid in mailbox.uids(criteria) if int(uid) > last_uid]
+    if not new_uids:
+        return validity, [], last_uid
+
+    emails = []
+    for msg in mailbox.fetch(A(uid=new_uids), mark_seen=False, bulk=True):
+        if msg.text:
+            emails.append(dict(_message_dict(msg), uid=int(msg.uid)))
+        else:
+            print("Could not extract plain text content from this email.")
+    emails.sort(key=lambda email: email["uid"])
+    return validity, emails, max(int(uid) for uid in new_uids)
+
+
+def fetch_new_emails(last_uid=0, last_validity=None, username=gmail, password=password,
+                     subject_to_find="announcements", imap_server="imap.gmail.com"):
+    """
+    Logs in and fetches only the emails newer than last_uid (see fetch_new_from_mailbox).
+
+    Returns:
+        tuple[int, list[dict], int]: (UIDVALIDITY, new emails, the new watermark),
+        or None if the mailbox could not be read.
+    """
+    try:
+        with connect(username, password, imap_server) as mailbox:
+            return fetch_new_from_mailbox(mailbox, last_uid, last_validity, subject_to_find)
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        return None
+
+
 # --- EXAMPLE USAGE ---
 if __name__ == '__main__':
     # ==============================================================================
@@ -0,0 +1,366 @@
+"""
+An in-memory stand-in for the Google Drive v3 service object.
+
+Only the calls this project makes are implemented. It is meant for running
+the Drive code paths offline, e.g.
+
+    drive = FakeDrive()
+    folder = drive.create_folder("DTU", drive.root_id)
+    drive.create_file("$$SYSTEM$$Syllabus.pdf", folder, b"...")
+    index = drive_index.DriveIndex.build(drive, drive.root_id)
+
+Batch requests count as one call however many parts they carry, and
+fail_parts() makes the next parts of a batch fail, to exercise retries.
+fail_calls() does the same for whole calls, and rate_limit makes calls over
+that many per second fail with 403 userRateLimitExceeded, like Drive's
+per-user quota.
+"""
+import hashlib
+import itertools
+import json
+import re
+from collections import defaultdict, deque
+import threading
+import time
+
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+MAX_BATCH_SIZE = 100
+
+
+class FakeHttpError(Exception):
+    """Raised by the fake where the real client would raise HttpError."""
+
+    def __init__(self, status, message=""):
+        super().__init__(f"<HttpError {status}: {message}>")
+        self.status = status
+
+
+class _Request:
+    """Mimics googleapiclient's HttpRequest: nothing happens until execute()."""
+
+    def __init__(self, drive, handler):
+        self._drive = drive
+        self._handler = handler
+
+    def execute(self, http=None, num_retries=0):
+        if self._drive.latency:
+            time.sleep(self._drive.latency)
+        with self._drive.lock:
+            self._drive.calls += 1
+            error = self._drive._admit()
+            if error is not None:
+                raise FakeHttpError(*error)
+            return self._handler()
+
+    def _execute_part(self):
+        """Runs the request as one part of a batch: no latency and no call of its own."""
+        with self._drive.lock:
+            if self._drive.injected_errors:
+                raise FakeHttpError(self._drive.injected_errors.pop(0), "injected")
+            return self._handler()
+
+
+class _BatchRequest:
+    """Mimics googleapiclient's BatchHttpRequest for the Drive batch endpoint."""
+
+    def __init__(self, drive, callback=None):
+        self._drive = drive
+        self._callback = callback
+        self._parts = []
+
+    def add(self, request, callback=None, request_id=None):
+        if len(self._parts) >= MAX_BATCH_SIZE:
+            raise FakeHttpError(400, f"A batch can hold at most {MAX_BATCH_SIZE} requests")
+        request_id = str(len(self._parts) + 1) if request_id is None else request_id
+        if any(part[0] == request_id for part in self._parts):
+            raise KeyError(f"A request with this ID already exists: {request_id}")
+        self._parts.append((request_id, request, callback))
+
+    def execute(self, http=None):
+        if self._drive.latency:
+            time.sleep(self._drive.latency)
+        with self._drive.lock:
+            self._drive.calls += 1
+            self._drive.batch_calls += 1
+            error = self._drive._admit()
+        if error is not None:
+            raise FakeHttpError(*error)
+        for request_id, request, callback in self._parts:
+            response, exception = None, None
+            try:
+                response = request._execute_part()
+            except FakeHttpError as e:
+                exception = e
+            for cb in (callback, self._callback):
+                if cb is not None:
+                    cb(request_id, response, exception)
+
+
+class _Response(dict):
+    """An httplib2-style response: a dict of headers with a status."""
+
+    def __init__(self, status, headers, reason=""):
+        super().__init__(headers)
+        self.status = status
+        self.reason = reason
+
+
+class _MediaHttp:
+    """Answers the GET that googleapiclient's MediaIoBaseDownload sends."""
+
+    def __init__(self, drive, file_id):
+        self._drive = drive
+        self._file_id = file_id
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        if self._drive.latency:
+            time.sleep(self._drive.latency)
+        with self._drive.lock:
+            self._drive.calls += 1
+            error = self._drive._admit()
+            if error is not None:
+                # the JSON error body Drive sends, so HttpError reports the reason
+                status, reason = error
+                body = {"error": {"code": status, "message": reason, "errors": [{"reason": reason}]}}
+                return _Response(status, {"content-type": "application/json"}, reason), json.dumps(body).encode()
+            if self._file_id not in self._drive.contents:
+                return _Response(404, {}), b""
+            content = self._drive.contents[self._file_id]
+        return _Response(200, {"content-length": str(len(content))}), content
+
+
+class _MediaRequest(_Request):
+    """
+    A files().get_media request. It can be passed to MediaIoBaseDownload,
+    which reads uri, headers and http, or simply executed.
+    """
+
+    def __init__(self, drive, file_id):
+        super().__init__(drive, lambda: drive._get_media(file_id))
+        self.uri = f"https://fake.drive/files/{file_id}?alt=media"
+        self.headers = {}
+        self.http = _MediaHttp(drive, file_id)
+
+
+class _Files:
+    def __init__(self, drive):
+        self._drive = drive
+
+    def list(self, q="", pageSize=100, fields=None, pageToken=None, **kwargs):
+        return _Request(self._drive, lambda: self._drive._list(q, pageSize, pageToken))
+
+    def get(self, fileId, fields=None, **kwargs):
+        return _Request(self._drive, lambda: self._drive._get(fileId))
+
+    def get_media(self, fileId, **kwargs):
+        return _MediaRequest(self._drive, fileId)
+
+
+class _Permissions:
+    def __init__(self, drive):
+        self._drive = drive
+
+    def create(self, fileId, body, **kwargs):
+        return _Request(self._drive, lambda: self._drive._create_permission(fileId, body))
+
+
+class _Changes:
+    def __init__(self, drive):
+        self._drive = drive
+
+    def getStartPageToken(self, **kwargs):
+        return _Request(self._drive, lambda: {"startPageToken": str(len(self._drive.change_log) + 1)})
+
+    def list(self, pageToken, pageSize=100, fields=None, **kwargs):
+        return _Request(self._drive, lambda: self._drive._changes(pageToken, pageSize))
+
+
+class FakeDrive:
+    """
+    A fake Drive service holding files in a dict.
+
+    Every mutation (create, rename, move, trash, update) is also recorded in a
+    change log that changes().list serves, so incremental sync can be tested.
+
+    Args:
+        root_id (str): The ID of the target folder.
+        latency (float): Seconds every execute() sleeps, to simulate the network.
+        rate_limit (int): Calls allowed per second; the rest fail with 403. None is unlimited.
+    """
+
+    def __init__(self, root_id="root", latency=0.0, rate_limit=None):
+        self.root_id = root_id
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.rejected = 0
+        self._recent_calls = deque()
+        self.injected_call_errors = []
+        self.calls = 0
+        self.lock = threading.RLock()
+        self.files_by_id = {}
+        self.children = defaultdict(list)
+        self.contents = {}
+        self.change_log = []
+        self.permissions_by_id = defaultdict(list)
+        self.batch_calls = 0
+        self.injected_errors = []
+        self._ids = itertools.count(1)
+
+    # --- service interface ---
+    def files(self):
+        return _Files(self)
+
+    def changes(self):
+        return _Changes(self)
+
+    def permissions(self):
+        return _Permissions(self)
+
+    def new_batch_http_request(self, callback=None):
+        return _BatchRequest(self, callback)
+
+    # --- helpers to shape the fake drive ---
+    def create_folder(self, name, parent_id):
+        return self._create(name, parent_id, FOLDER_MIME_TYPE)
+
+    def create_file(self, name, parent_id, content=b"", mime_type="application/pdf"):
+        file_id = self._create(name, parent_id, mime_type, size=len(content))
+        self.contents[file_id] = content
+        self.files_by_id[file_id]["md5Checksum"] = hashlib.md5(content).hexdigest()
+        return file_id
+
+    def rename(self, file_id, new_name):
+        self._update(file_id, name=new_name)
+
+    def move(self, file_id, new_parent_id):
+        self._update(file_id, parents=[new_parent_id])
+
+    def trash(self, file_id):
+        self._update(file_id, trashed=True)
+
+    def update_content(self, file_id, content):
+        self.contents[file_id] = content
+        self._update(file_id, size=str(len(content)), md5Checksum=hashlib.md5(content).hexdigest())
+
+    def fail_parts(self, status, count=1):
+        """Makes the next count batch parts fail with the given HTTP status."""
+        with self.lock:
+            self.injected_errors.extend([status] * count)
+
+    def fail_calls(self, status, count=1, reason="injected"):
+        """Makes the next count calls (requests, batches or media downloads) fail with the given HTTP status."""
+        with self.lock:
+            self.injected_call_errors.extend([(status, reason)] * count)
+
+    def _admit(self):
+        """(status, reason) if the call being made fails, else None. Called with the lock held."""
+        if self.injected_call_errors:
+            return self.injected_call_errors.pop(0)
+        if self.rate_limit:
+            now = time.monotonic()
+            while self._recent_calls and now - self._recent_calls[0] >= 1.0:
+                self._recent_calls.popleft()
+            if len(self._recent_calls) >= self.rate_limit:
+                self.rejected += 1
+                return 403, "userRateLimitExceeded"
+            self._recent_calls.append(now)
+        return None
+
+    def _create(self, name, parent_id, mime_type, size=None):
+        with self.lock:
+            file_id = f"id{next(self._ids)}"
+            self.files_by_id[file_id] = {
+                "id": file_id,
+                "name": name,
+                "parents": [parent_id],
+                "mimeType": mime_type,
+                "size": str(size) if size is not None else None,
+                "modifiedTime": self._now(),
+                "webViewLink": f"https://drive.google.com/file/d/{file_id}/view?usp=drivesdk",
+                "trashed": False,
+            }
+            self.children[parent_id].append(file_id)
+            self.change_log.append(file_id)
+            return file_id
+
+    def _update(self, file_id, **changes):
+        with self.lock:
+            item = self.files_by_id[file_id]
+            if "parents" in changes:
+                for parent_id in item["parents"]:
+                    self.children[parent_id].remove(file_id)
+                for parent_id in changes["parents"]:
+                    self.children[parent_id].append(file_id)
+            item.update(changes, modifiedTime=self._now())
+            self.change_log.append(file_id)
+
+    @staticmethod
+    def _now():
+        return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime()) + f".{time.time_ns() % 10**9:09d}Z"
+
+    # --- request handlers ---
+    def _matches(self, item, q):
+        for clause in re.split(r"\s+and\s+", q.strip()) if q.strip() else []:
+            clause = clause.strip()
+            m = re.fullmatch(r"'(.*)' in parents", clause)
+            if m:
+                if m.group(1) not in item["parents"]:
+                    return False
+                continue
+            m = re.fullmatch(r"trashed\s*=\s*(true|false)", clause)
+            if m:
+                if item["trashed"] != (m.group(1) == "true"):
+                    return False
+                continue
+            m = re.fullmatch(r"(name|mimeType)\s*(!?=)\s*'(.*)'", clause)
+            if m:
+                field, op, value = m.groups()
+                value = value.replace("\\'", "'")
+                if (item[field] == value) != (op == "="):
+                    return False
+                continue
+            raise FakeHttpError(400, f"Unsupported query clause: {clause}")
+        return True
+
+    def _list(self, q, page_size, page_token):
+        parent = re.search(r"'([^']*)' in parents", q)
+        candidates = (self.files_by_id[i] for i in self.children[parent.group(1)]) if parent else self.files_by_id.values()
+        matches = [item for item in candidates if self._matches(item, q)]
+        start = int(page_token or 0)
+        page = matches[start:start + page_size]
+        result = {"files": [dict(item) for item in page]}
+        if start + page_size < len(matches):
+            result["nextPageToken"] = str(start + page_size)
+        return result
+
+    def _get(self, file_id):
+        if file_id not in self.files_by_id:
+            raise FakeHttpError(404, f"File not found: {file_id}")
+        return dict(self.files_by_id[file_id])
+
+    def _get_media(self, file_id):
+        if file_id not in self.contents:
+            raise FakeHttpError(404, f"File not found: {file_id}")
+        return self.contents[file_id]
+
+    def _create_permission(self, file_id, body):
+        if file_id not in self.files_by_id:
+            raise FakeHttpError(404, f"File not found: {file_id}")
+        permission = dict(body, id=f"perm{len(self.permissions_by_id[file_id]) + 1}")
+        self.permissions_by_id[file_id].append(permission)
+        return permission
+
+    def _changes(self, page_token, page_size):
+        start = int(page_token) - 1
+        page = self.change_log[start:start + page_size]
+        result = {
+            "changes": [
+                {"fileId": file_id, "removed": False, "file": dict(self.files_by_id[file_id])}
+                for file_id in page
+            ]
+        }
+        if start + page_size < len(self.change_log):
+            result["nextPageToken"] = str(start + page_size + 1)
+        else:
+            result["newStartPageToken"] = str(len(self.change_log) + 1)
+        return result
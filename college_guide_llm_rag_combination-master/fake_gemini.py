@@ -0,0 +1,167 @@
+"""
+A scripted stand-in for a google.generativeai ChatSession.
+
+Only what llm_functions uses is implemented: send_message and
+send_message_async with stream=True or False, streamed chunks that carry
+text or function_call parts, the merged candidates of a finished stream, and
+the chat history. It is meant for running the chat code paths offline, e.g.
+
+    chat = ScriptedChat([
+        [function_call("request_files_for_context", query=["DTU/maths/syllabus.pdf"])],
+        "The syllabus covers calculus and linear algebra.",
+    ])
+    answer = llm_functions.gemini_main_response("what is in the maths syllabus?", chat)
+
+Each model turn is either a string (a text answer) or a list of parts made
+with text() and function_call(). A responder callable can produce turns
+instead of, or after, the script. latency delays the first chunk of every
+turn, chunk_delay every following chunk.
+"""
+import asyncio
+import time
+
+
+class FunctionCall:
+    def __init__(self, name, args):
+        self.name = name
+        self.args = dict(args)
+
+
+class Part:
+    """Like the protos: text is "" on parts that carry something else."""
+
+    def __init__(self, text="", function_call=None, function_response=None):
+        self.text = text
+        self.function_call = function_call
+        self.function_response = function_response
+
+
+class Content:
+    def __init__(self, role, parts):
+        self.role = role
+        self.parts = parts
+
+
+class Candidate:
+    def __init__(self, content):
+        self.content = content
+
+
+class _Chunk:
+    def __init__(self, parts):
+        self.candidates = [Candidate(Content("model", parts))]
+
+
+def text(value):
+    return Part(text=value)
+
+
+def function_call(name, **args):
+    return Part(function_call=FunctionCall(name, args))
+
+
+def _split(value, words_per_chunk):
+    words = value.split(" ")
+    return [" ".join(words[i:i + words_per_chunk]) + (" " if i + words_per_chunk < len(words) else "")
+            for i in range(0, len(words), words_per_chunk)]
+
+
+class ScriptedResponse:
+    """
+    A response to one message; iterate it (or async-iterate it) to stream.
+
+    candidates holds the whole turn, as it does on a finished real stream.
+    """
+
+    def __init__(self, parts, latency=0.0, chunk_delay=0.0, words_per_chunk=4):
+        self.parts = parts
+        self.candidates = [Candidate(Content("model", parts))]
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.words_per_chunk = words_per_chunk
+
+    def _chunks(self):
+        chunks = []
+        for part in self.parts:
+            if part.text:
+                chunks.extend([Part(text=piece)] for piece in _split(part.text, self.words_per_chunk))
+            else:
+                chunks.append([part])
+        return chunks
+
+    def __iter__(self):
+        for i, parts in enumerate(self._chunks()):
+            delay = self.latency if i == 0 else self.chunk_delay
+            if delay:
+                time.sleep(delay)
+            yield _Chunk(parts)
+
+    async def __aiter__(self):
+        for i, parts in enumerate(self._chunks()):
+            delay = self.latency if i == 0 else self.chunk_delay
+            if delay:
+                await asyncio.sleep(delay)
+            yield _Chunk(parts)
+
+    @property
+    def text(self):
+        return "".join(part.text for part in self.parts)
+
+
+def _as_content(message):
+    """The history entry of what was sent: user text, or the tool results dict."""
+    if isinstance(message, dict):
+        parts = [Part(function_response=part.get("function_response")) for part in message.get("parts", [])]
+        return Content(message.get("role", "user"), parts)
+    if isinstance(message, str):
+        message = [message]
+    return Content("user", [Part(text=str(item)) for item in message])
+
+
+class ScriptedChat:
+    """
+    A chat whose model turns come from a script.
+
+    Args:
+        script (list): Model turns, in order: strings or lists of parts.
+        responder (callable): responder(message, history) -> a turn, used once the script is used up.
+        history (list): Contents to start from, like start_chat(history=...).
+        latency (float): Seconds before the first chunk of each turn (time to first token).
+        chunk_delay (float): Seconds between chunks.
+    """
+
+    def __init__(self, script=(), responder=None, history=None, latency=0.0, chunk_delay=0.0):
+        self.script = list(script)
+        self.responder = responder
+        self.history = list(history or [])
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.messages = []
+
+    def _next_parts(self, message):
+        if self.script:
+            turn = self.script.pop(0)
+        elif self.responder is not None:
+            turn = self.responder(message, self.history)
+        else:
+            turn = "I do not know."
+        return [Part(text=turn)] if isinstance(turn, str) else list(turn)
+
+    def _reply(self, message):
+        self.messages.append(message)
+        self.history.append(_as_content(message))
+        parts = self._next_parts(message)
+        self.history.append(Content("model", parts))
+        return ScriptedResponse(parts, self.latency, self.chunk_delay)
+
+    def send_message(self, content, stream=False, **kwargs):
+        response = self._reply(content)
+        if not stream and self.latency:
+            time.sleep(self.latency)
+        return response
+
+    async def send_message_async(self, content, stream=False, **kwargs):
+        response = self._reply(content)
+        if not stream and self.latency:
+            await asyncio.sleep(self.latency)
+        return response
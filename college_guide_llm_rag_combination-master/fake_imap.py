@@ -0,0 +1,179 @@
+"""
+An in-memory stand-in for an IMAP mailbox, shaped like imap_tools' MailBox.
+
+Only the calls this project makes are implemented (login, UID search, bulk
+fetch, IDLE and logout). It is meant for running the announcement code paths
+offline, e.g.
+
+    server = FakeImapServer()
+    server.deliver("Lab 3 is moved to Friday")
+    watcher = announcement_watcher.AnnouncementWatcher(connect=server.connect)
+
+fail_logins() makes the next logins fail and drop_connections() breaks every
+open session, to exercise reconnects and backoff.
+"""
+import datetime
+import itertools
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+
+class FakeImapError(Exception):
+    """Raised by the fake where the real client would fail (socket or protocol errors)."""
+
+
+class _Message:
+    """The parts of imap_tools' MailMessage that email_body_extractor reads."""
+
+    def __init__(self, uid, subject, text, date):
+        self.uid = str(uid)
+        self.subject = subject
+        self.text = text
+        self.date = date
+
+
+class FakeImapServer:
+    """
+    One INBOX with its messages, shared by every FakeMailBox connected to it.
+
+    Args:
+        uid_validity (int): The folder's UIDVALIDITY.
+        idle (bool): Whether the server advertises the IDLE capability.
+        latency (float): Seconds every command takes.
+    """
+
+    def __init__(self, uid_validity=1, idle=True, latency=0.0):
+        self.uid_validity = uid_validity
+        self.idle = idle
+        self.latency = latency
+        self.messages = {}
+        self._next_uid = itertools.count(1)
+        self._changed = threading.Condition()
+        self._generation = 0
+        self.failing_logins = 0
+        self.logins = 0
+        self.searches = 0
+        self.fetches = 0
+        self.fetched_uids = 0
+        self.seen = set()
+
+    def deliver(self, text, subject="announcements", date=None):
+        """Adds a message and wakes every session waiting in IDLE. Returns its UID."""
+        with self._changed:
+            uid = next(self._next_uid)
+            self.messages[uid] = _Message(uid, subject, text, date or datetime.datetime.now())
+            self._changed.notify_all()
+        return uid
+
+    def reset_uid_validity(self, uid_validity, keep_messages=True):
+        """Simulates the folder being recreated: new UIDVALIDITY, messages renumbered, sessions dropped."""
+        with self._changed:
+            self._generation += 1
+            messages = list(self.messages.values()) if keep_messages else []
+            self.uid_validity = uid_validity
+            self.messages = {}
+            self._next_uid = itertools.count(1)
+            for message in messages:
+                uid = next(self._next_uid)
+                self.messages[uid] = _Message(uid, message.subject, message.text, message.date)
+            self._changed.notify_all()
+
+    def fail_logins(self, count):
+        """Makes the next count logins fail."""
+        self.failing_logins += count
+
+    def drop_connections(self):
+        """Breaks every open session; their next command raises FakeImapError."""
+        with self._changed:
+            self._generation += 1
+            self._changed.notify_all()
+
+    def connect(self):
+        """Logs in a new session, like MailBox(server).login(user, password, 'INBOX')."""
+        return FakeMailBox(self).login("user", "password", "INBOX")
+
+
+class _Idle:
+    def __init__(self, mailbox):
+        self._mailbox = mailbox
+
+    def wait(self, timeout):
+        """Blocks until a message arrives, the connection drops or timeout passes."""
+        server = self._mailbox._server
+        self._mailbox._check()
+        known = len(server.messages)
+        with server._changed:
+            server._changed.wait_for(
+                lambda: len(server.messages) != known or server._generation != self._mailbox._generation,
+                timeout=timeout)
+        self._mailbox._check()
+        return [b"* EXISTS"] if len(server.messages) != known else []
+
+
+class FakeMailBox:
+    """A logged-in session on a FakeImapServer."""
+
+    def __init__(self, server):
+        self._server = server
+        self._generation = None
+        self.client = SimpleNamespace(untagged_responses={}, capabilities=())
+        self.idle = _Idle(self)
+
+    def login(self, username, password, initial_folder='INBOX'):
+        server = self._server
+        if server.latency:
+            time.sleep(server.latency)
+        if server.failing_logins:
+            server.failing_logins -= 1
+            raise FakeImapError("login failed")
+        server.logins += 1
+        self._generation = server._generation
+        self.client.untagged_responses = {'UIDVALIDITY': [str(server.uid_validity).encode()]}
+        self.client.capabilities = ('IMAP4REV1', 'IDLE') if server.idle else ('IMAP4REV1',)
+        return self
+
+    def _check(self):
+        if self._generation is None or self._generation != self._server._generation:
+            raise FakeImapError("connection closed")
+        if self._server.latency:
+            time.sleep(self._server.latency)
+
+    def uids(self, criteria='ALL', charset='US-ASCII', sort=None):
+        self._check()
+        self._server.searches += 1
+        text = str(criteria)
+        subject = re.search(r'SUBJECT "([^"]*)"', text)
+        uid_range = re.search(r'UID (\d+):\*', text)
+        with self._server._changed:
+            messages = dict(self._server.messages)
+        found = [uid for uid, message in messages.items()
+                 if not subject or subject.group(1).lower() in message.subject.lower()]
+        if uid_range:
+            low = int(uid_range.group(1))
+            # like a real server, "n:*" matches the newest message even when its UID is below n
+            found = [uid for uid in found if uid >= low] or ([max(found)] if found else [])
+        return [str(uid) for uid in sorted(found)]
+
+    def fetch(self, criteria='ALL', charset='US-ASCII', *, limit=None, mark_seen=True, reverse=False,
+              headers_only=False, bulk=False, sort=None):
+        self._check()
+        match = re.search(r'UID ([\d,]+)', str(criteria))
+        uids = [int(uid) for uid in match.group(1).split(",")] if match else []
+        self._server.fetches += 1
+        with self._server._changed:
+            messages = [self._server.messages[uid] for uid in uids if uid in self._server.messages]
+        self._server.fetched_uids += len(messages)
+        if mark_seen:
+            self._server.seen.update(uids)
+        return iter(messages)
+
+    def logout(self):
+        self._generation = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.logout()
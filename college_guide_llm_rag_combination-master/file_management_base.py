@@ -1,18 +1,20 @@
 import os.path
 import io
 import sys
-from docx import Document
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+import threading
+# the Google client libraries are imported where they are used, so importing
+# this module (and the web app) does not pay for them; only HttpError is cheap
+# enough to import here, and it is needed by the except clauses
 from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaIoBaseDownload
-from pypdf import PdfReader
 import mimetypes
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+import drive_index
+import drive_sync
+import text_cache
+import context_pipeline
+import drive_batch
+import drive_scheduler
+import text_extraction
+import telemetry
 # If modifying these scopes, delete the file token.json.
 # We need the full 'drive' scope to be able to change file permissions.
 SCOPES = ["https://www.googleapis.com/auth/drive"]
@@ -24,18 +26,102 @@ SCOPES = ["https://www.googleapis.com/auth/drive"]
 TARGET_FOLDER_NAME =  "NSUT_MAIN"
 TARGET_FOLDER_ID = ""
 
+# Optional extraction budget for files read as LLM context; unset means the whole file.
+CONTEXT_MAX_PAGES = int(os.getenv("CONTEXT_MAX_PAGES", "0")) or None
+CONTEXT_MAX_CHARS = int(os.getenv("CONTEXT_MAX_CHARS", "0")) or None
+
+# In-memory index of the TARGET_FOLDER_ID tree, filled by build_drive_index().
+# Path lookups fall back to the per-segment Drive walk while it is None or
+# when a path is newer than the index.
+DRIVE_INDEX = None
+
+# Credentials of the last successful authentication, used to build one Drive
+# service per worker thread for parallel traversals.
+CREDENTIALS = None
+
+
+def new_drive_service():
+    """
+    Builds a fresh Drive service from the saved credentials.
+
+    googleapiclient service objects share one httplib2 connection and are not
+    thread-safe, so every worker thread of a parallel walk gets its own.
+    """
+    from googleapiclient.discovery import build
+    return build('drive', 'v3', credentials=CREDENTIALS, cache_discovery=False)
+
+
+def _service_factory(service):
+    """Per-thread service factory for drive_traversal, or None for fakes and tests."""
+    if CREDENTIALS is None or not hasattr(service, "_http"):
+        return None
+    return new_drive_service
+
+
+_thread_local = threading.local()
+
+
+def thread_service(service):
+    """Returns a Drive service that is safe to use from the calling thread."""
+    factory = _service_factory(service)
+    if factory is None:
+        return service
+    if getattr(_thread_local, "service", None) is None:
+        _thread_local.service = factory()
+    return _thread_local.service
+
+
+def build_drive_index(service):
+    """
+    Builds the in-memory index of the target folder and makes it the one
+    used by the path and name lookups below.
+
+    Args:
+        service: The authenticated Google Drive API service object.
+
+    Returns:
+        DriveIndex: The new index.
+    """
+    global DRIVE_INDEX
+    DRIVE_INDEX = drive_index.DriveIndex.build(service, TARGET_FOLDER_ID, service_factory=_service_factory(service))
+    print(f"✅ Indexed {len(DRIVE_INDEX.entries)} Drive items.")
+    return DRIVE_INDEX
+
+
+def sync_drive_index(service):
+    """
+    Brings the drive index up to date through the Drive changes feed.
+
+    Only the changes since the last sync are fetched; a full walk is done
+    when there is no saved index yet.
+
+    Args:
+        service: The authenticated Google Drive API service object.
+
+    Returns:
+        tuple: (DriveIndex, number of changes applied; -1 after a full walk)
+    """
+    global DRIVE_INDEX
+    DRIVE_INDEX, changed = drive_sync.sync(service, TARGET_FOLDER_ID, service_factory=_service_factory(service))
+    print(f"✅ Drive index synced ({'full reload' if changed < 0 else f'{changed} changes'}).")
+    return DRIVE_INDEX, changed
+
 
-def extract_text_from_file(raw_data: bytes, filename: str) -> str:
+def extract_text_from_file(raw_data: bytes, filename: str, max_pages: int | None = None,
+                           max_chars: int | None = None) -> str:
     """
     Extracts plain text from raw byte data of a file.
 
     This function supports .pdf, .docx, and .txt files. It determines the
     file type from the filename's extension and uses the appropriate library
-    to extract the text content.
+    to extract the text content. PDF and DOCX parsing runs in a process pool
+    (see text_extraction), so other requests keep being served meanwhile.
 
     Args:
         raw_data: The raw content of the file as a bytes object.
         filename: The original name of the file (e.g., "my_syllabus.pdf").
+        max_pages: Only read this many pages of a PDF.
+        max_chars: Stop once this many characters are extracted.
 
     Returns:
         A string containing the extracted text, or an error message if the
@@ -50,21 +136,12 @@ def extract_text_from_file(raw_data: bytes, filename: str) -> str:
 
     try:
         if extension == '.pdf':
-            # Use io.BytesIO to treat the raw byte data like a file
-            pdf_file = io.BytesIO(raw_data)
-            reader = PdfReader(pdf_file)
-            # Loop through all pages and concatenate their text
-            for page in reader.pages:
-                # Add 'or ""' to handle pages with no extractable text
-                text_content += page.extract_text() or ""
+            # Pages are parsed in the process pool and joined once at the end
+            text_content = text_extraction.extract_pdf_text(raw_data, max_pages=max_pages, max_chars=max_chars)
 
         elif extension == '.docx':
-            # python-docx can also read from a file-like object
-            docx_file = io.BytesIO(raw_data)
-            document = Document(docx_file)
             # Join the text from all paragraphs
-            all_paragraphs = [p.text for p in document.paragraphs]
-            text_content = "\n".join(all_paragraphs)
+            text_content = text_extraction.extract_docx_text(raw_data, max_chars=max_chars)
 
 
         elif extension in ['.txt', '.json']:
@@ -74,6 +151,8 @@ def extract_text_from_file(raw_data: bytes, filename: str) -> str:
             # into a string using the common UTF-8 encoding.
 
             text_content = raw_data.decode('utf-8')
+            if max_chars is not None:
+                text_content = text_content[:max_chars]
 
         else:
             return f"Error: Unsupported file type '{extension}'. This function only supports .pdf, .docx, and .txt files."
@@ -96,7 +175,9 @@ def download_file_content(service, file_id):
     Returns:
         bytes: The content of the file as bytes, or None if an error occurs.
     """
-    try:
+    from googleapiclient.http import MediaIoBaseDownload
+
+    def _download():
         # Prepare the request to get the file's media content.
         request = service.files().get_media(fileId=file_id)
 
@@ -109,11 +190,15 @@ def download_file_content(service, file_id):
         while done is False:
             status, done = downloader.next_chunk()
             print(f"Download {int(status.progress() * 100)}%.")
-
-        print("✅ Download complete.")
         # Return the downloaded content by getting the value from the BytesIO buffer.
         return fh.getvalue()
 
+    try:
+        # requests that want the same file at the same time share one download
+        content = drive_scheduler.call(("media", file_id), _download)
+        print("✅ Download complete.")
+        return content
+
     except HttpError as error:
         print(f"An error occurred while downloading the file: {error}")
         return None
@@ -130,23 +215,61 @@ def create_sharable_link(service, file_id):
     Returns:
         str: The public webViewLink for the file, or None if an error occurs.
     """
-    try:
-        # Define the permission to make the file public for anyone with the link.
-        permission = {"type": "anyone", "role": "reader"}
+    return create_sharable_links(service, [file_id]).get(file_id)
 
-        # Create the permission.
-        service.permissions().create(fileId=file_id, body=permission).execute()
 
-        # Get the file's metadata again to retrieve the shareable link.
-        # We request the 'webViewLink' field which contains the URL.
-        file_metadata = service.files().get(fileId=file_id, fields="webViewLink").execute()
+def create_sharable_links(service, file_ids):
+    """
+    Creates public, shareable links for many files in as few calls as possible.
 
-        print("✅ Sharable link created successfully.")
-        return file_metadata.get("webViewLink")
+    The permission creates and the webViewLink lookups go out together in Drive
+    batch requests (webViewLink does not change when a permission is added).
+    Links already in the drive index are not looked up again, so for indexed
+    files only the permission creates are sent.
 
-    except HttpError as error:
-        print(f"An error occurred while creating the sharable link: {error}")
-        return None
+    Args:
+        service: The authenticated Google Drive API service object.
+        file_ids (list[str]): The IDs of the files to share.
+
+    Returns:
+        dict: file ID -> public webViewLink, for the files that could be shared.
+    """
+    file_ids = [file_id for file_id in dict.fromkeys(file_ids) if file_id]
+    if not file_ids:
+        return {}
+    # Define the permission to make the file public for anyone with the link.
+    permission = {"type": "anyone", "role": "reader"}
+
+    known_links = {}
+    if DRIVE_INDEX is not None:
+        for file_id in file_ids:
+            entry = DRIVE_INDEX.get_entry(file_id)
+            if entry and entry.get("webViewLink"):
+                known_links[file_id] = entry["webViewLink"]
+
+    requests = {}
+    for file_id in file_ids:
+        requests[f"permission:{file_id}"] = service.permissions().create(fileId=file_id, body=permission)
+        if file_id not in known_links:
+            requests[f"link:{file_id}"] = service.files().get(fileId=file_id, fields="webViewLink")
+    with telemetry.span("drive.share", requests=len(requests)) as share_span:
+        # the same links asked for at the same time are shared once
+        results, errors = drive_scheduler.call(("batch", tuple(sorted(requests))),
+                                               lambda: drive_batch.execute(service, requests), cost=0, retry=False)
+        share_span.set(files=len(file_ids), errors=len(errors))
+    for key, error in errors.items():
+        print(f"An error occurred while creating the sharable link ({key}): {error}")
+
+    links = {}
+    for file_id in file_ids:
+        if f"permission:{file_id}" not in results:
+            continue
+        link = known_links.get(file_id) or results.get(f"link:{file_id}", {}).get("webViewLink")
+        if link:
+            links[file_id] = link
+    if links:
+        print(f"✅ {len(links)} sharable link(s) created successfully.")
+    return links
 
 
 def get_file_id_from_path(service, file_path: str) -> str | None:
@@ -163,6 +286,11 @@ def get_file_id_from_path(service, file_path: str) -> str | None:
     if not service or not file_path:
         return None
 
+    if DRIVE_INDEX is not None:
+        file_id = DRIVE_INDEX.get_id(file_path)
+        if file_id:
+            return file_id
+
     # Split the path into its components
     path_parts = file_path.strip("/").split("/")
 
@@ -179,12 +307,12 @@ def get_file_id_from_path(service, file_path: str) -> str | None:
 
         try:
             # Search for the current part (file or folder) in the parent folder
-            response = service.files().list(
+            response = drive_scheduler.call(("child", parent_id, part), lambda: service.files().list(
                 q=query,
                 spaces='drive',
                 fields='files(id, name, mimeType)',
                 corpora='user'  # Or 'allDrives' if searching in Shared Drives
-            ).execute()
+            ).execute())
 
             items = response.get('files', [])
 
@@ -227,6 +355,11 @@ def get_file_by_path(service, file_path, start_folder_name=TARGET_FOLDER_NAME):
         print("Error: The file path is empty.")
         return None
 
+    if DRIVE_INDEX is not None:
+        entry = DRIVE_INDEX.get_entry(DRIVE_INDEX.get_id("/".join(path_parts)))
+        if entry and entry["mimeType"] != drive_index.FOLDER_MIME_TYPE:
+            return {"id": entry["id"], "name": entry["name"]}
+
     current_folder_id = start_folder_id
 
     # Traverse the path component by component
@@ -249,8 +382,9 @@ def get_file_by_path(service, file_path, start_folder_name=TARGET_FOLDER_NAME):
                 f"trashed = false"
             )
 
-            results = (
-                service.files()
+            results = drive_scheduler.call(
+                ("child", current_folder_id, part, is_last_part),
+                lambda: service.files()
                 .list(
                     q=query,
                     pageSize=2,
@@ -283,35 +417,28 @@ def get_file_by_path(service, file_path, start_folder_name=TARGET_FOLDER_NAME):
 
 def list_items_recursively(service, folder_id, indent="",f=sys.stdout):
     """
-    Recursively lists files and folders in a given folder, creating a tree view.
-    """
-    page_token = None
-    while True:
-        try:
-            results = (
-                service.files()
-                .list(
-                    q=f"'{folder_id}' in parents and trashed=false",
-                    pageSize=100,
-                    fields="nextPageToken, files(id, name, mimeType)",
-                    pageToken=page_token,
-                )
-                .execute()
-            )
-            items = results.get("files", [])
+    Lists files and folders in a given folder, creating a tree view.
 
-            for item in items:
-                print(f"{indent}├── {item['name']}",file=f)
-                if item["mimeType"] == "application/vnd.google-apps.folder":
-                    list_items_recursively(service, item["id"], indent + "    ",f)
+    The tree is listed with one parallel walk (see drive_traversal) and then
+    printed, so every page of every folder is included.
+    """
+    index = drive_index.DriveIndex.build(service, folder_id, service_factory=_service_factory(service))
+    for depth, entry in index.iter_tree():
+        slash = "/" if entry["mimeType"] == drive_index.FOLDER_MIME_TYPE else ""
+        print(f"{indent}{'    ' * depth}├── {entry['name']}{slash}", file=f)
 
-            page_token = results.get("nextPageToken", None)
-            if page_token is None:
-                break
 
-        except HttpError as error:
-            print(f"An error occurred while listing folder {folder_id}: {error}")
-            break
+def _file_part(file_name, text):
+    """Wraps extracted text in the dict shape the LLM tools return."""
+    # Guess the file's MIME type from its name.
+    mime_type, _ = mimetypes.guess_type(file_name)
+    if mime_type is None:
+        mime_type = "application/octet-stream"  # A generic default
+    return {
+        "file_name": file_name,
+        "mime_type": mime_type,
+        "data": text
+    }
 
 
 def get_upload_ready_file_for_llm(file_name, file_content):
@@ -325,19 +452,197 @@ def get_upload_ready_file_for_llm(file_name, file_content):
     Returns:
         content ready file
     """
-    # Step 1: Guess the file's MIME type from its name.
-    mime_type, _ = mimetypes.guess_type(file_name)
-    if mime_type is None:
-        mime_type = "application/octet-stream"  # A generic default
+    return _file_part(file_name, extract_text_from_file(file_content,filename=file_name))
+
+
+def get_file_metadata(service, file_id, fresh=False):
+    """
+    Returns the name, md5Checksum and modifiedTime of a file.
+
+    The drive index answers without an API call unless fresh is set;
+    otherwise a single files().get is made.
+
+    Args:
+        service: An authenticated Google Drive API service object.
+        file_id (str): The ID of the file.
+        fresh (bool): Ask Drive even if the file is indexed.
+
+    Returns:
+        dict: The metadata, or None if an error occurs.
+    """
+    return get_files_metadata(service, [file_id], fresh=fresh).get(file_id)
+
+
+def get_files_metadata(service, file_ids, fields="id, name, md5Checksum, modifiedTime", fresh=False):
+    """
+    Returns the metadata of many files.
+
+    Files in the drive index are answered from it; the rest are fetched with
+    batched files().get calls.
+
+    Args:
+        service: An authenticated Google Drive API service object.
+        file_ids (list[str]): The IDs of the files.
+        fields (str): The fields to request from Drive.
+        fresh (bool): Fetch indexed files from Drive too. The index is only
+            as new as the last sync, so the text cache asks for the current
+            md5Checksum before trusting a hit. An indexed file whose fetch
+            fails falls back to its index entry.
+
+    Returns:
+        dict: file ID -> metadata, for the files that could be read.
+    """
+    metadata = {}
+    missing = []
+    indexed = {}
+    for file_id in dict.fromkeys(file_ids):
+        entry = DRIVE_INDEX.get_entry(file_id) if DRIVE_INDEX is not None else None
+        if entry and not fresh:
+            metadata[file_id] = entry
+        else:
+            missing.append(file_id)
+            if entry:
+                indexed[file_id] = entry
+    if missing:
+        results, errors = drive_scheduler.call(
+            ("metadata", fields, tuple(missing)),
+            lambda: drive_batch.execute(
+                service, {file_id: service.files().get(fileId=file_id, fields=fields) for file_id in missing}),
+            cost=0, retry=False)
+        metadata.update(results)
+        for file_id, error in errors.items():
+            print(f"An error occurred while reading metadata of {file_id}: {error}")
+            if file_id in indexed:
+                metadata[file_id] = indexed[file_id]
+    return metadata
+
+
+def _is_extraction_error(text, file_name):
+    return text.startswith((f"Error processing file '{file_name}'", "Error: Unsupported file type"))
+
+
+def _context_resolve_stage(service, request):
+    """
+    Pipeline stage 1: path or id -> metadata, answered from the text cache when possible.
+
+    The cache is checked against the file's current md5Checksum from Drive
+    (request["metadata"] when the caller fetched it in a batch), not the
+    index's, so a file edited since the last sync is extracted again.
+    """
+    service = thread_service(service)
+    with telemetry.span("drive.resolve") as resolve_span:
+        file_id = request.get("file_id") or get_file_id_from_path(service, request["path"])
+        if not file_id:
+            resolve_span.outcome = "not_found"
+            return context_pipeline.Done(_file_part(request["path"], f"Error: File '{request['path']}' was not found."))
+        metadata = request.get("metadata") or get_file_metadata(service, file_id, fresh=True) or {}
+        file_name = metadata.get("name") or get_file_name_from_id(service, file_id)
+        version = metadata.get("md5Checksum") or metadata.get("modifiedTime")
+        if version and (CONTEXT_MAX_PAGES or CONTEXT_MAX_CHARS):
+            # a budgeted extraction is a different cache entry than the full text
+            version = f"{version}:{CONTEXT_MAX_PAGES}:{CONTEXT_MAX_CHARS}"
+        resolve_span.set(file_id=file_id)
+        if version:
+            text = text_cache.get(file_id, version)
+            resolve_span.set(cache="miss" if text is None else "hit")
+            if text is not None:
+                print(f"✅ Text cache hit for '{file_name}'.")
+                return context_pipeline.Done(_file_part(file_name, text))
+        return {"file_id": file_id, "file_name": file_name, "version": version}
+
+
+def _context_download_stage(service, state):
+    """Pipeline stage 2: download the raw bytes."""
+    with telemetry.span("drive.download", file_id=state["file_id"]) as download_span:
+        state["content"] = download_file_content(thread_service(service), state["file_id"])
+        if state["content"] is None:
+            download_span.outcome = "error"
+        else:
+            download_span.set(bytes=len(state["content"]), files=1)
+    return state
+
+
+def _context_extract_stage(state):
+    """Pipeline stage 3: extract the text and remember it in the text cache."""
+    file_type = os.path.splitext(state["file_name"])[1].lower().lstrip(".") or "none"
+    with telemetry.span("extract", file_type=file_type) as extract_span:
+        text = extract_text_from_file(state["content"], filename=state["file_name"],
+                                      max_pages=CONTEXT_MAX_PAGES, max_chars=CONTEXT_MAX_CHARS)
+        extract_span.set(bytes=len(state["content"] or b""), files=1, chars=len(text))
+        if _is_extraction_error(text, state["file_name"]):
+            extract_span.outcome = "error"
+    # only successful extractions are cached; errors are retried next time
+    if state["version"] and state["content"] is not None and not _is_extraction_error(text, state["file_name"]):
+        text_cache.put(state["file_id"], state["version"], text)
+    return _file_part(state["file_name"], text)
+
+
+def _context_stages(service):
+    return [
+        context_pipeline.Stage("resolve", lambda request: _context_resolve_stage(service, request),
+                               context_pipeline.IO_EXECUTOR),
+        context_pipeline.Stage("download", lambda state: _context_download_stage(service, state),
+                               context_pipeline.IO_EXECUTOR),
+        context_pipeline.Stage("extract", _context_extract_stage, context_pipeline.EXTRACT_EXECUTOR),
+    ]
+
+
+def get_upload_ready_file_by_id(service, file_id):
+    """
+    Like get_upload_ready_file_for_llm, but goes through the extracted-text cache.
+
+    The cache is keyed by the file id and its md5Checksum (or modifiedTime),
+    so an unchanged file is neither downloaded nor parsed again.
+
+    Args:
+        service: An authenticated Google Drive API service object.
+        file_id (str): The ID of the file.
+
+    Returns:
+        content ready file
+    """
+    value = {"file_id": file_id, "path": file_id}
+    for stage in _context_stages(service):
+        value = stage.func(value)
+        if isinstance(value, context_pipeline.Done):
+            return value.value
+    return value
+
+
+def get_upload_ready_files_by_path(service, file_paths, timeout=context_pipeline.FILE_TIMEOUT):
+    """
+    Fetches several files for the LLM at once.
+
+    Path resolution, downloads and text extraction of different files overlap
+    (see context_pipeline), so the call takes about as long as the slowest
+    file instead of the sum of all of them.
+
+    Args:
+        service: An authenticated Google Drive API service object.
+        file_paths (list[str]): Paths relative to the target folder.
+        timeout (float): Seconds each file may take before an error is returned for it.
+
+    Returns:
+        list[dict]: One content ready file per path, in the same order.
+    """
+    def _error(request, error):
+        print(f"An error occurred while fetching '{request['path']}': {error}")
+        return _file_part(request["path"], f"Error fetching file '{request['path']}': {error}")
+
+    # the current checksums of the indexed files, in one batch call
+    file_ids = {path: DRIVE_INDEX.get_id(path) for path in file_paths} if DRIVE_INDEX is not None else {}
+    known = [file_id for file_id in file_ids.values() if file_id]
+    metadata = get_files_metadata(service, known, fresh=True) if known else {}
+
+    return context_pipeline.run(
+        [{"path": path, "file_id": file_ids.get(path), "metadata": metadata.get(file_ids.get(path))}
+         for path in file_paths],
+        _context_stages(service),
+        timeout=timeout,
+        on_error=_error,
+    )
+
 
-    # Step 2: Create the file part for the prompt.
-    # The SDK handles the encoding. You just provide the raw bytes and MIME type.
-    file_part = {
-        "file_name": file_name,
-        "mime_type": mime_type,
-        "data": extract_text_from_file(file_content,filename=file_name)
-    }
-    return file_part
 '''development stage auth'''
 # def authenticate_and_return_service():
 #     """Shows basic usage of the Drive v3 API."""
@@ -365,7 +670,7 @@ def get_upload_ready_file_for_llm(file_name, file_content):
 
 '''production stage auth'''
 def authenticate_and_return_service():
-    global TARGET_FOLDER_ID
+    global TARGET_FOLDER_ID, CREDENTIALS
     """Authenticates the service account and returns the Drive service."""
 
     # The path to your service account key file
@@ -375,12 +680,18 @@ def authenticate_and_return_service():
     SCOPES = ['https://www.googleapis.com/auth/drive']
 
     try:
+        from google.oauth2 import service_account
+        from googleapiclient.discovery import build
         creds = service_account.Credentials.from_service_account_file(
             SERVICE_ACCOUNT_FILE, scopes=SCOPES)
 
         service = build('drive', 'v3', credentials=creds)
+        CREDENTIALS = creds
         print("✅ Authentication successful.")
-        TARGET_FOLDER_ID = find_shared_folder_id(service,TARGET_FOLDER_NAME)
+        # the folder is looked up once per process; TARGET_FOLDER_ID in the
+        # environment skips the search across all drives entirely
+        if not TARGET_FOLDER_ID:
+            TARGET_FOLDER_ID = os.getenv("TARGET_FOLDER_ID") or find_shared_folder_id(service,TARGET_FOLDER_NAME)
         return service
 
     except FileNotFoundError:
@@ -402,10 +713,16 @@ def get_file_name_from_id(service, file_id: str) -> str:
     Returns:
         The name of the file as a string, or an error message.
     """
+    if DRIVE_INDEX is not None:
+        name = DRIVE_INDEX.get_name(file_id)
+        if name:
+            return name
+
     try:
         # Call the Drive v3 API's files().get() method
         # 'fields="name"' tells the API to only return the file's name
-        file_metadata = service.files().get(fileId=file_id, fields='name').execute()
+        file_metadata = drive_scheduler.call(("name", file_id),
+                                             lambda: service.files().get(fileId=file_id, fields='name').execute())
 
         # The result is a dictionary, e.g., {'name': 'My Document.docx'}
         return file_metadata.get('name')
@@ -439,7 +756,7 @@ def find_shared_folder_id(service, folder_name: str) -> str | None:
             f"trashed = false"
         )
 
-        response = service.files().list(
+        response = drive_scheduler.call(("shared_folder", folder_name), lambda: service.files().list(
             q=query,
             spaces='drive',
             fields='files(id, name)',
@@ -448,7 +765,7 @@ def find_shared_folder_id(service, folder_name: str) -> str | None:
             corpora='allDrives',
             includeItemsFromAllDrives=True,
             supportsAllDrives=True
-        ).execute()
+        ).execute())
 
         items = response.get('files', [])
 
@@ -469,84 +786,34 @@ def find_shared_folder_id(service, folder_name: str) -> str | None:
 
 def list_files_with_full_path(service, folder_id, f=sys.stdout):
     """
-    Recursively lists all files with their full paths from within the subfolders
+    Lists all files with their full paths from within the subfolders
     of a starting folder ID.
 
+    The tree is listed with one parallel walk (see drive_traversal) that
+    follows every result page, so large folders are no longer truncated.
+
     Args:
         service: An authenticated Google Drive API service object.
         folder_id (str): The ID of the folder whose sub-contents are to be listed.
         f (file, optional): A file-like object to write the output to.
                             Defaults to sys.stdout (the console).
     """
-
-    # This helper function will handle the recursion
-    def _list_recursively(current_folder_id, current_path):
-        """
-        Helper function to traverse folders and print file paths.
-
-        Args:
-            current_folder_id (str): The ID of the folder currently being processed.
-            current_path (str): The path built so far to the current folder.
-        """
-        try:
-            # Query to get all items (files and folders) in the current folder
-            query = f"'{current_folder_id}' in parents and trashed = false"
-            results = service.files().list(
-                q=query,
-                pageSize=1000,  # Get up to 1000 items at a time
-                fields="nextPageToken, files(id, name, mimeType)"
-            ).execute()
-
-            items = results.get('files', [])
-
-            if not items:
-                return
-
-            for item in items:
-                item_name = item.get('name')
-                item_id = item.get('id')
-                mime_type = item.get('mimeType')
-
-                # Construct the full path for the current item
-                # If current_path is empty, don't add a leading '/'
-                new_path = f"{current_path}/{item_name}" if current_path else item_name
-
-                # If the item is a folder, make a recursive call
-                if mime_type == 'application/vnd.google-apps.folder':
-                    _list_recursively(item_id,
-                                      new_path)
-                else:
-                    # If it's a file, print its full path
-                    print(new_path, file=f)
-
-        except Exception as e:
-            print(f"An error occurred: {e}", file=f)
-
-    # --- Start the process ---
-    # Initial call to the recursive helper function.
-    # We start with an empty path so the root folder's name is not included.
     try:
-        _list_recursively(folder_id, "")
+        index = drive_index.DriveIndex.build(service, folder_id, service_factory=_service_factory(service))
+        # We start with an empty path so the root folder's name is not included.
+        index.write_paths(f=f)
     except Exception as e:
         print(f"An error occurred while starting the process: {e}")
 
-    # --- Start the process ---
-    # First, get the name of the root folder to start the path
-    # try:
-    #     root_folder = service.files().get(fileId=folder_id, fields='name').execute()
-    #     root_folder_name = root_folder.get('name')
-    #     print(f"Starting from root folder: {root_folder_name}")
-    #
-    #     # Initial call to the recursive helper function
-    #     _list_recursively(folder_id, root_folder_name)
-    #
-    # except Exception as e:
-    #     print(f"Could not find the starting folder with ID '{folder_id}'. Error: {e}")
-
 
 #only for testing phase
 def main():
     """Shows basic usage of the Drive v3 API."""
+    from google.auth.transport.requests import Request
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    from googleapiclient.discovery import build
+    from pypdf import PdfReader
     creds = None
     if os.path.exists("pvt/token.json"):
         creds = Credentials.from_authorized_user_file("pvt/token.json", SCOPES)
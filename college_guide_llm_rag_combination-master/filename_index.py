@@ -0,0 +1,279 @@
+"""
+Structured index over the tagged file names in static/paths.txt.
+
+User notes follow the naming convention
+
+    $$USER-NOTES$$by-<user>_<subject>_lecture-<n>_<date>_<topic>.<ext>
+
+and live in folders like DTU/<subject>/semester-<n>/. Each path is parsed once
+into a record, and every field gets an inverted index from value (or word)
+to record ids, so a query is an intersection of a few small sets instead of
+substring scans over every path. Matching is on whole words and numbers, so
+semester 1 no longer matches semester-11. Dates and lecture numbers are kept
+in sorted interval indexes, so any date or lecture range can be asked for and
+files that cover a range of dates or lectures are matched by overlap. Subject,
+user and topic words also go into trigram indexes, so a misspelt word (or a
+misspelt folder name) still finds the closest known words.
+"""
+import os
+import re
+import threading
+from collections import defaultdict
+
+import interval_index
+import trigram_index
+
+PATHS_FILE = "static/paths.txt"
+
+_TAG_RE = re.compile(r"^(\$\$[A-Z-]+\$\$):?")
+_SEMESTER_RE = re.compile(r"^semester-?(\d+)$", re.IGNORECASE)
+_LECTURE_RE = re.compile(r"^lecture-(\d+)(?:-to-(\d+))?$", re.IGNORECASE)
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-(?:\d{2}|\(\d{2}-\d{2}\))$")
+_CAMEL_RE = re.compile(r"(?<=[a-z])(?=[A-Z])")
+
+
+def tokenize(text):
+    """Splits a name into lowercase words and numbers; camelCase counts as two words."""
+    text = _CAMEL_RE.sub(" ", str(text))
+    return [token for token in re.split(r"[^0-9a-z]+", text.lower()) if token]
+
+
+def _first_number(value):
+    match = re.search(r"\d+", str(value))
+    return int(match.group()) if match else None
+
+
+def parse_path(path):
+    """
+    Parses one line of paths.txt into a record.
+
+    Args:
+        path (str): A path relative to the target folder.
+
+    Returns:
+        dict: The record, with the keys path, folders, tag, user, subject,
+        lecture, date, topic and semester. Fields missing from the name are None.
+    """
+    # The name starts at the tag; a few names (links) contain '/' themselves.
+    tag_at = path.find("$$")
+    if tag_at >= 0:
+        folders, name = path[:tag_at].strip("/"), path[tag_at:]
+    else:
+        folders, _, name = path.rpartition("/")
+    folders = [folder for folder in folders.split("/") if folder]
+
+    record = {
+        "path": path,
+        "folders": folders,
+        "tag": None,
+        "user": None,
+        "subject": None,
+        "lecture": None,
+        "date": None,
+        "topic": None,
+        "semester": None,
+    }
+    for folder in folders:
+        match = _SEMESTER_RE.match(folder)
+        if match:
+            record["semester"] = int(match.group(1))
+
+    match = _TAG_RE.match(name)
+    if match:
+        record["tag"] = match.group(1)
+        name = name[match.end():]
+    if not name.startswith("http"):
+        name = os.path.splitext(name)[0]
+
+    parts = name.split("_")
+    if not parts[0].lower().startswith("by-"):
+        record["topic"] = name
+        return record
+
+    record["user"] = parts[0][3:]
+    rest = parts[1:]
+    markers = []
+    for i, part in enumerate(rest):
+        if _LECTURE_RE.match(part):
+            record["lecture"] = part[len("lecture-"):]
+            markers.append(i)
+        elif _DATE_RE.match(part):
+            record["date"] = part
+            markers.append(i)
+    # the subject runs up to the lecture or date field, the topic is what follows
+    if markers:
+        record["subject"] = "_".join(rest[:markers[0]]) or None
+        record["topic"] = "_".join(rest[markers[-1] + 1:]) or None
+    elif rest:
+        record["subject"] = rest[0]
+        record["topic"] = "_".join(rest[1:]) or None
+    return record
+
+
+def _normalize_tag(tag):
+    tag = str(tag).strip().strip(":").upper()
+    return tag if tag.startswith("$$") else f"$${tag.strip('$')}$$"
+
+
+class FilenameIndex:
+    """
+    Inverted indexes over the parsed file names.
+
+    Args:
+        paths (list[str]): The lines of paths.txt.
+    """
+
+    def __init__(self, paths):
+        self.records = []
+        self.by_tag = defaultdict(set)
+        self.by_semester = defaultdict(set)
+        self.by_subject_word = defaultdict(set)
+        self.by_user_word = defaultdict(set)
+        self.by_topic_word = defaultdict(set)
+        self.subject_words = trigram_index.TrigramIndex()
+        self.user_words = trigram_index.TrigramIndex()
+        self.topic_words = trigram_index.TrigramIndex()
+        self.lectures = interval_index.IntervalIndex()
+        self.dates = interval_index.IntervalIndex()
+        for path in paths:
+            path = path.strip("\n")
+            if path:
+                self.add(parse_path(path))
+
+    def add(self, record):
+        """Adds a parsed record to every field index."""
+        record_id = len(self.records)
+        self.records.append(record)
+        if record["tag"]:
+            self.by_tag[record["tag"]].add(record_id)
+        if record["semester"] is not None:
+            self.by_semester[record["semester"]].add(record_id)
+        # the subject can be in the name or only in a folder name ('maths/semester-1/...')
+        subject_words = tokenize(record["subject"] or "")
+        for folder in record["folders"]:
+            subject_words.extend(tokenize(folder))
+        for word in subject_words:
+            self.by_subject_word[word].add(record_id)
+            self.subject_words.add(word)
+        if record["user"]:
+            for word in tokenize(record["user"]) + [record["user"].lower()]:
+                self.by_user_word[word].add(record_id)
+                self.user_words.add(word)
+        for word in tokenize(record["topic"] or ""):
+            self.by_topic_word[word].add(record_id)
+            self.topic_words.add(word)
+        lectures = interval_index.parse_number_range(record["lecture"])
+        if lectures:
+            self.lectures.add(*lectures, record_id)
+        dates = interval_index.parse_date_range(record["date"])
+        if dates:
+            self.dates.add(*dates, record_id)
+        return record_id
+
+    def _words_match(self, index, vocabulary, text):
+        """
+        Record ids whose field contains every word of text.
+
+        Each word also matches the closest known words from the trigram
+        vocabulary, even when it is spelt right somewhere: 'engineering' finds
+        the 'cad-engneering-drawing' notes next to the 'cad-engineering-drawing'
+        ones, and 'environmental' finds 'Environmetal_and_green_chemistry'.
+        """
+        words = tokenize(text)
+        if not words:
+            return None
+        matches = []
+        for word in words:
+            ids = set(index.get(word, ()))
+            for similar, _ in vocabulary.search(word):
+                ids |= index[similar]
+            matches.append(ids)
+        return set.intersection(*matches)
+
+    def suggest(self, field, text, limit=3):
+        """
+        Ranks the known words of a field by similarity to text.
+
+        Args:
+            field (str): 'subject', 'user' or 'topic'.
+            text (str): The word to look up.
+            limit (int): The most suggestions to return.
+
+        Returns:
+            list[tuple[str, float]]: (word, similarity) pairs, best first.
+        """
+        vocabulary = {"subject": self.subject_words, "user": self.user_words, "topic": self.topic_words}[field]
+        return vocabulary.search(text, limit=limit)
+
+    def query(self, tag=None, semester=None, subject=None, by_user=None, lecture_no=None, date=None, context=None,
+              **ignored):
+        """
+        Returns the paths matching every given field; None fields are not filtered.
+
+        Args:
+            tag (str): '$$SYSTEM$$', '$$USER-NOTES$$' or '$$USER-BOOK$$'.
+            semester (int): The semester number.
+            subject (str): Words that must all appear in the subject or folder
+                names, allowing for typos.
+            by_user (str): Words that must all appear in the author name, allowing for typos.
+            lecture_no (int | str): A lecture number or range, e.g. 3 or '1-4'.
+                Files whose lecture range overlaps it match.
+            date (str): A date or date range, e.g. '2025-08-12',
+                '2025-08-04 to 2025-08-25' or '2025-08-(04-25)'.
+                Files whose date range overlaps it match.
+            context (str): Topic words. They narrow the result only when some
+                of the matching files mention them; otherwise they are ignored.
+
+        Returns:
+            list[str]: The matching paths, in paths.txt order.
+        """
+        candidates = []
+        if tag is not None:
+            candidates.append(self.by_tag.get(_normalize_tag(tag), set()))
+        if semester is not None:
+            candidates.append(self.by_semester.get(_first_number(semester), set()))
+        if subject is not None:
+            candidates.append(self._words_match(self.by_subject_word, self.subject_words, subject))
+        if by_user is not None:
+            candidates.append(self._words_match(self.by_user_word, self.user_words, by_user))
+        if lecture_no is not None:
+            lectures = interval_index.parse_number_range(lecture_no)
+            candidates.append(self.lectures.overlapping(*lectures) if lectures else set())
+        if date is not None:
+            dates = interval_index.parse_date_range(date)
+            candidates.append(self.dates.overlapping(*dates) if dates else set())
+        candidates = [ids for ids in candidates if ids is not None]
+
+        if candidates:
+            # intersect starting from the smallest set
+            candidates.sort(key=len)
+            matches = set(candidates[0])
+            for ids in candidates[1:]:
+                matches &= ids
+        else:
+            matches = set(range(len(self.records)))
+
+        if context is not None and matches:
+            on_topic = self._words_match(self.by_topic_word, self.topic_words, context)
+            if on_topic and matches & on_topic:
+                matches &= on_topic
+        return [self.records[i]["path"] for i in sorted(matches)]
+
+
+_loaded = {}
+_load_lock = threading.Lock()
+
+
+def load(paths_file=PATHS_FILE):
+    """
+    Returns the index for paths_file, rebuilding it only when the file changed.
+    """
+    stat = os.stat(paths_file)
+    key = (stat.st_mtime_ns, stat.st_size)
+    with _load_lock:
+        cached = _loaded.get(paths_file)
+        if cached is None or cached[0] != key:
+            with open(paths_file, "r", encoding="utf-8") as f:
+                cached = (key, FilenameIndex(f.readlines()))
+            _loaded[paths_file] = cached
+        return cached[1]
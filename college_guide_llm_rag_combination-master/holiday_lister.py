@@ -7,12 +7,11 @@ API_KEY = 'TJWAAyFHif4KQWeaSUOojGRwedxDWtOn'
 COUNTRY_CODE = 'IN'  # Use ISO 3166-1 alpha-2 country codes
 YEAR = datetime.datetime.now().year
 
-# Construct the API URL
-url = f"https://calendarific.com/api/v2/holidays?api_key={API_KEY}&country={COUNTRY_CODE}&year={YEAR}"
-
 # --- API Request and Processing ---
 
-def get_holiday_list():
+def get_holiday_list(year=YEAR):
+    # Construct the API URL
+    url = f"https://calendarific.com/api/v2/holidays?api_key={API_KEY}&country={COUNTRY_CODE}&year={year}"
     try:
         # Check if the API key has been set
         if API_KEY == 'YOUR_API_KEY_HERE':
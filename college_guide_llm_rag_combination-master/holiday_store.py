@@ -0,0 +1,249 @@
+"""
+Local store of public holidays, cached on disk per year.
+
+llm_functions used to call Calendarific at import and print the raw response
+into static/holidays.txt, so every worker boot waited on the network and an
+outage wrote "None". Now:
+
+- each year's holidays are kept in HOLIDAY_CACHE_DIR/holidays-<year>.json as
+  compact {"date", "name", "type"} records, written atomically;
+- reading never touches the network. A year that is missing or older than
+  HOLIDAY_TTL is refetched by refresh(), which the app runs in a background
+  thread; until then the stale copy (or the old holidays.txt) is served;
+- the records are loaded into a HolidayIndex sorted by date, so "is D a
+  holiday", "holidays between A and B" and "next N holidays" are bisects,
+  O(log n) plus the size of the answer.
+"""
+import ast
+import datetime
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+HOLIDAY_CACHE_DIR = os.getenv("HOLIDAY_CACHE_DIR", "cache/holidays")
+HOLIDAY_TTL = int(os.getenv("HOLIDAY_TTL", str(7 * 24 * 60 * 60)))
+# a failed fetch is not retried before this many seconds
+RETRY_INTERVAL = 60 * 60
+# the file the app used to write; still read when a year has no cache yet
+LEGACY_HOLIDAYS_FILE = "static/holidays.txt"
+
+_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_index_cache = {}
+_last_attempt = {}
+
+
+def compact(holidays):
+    """
+    Reduces Calendarific holiday dicts to one {"date", "name", "type"} record per day and name.
+
+    The same holiday is listed once per state or type; those are merged.
+
+    Returns:
+        list[dict]: The records sorted by date, then name.
+    """
+    merged = {}
+    for holiday in holidays:
+        try:
+            day = datetime.date.fromisoformat(holiday["date"]["iso"][:10])
+        except (KeyError, TypeError, ValueError):
+            continue
+        record = merged.setdefault((day, holiday.get("name") or ""),
+                                   {"date": day.isoformat(), "name": holiday.get("name") or "", "type": []})
+        for kind in holiday.get("type") or []:
+            if kind not in record["type"]:
+                record["type"].append(kind)
+    return [merged[key] for key in sorted(merged)]
+
+
+class HolidayIndex:
+    """Holiday records sorted by date, for bisect lookups."""
+
+    def __init__(self, records):
+        self.records = sorted(records, key=lambda record: (record["date"], record["name"]))
+        self._days = [datetime.date.fromisoformat(record["date"]) for record in self.records]
+
+    def __len__(self):
+        return len(self.records)
+
+    def on(self, day):
+        """The holidays on one day."""
+        return self.records[bisect_left(self._days, day):bisect_right(self._days, day)]
+
+    def is_holiday(self, day):
+        return bisect_left(self._days, day) != bisect_right(self._days, day)
+
+    def between(self, start, end):
+        """The holidays from start to end, both included, oldest first."""
+        return self.records[bisect_left(self._days, start):bisect_right(self._days, end)]
+
+    def upcoming(self, how_many, after):
+        """The next how_many holidays on or after a day."""
+        first = bisect_left(self._days, after)
+        return self.records[first:first + max(int(how_many), 0)]
+
+
+def cache_path(year, cache_dir=HOLIDAY_CACHE_DIR):
+    return os.path.join(cache_dir, f"holidays-{year}.json")
+
+
+def read_year(year, cache_dir=HOLIDAY_CACHE_DIR):
+    """
+    Returns:
+        tuple[float, list[dict]]: (when the year was fetched, its records), or None if it is not cached.
+    """
+    try:
+        with open(cache_path(year, cache_dir), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data["fetched"], data["holidays"]
+    except FileNotFoundError:
+        return None
+    except (ValueError, KeyError, TypeError) as e:
+        print(f"Could not read the cached holidays of {year}: {e}")
+        return None
+
+
+def write_year(year, records, cache_dir=HOLIDAY_CACHE_DIR):
+    """Caches a year's records, through a temporary file so readers never see half of it."""
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"year": year, "fetched": time.time(), "holidays": records}, f, ensure_ascii=False)
+        os.replace(tmp_path, cache_path(year, cache_dir))
+    except OSError as e:
+        print(f"Could not cache the holidays of {year}: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def read_legacy(path=LEGACY_HOLIDAYS_FILE):
+    """Reads the old holidays.txt (the printed list of Calendarific dicts) as records."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read().strip()
+        holidays = ast.literal_eval(text) if text else []
+    except FileNotFoundError:
+        return []
+    except (ValueError, SyntaxError) as e:
+        print(f"Could not parse {path}: {e}")
+        return []
+    # holiday_lister returned None when the API was unreachable
+    return compact(holidays) if isinstance(holidays, list) else []
+
+
+def _years(today):
+    # next year too, so "the next holidays" still works in December
+    return today.year, today.year + 1
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def version(today=None, cache_dir=HOLIDAY_CACHE_DIR):
+    """Changes whenever the cached years in use change; used to invalidate derived caches."""
+    today = today or datetime.date.today()
+    return tuple((year, _mtime(cache_path(year, cache_dir))) for year in _years(today))
+
+
+def index(today=None, cache_dir=HOLIDAY_CACHE_DIR):
+    """
+    The index over this year and next year, from the disk cache only.
+
+    Years without a cache fall back to whatever holidays.txt has for them.
+    The index is rebuilt only when a cache file changes.
+    """
+    today = today or datetime.date.today()
+    key = (cache_dir, version(today, cache_dir))
+    cached = _index_cache.get("index")
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    with _lock:
+        records = []
+        legacy = None
+        for year in _years(today):
+            stored = read_year(year, cache_dir)
+            if stored is None:
+                if legacy is None:
+                    legacy = read_legacy()
+                records.extend(record for record in legacy if record["date"].startswith(f"{year}-"))
+            else:
+                records.extend(stored[1])
+        built = HolidayIndex(records)
+        _index_cache["index"] = (key, built)
+    return built
+
+
+def stale_years(today=None, cache_dir=HOLIDAY_CACHE_DIR, ttl=HOLIDAY_TTL):
+    """The years in use whose cache is missing or older than ttl."""
+    today = today or datetime.date.today()
+    now = time.time()
+    stale = []
+    for year in _years(today):
+        stored = read_year(year, cache_dir)
+        if stored is None or now - stored[0] > ttl:
+            stale.append(year)
+    return stale
+
+
+def refresh(today=None, fetch=None, force=False, cache_dir=HOLIDAY_CACHE_DIR):
+    """
+    Fetches the years whose cache is missing or expired. This is the only network access.
+
+    Args:
+        today (datetime.date): The current date; defaults to today.
+        fetch (callable): fetch(year) -> list of Calendarific dicts, or None on failure;
+            defaults to holiday_lister.get_holiday_list.
+        force (bool): Refetch every year in use, even fresh ones or ones that just failed.
+        cache_dir (str): The cache directory.
+
+    Returns:
+        list[int]: The years that were fetched and cached.
+    """
+    today = today or datetime.date.today()
+    if fetch is None:
+        import holiday_lister
+        fetch = holiday_lister.get_holiday_list
+    years = list(_years(today)) if force else stale_years(today, cache_dir)
+    fetched = []
+    with _refresh_lock:
+        for year in years:
+            if not force and time.time() - _last_attempt.get(year, 0) < RETRY_INTERVAL:
+                continue
+            _last_attempt[year] = time.time()
+            holidays = fetch(year)
+            # keep serving the old copy when the API fails or returns nothing
+            if holidays:
+                write_year(year, compact(holidays), cache_dir)
+                fetched.append(year)
+    return fetched
+
+
+def refresh_in_background(**kwargs):
+    """Runs refresh() in a daemon thread if any year needs it. Returns the thread, or None."""
+    if not stale_years(kwargs.get("today"), kwargs.get("cache_dir", HOLIDAY_CACHE_DIR)):
+        return None
+    thread = threading.Thread(target=refresh, kwargs=kwargs, name="holiday-refresh", daemon=True)
+    thread.start()
+    return thread
+
+
+def is_holiday(day):
+    return index().is_holiday(day)
+
+
+def between(start, end):
+    return index().between(start, end)
+
+
+def upcoming(how_many, after=None):
+    return index().upcoming(how_many, after or datetime.date.today())
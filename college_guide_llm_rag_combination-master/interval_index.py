@@ -0,0 +1,99 @@
+"""
+Sorted interval index for date and lecture-number range queries.
+
+File names carry ranges such as lecture-1-to-3 or 2025-08-(04-11). Intervals
+are kept sorted by start; since no stored interval is longer than the longest
+one seen, every interval that overlaps [lo, hi] starts inside
+[lo - longest, hi]. Two bisects find that slice, so a query costs O(log n)
+plus the size of the slice, which for the short spans in file names is the
+number of matches.
+"""
+import re
+from bisect import bisect_left, bisect_right
+from datetime import date
+
+_ISO_DATE_RE = re.compile(r"(\d{4})-(\d{2})-(\d{2})")
+_SHORT_RANGE_RE = re.compile(r"(\d{4})-(\d{2})-\((\d{2})-(\d{2})\)")
+_NUMBER_RANGE_RE = re.compile(r"(\d+)(?:\s*(?:-|to|-to-|\.\.)\s*(\d+))?")
+
+
+class IntervalIndex:
+    """Closed integer intervals [start, end], each tagged with a record id."""
+
+    def __init__(self):
+        self._intervals = []
+        self._starts = []
+        self._longest = 0
+        self._sorted = True
+
+    def __len__(self):
+        return len(self._intervals)
+
+    def add(self, start, end, record_id):
+        if end < start:
+            start, end = end, start
+        self._intervals.append((start, end, record_id))
+        self._longest = max(self._longest, end - start)
+        self._sorted = False
+
+    def _ensure_sorted(self):
+        if not self._sorted:
+            self._intervals.sort()
+            self._starts = [start for start, _, _ in self._intervals]
+            self._sorted = True
+
+    def overlapping(self, lo, hi):
+        """
+        Returns the ids of every interval that shares at least one point with [lo, hi].
+        """
+        if hi < lo:
+            lo, hi = hi, lo
+        self._ensure_sorted()
+        first = bisect_left(self._starts, lo - self._longest)
+        last = bisect_right(self._starts, hi)
+        return {record_id for _, end, record_id in self._intervals[first:last] if end >= lo}
+
+
+def parse_date_range(text):
+    """
+    Parses a date or a date range into ordinal day numbers.
+
+    Understands '2025-08-12', the file-name form '2025-08-(04-11)', and any
+    two dates in one string, e.g. '2025-08-04 to 2025-08-25'.
+
+    Returns:
+        tuple: (first day, last day) as date.toordinal() values, or None.
+    """
+    if text is None:
+        return None
+    text = str(text)
+    try:
+        short = _SHORT_RANGE_RE.search(text)
+        if short:
+            year, month, first, last = map(int, short.groups())
+            return date(year, month, first).toordinal(), date(year, month, last).toordinal()
+        days = [date(*map(int, match)).toordinal() for match in _ISO_DATE_RE.findall(text)]
+    except ValueError:  # e.g. 2025-02-30
+        return None
+    if not days:
+        return None
+    return min(days), max(days)
+
+
+def parse_number_range(value):
+    """
+    Parses a lecture number or range: 3, '3', '1-3', '1 to 3', '1-to-3'.
+
+    Returns:
+        tuple: (first, last), or None.
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value), int(value)
+    match = _NUMBER_RANGE_RE.search(str(value))
+    if not match:
+        return None
+    first = int(match.group(1))
+    last = int(match.group(2)) if match.group(2) else first
+    return min(first, last), max(first, last)
@@ -0,0 +1,186 @@
+"""
+Keyed store of the shareable links handed out to users: path -> file id -> link.
+
+Links used to be appended to static/links.txt as one printed tuple per line,
+which meant reading and literal_eval-ing the whole file on every request and
+unlocked appends from several gunicorn workers. The store is a small sqlite
+database in WAL mode instead:
+
+- a lookup is a primary key read, however many links have been made;
+- a batch of new links is written in one transaction, so it lands completely
+  or not at all;
+- WAL lets every worker keep reading while one of them writes, and writers
+  wait on each other through sqlite's own file locking (busy timeout).
+
+The first time the store at LINK_DB is opened, any existing links.txt is
+imported; other databases start empty (call migrate_links_txt to fill one).
+"""
+import ast
+import os
+import sqlite3
+import threading
+import time
+
+LINK_DB = os.getenv("LINK_STORE_DB", "static/links.db")
+LEGACY_LINKS_FILE = "static/links.txt"
+BUSY_TIMEOUT = 30
+
+_local = threading.local()
+
+
+def _connect(db_path):
+    """Opens a connection in WAL mode and creates the schema if needed."""
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS links ("
+        " path TEXT PRIMARY KEY,"
+        " file_id TEXT,"
+        " link TEXT NOT NULL,"
+        " updated REAL NOT NULL)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS links_file_id ON links (file_id)")
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    return conn
+
+
+def get_connection(db_path=LINK_DB):
+    """
+    Returns this thread's connection to the store, opening it on first use.
+
+    sqlite connections must not be shared between threads, or carried over a
+    fork, so there is one per thread and process.
+    """
+    connections = getattr(_local, "connections", None)
+    if connections is None or _local.pid != os.getpid():
+        connections = _local.connections = {}
+        _local.pid = os.getpid()
+    conn = connections.get(db_path)
+    if conn is None:
+        conn = connections[db_path] = _connect(db_path)
+        # only the app's own store inherits links.txt, not a test or scratch database
+        if os.path.abspath(db_path) == os.path.abspath(LINK_DB):
+            migrate_links_txt(LEGACY_LINKS_FILE, db_path)
+    return conn
+
+
+def parse_links_txt(path):
+    """
+    Reads the old links.txt format, one "(path, link)" tuple per line.
+
+    Lines that cannot be parsed are skipped.
+
+    Returns:
+        list[tuple[str, str]]: (path, link) pairs in file order.
+    """
+    pairs = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                file_path, link = ast.literal_eval(line)
+            except (ValueError, SyntaxError, TypeError) as e:
+                print(f"Skipping unreadable line in {path}: {e}")
+                continue
+            if link:
+                pairs.append((file_path, link))
+    return pairs
+
+
+def migrate_links_txt(txt_path=LEGACY_LINKS_FILE, db_path=LINK_DB):
+    """
+    Imports links.txt into the store, once per database.
+
+    The import and the 'done' marker are written in the same transaction, so
+    when several workers start together only the first one imports. Paths that
+    are already in the store keep their stored link.
+
+    Returns:
+        int: The number of links imported.
+    """
+    if not os.path.exists(txt_path):
+        return 0
+    conn = get_connection(db_path)
+    marker = f"migrated:{os.path.abspath(txt_path)}"
+    if conn.execute("SELECT 1 FROM meta WHERE key = ?", (marker,)).fetchone():
+        return 0
+    pairs = parse_links_txt(txt_path)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if conn.execute("SELECT 1 FROM meta WHERE key = ?", (marker,)).fetchone():
+            conn.execute("ROLLBACK")
+            return 0
+        now = time.time()
+        before = conn.total_changes
+        conn.executemany(
+            "INSERT OR IGNORE INTO links (path, file_id, link, updated) VALUES (?, NULL, ?, ?)",
+            [(file_path, link, now) for file_path, link in pairs],
+        )
+        imported = conn.total_changes - before
+        conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (marker, str(now)))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    print(f"Imported {imported} links from {txt_path}")
+    return imported
+
+
+def get_links(paths, db_path=LINK_DB):
+    """
+    Looks up the stored links of several paths.
+
+    Args:
+        paths (list[str]): File paths relative to the target folder.
+        db_path (str): The database file.
+
+    Returns:
+        dict: path -> link for the paths that have one.
+    """
+    conn = get_connection(db_path)
+    found = {}
+    for file_path in dict.fromkeys(paths):
+        row = conn.execute("SELECT link FROM links WHERE path = ?", (file_path,)).fetchone()
+        if row:
+            found[file_path] = row[0]
+    return found
+
+
+def get_link(file_path, db_path=LINK_DB):
+    """Returns the stored link of one path, or None."""
+    return get_links([file_path], db_path).get(file_path)
+
+
+def put_links(rows, db_path=LINK_DB):
+    """
+    Stores a batch of links in one transaction.
+
+    Args:
+        rows (list[tuple[str, str, str]]): (path, file_id, link) triples. Rows
+            without a link are ignored.
+        db_path (str): The database file.
+
+    Returns:
+        int: The number of rows written.
+    """
+    rows = [(file_path, file_id, link) for file_path, file_id, link in rows if link]
+    if not rows:
+        return 0
+    conn = get_connection(db_path)
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany(
+            "INSERT INTO links (path, file_id, link, updated) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (path) DO UPDATE SET file_id = excluded.file_id, link = excluded.link, "
+            "updated = excluded.updated",
+            [(file_path, file_id, link, now) for file_path, file_id, link in rows],
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return len(rows)
@@ -1,37 +1,90 @@
-import ast
 import pprint
-from datetime import datetime
 
-import holiday_lister
+import holiday_store
 
+import clients
 import file_management_base
-import email_body_extractor
-import google.generativeai as gen
-from google import genai
-from google.genai import types
-from dotenv import load_dotenv
+import filename_index
+import interval_index
+import link_store
+import prompt_context
+import telemetry
+import announcement_store
+import announcement_watcher
+import datetime
 import json
 import os
-from google.generativeai.types import HarmCategory, HarmBlockThreshold
 import re
 import logging
-
-logger,service,apikey,client=None,None,None,None
-
-with open("static/holidays.txt", "w", encoding="utf-8") as f:
-    print(holiday_lister.get_holiday_list(), file=f)
-
+import multiprocessing
+import time
+import threading
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+
+logger,service,apikey,client=logging.getLogger(__name__),None,None,None
+
+# limits of the tool loop in gemini_response_events
+TOOL_MAX_ROUNDS = int(os.getenv("TOOL_MAX_ROUNDS", "4"))
+TOOL_TIME_LIMIT = float(os.getenv("TOOL_TIME_LIMIT", "90"))
+# "off" leaves authentication and the drive sync to the first request that needs them
+WARM_UP = os.getenv("WARM_UP", "on")
+# the function calls of one model turn run concurrently here (the async app uses anyio's threads)
+TOOL_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv("TOOL_WORKERS", "4")), thread_name_prefix="tool")
 
 def initialize():
+    """
+    Sets up the module globals from the process-wide client registry and
+    starts the background announcement watcher and holiday refresh.
+
+    Only the first call authenticates and builds clients (see clients.py);
+    later calls are cheap, so this is safe to call more than once.
+    """
     global logger,service,apikey,client
     logger = logging.getLogger(__name__)
-    service = file_management_base.authenticate_and_return_service()
+    service = clients.primary_service()
+    apikey = clients.gemini_api_key()
+    client = clients.genai_client()
+    announcement_watcher.start()
+    # expired holiday years are refetched off the startup path
+    holiday_store.refresh_in_background()
+
+
+def warm_up():
+    """
+    The remote start-up work: authenticate, sync the drive index and load the Gemini SDK.
+
+    Nothing here runs at import. The web apps call start_warm_up() so the
+    process serves requests (and /healthz) right away; /readyz turns ready
+    once this is done. A request that comes first does the part it needs itself.
+    """
+    started = time.perf_counter()
+    try:
+        initialize()
+        reload_hierarchy()
+        import google.generativeai  # noqa: F401 -- so the first chat does not pay for the import
+        telemetry.tracer()
+    except Exception as e:
+        print(f"An error occurred while warming up: {e}")
+    print(f"Warm-up finished in {time.perf_counter() - started:.1f}s")
 
-    load_dotenv(override=True)
-    apiKey = os.getenv('GEMINI_API_KEY')
-    # The client gets the API key from the environment variable `GEMINI_API_KEY`.
-    client = genai.Client(api_key=apiKey)
-    gen.configure(api_key=apiKey)
+
+_warm_up_thread = None
+
+
+def start_warm_up():
+    """
+    Runs warm_up() once per process in a daemon thread. Returns the thread,
+    or None if WARM_UP=off or this is a child process (e.g. of text_extraction's pool).
+    """
+    global _warm_up_thread
+    # a spawned child is named e.g. SpawnProcess-1 while it re-imports the main module
+    if WARM_UP == "off" or multiprocessing.current_process().name != "MainProcess":
+        return None
+    if _warm_up_thread is None:
+        _warm_up_thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+        _warm_up_thread.start()
+    return _warm_up_thread
 
 
 def parse_list_string(s):
@@ -66,6 +119,10 @@ def safe_extract_assistant_text(response):
         return None
 
 def initialize_gemini_model(chat_history=[]):
+    # the SDK takes about a second to import, so it is loaded on the first chat, not with the app
+    import google.generativeai as gen
+    from google.generativeai.types import HarmCategory, HarmBlockThreshold
+    clients.gemini_api_key()  # configures the SDK once per process
     system_prompt = ""
     with open("static/system_prompt_main_llm.txt", "r", encoding="utf-8") as prompt:
         system_prompt = prompt.read()
@@ -92,10 +149,17 @@ def reload_hierarchy():
     use this function to pull out latest updates from database
     :return True if succesfully executed , False if fails:
     """
+    # only the drive changes since the last sync are fetched; the text files
+    # are rewritten from the index when something actually changed
+    with telemetry.span("drive.sync") as sync_span, clients.drive_service() as service:
+        index, changed = file_management_base.sync_drive_index(service)
+        sync_span.set(changes=changed, indexed=len(index.entries))
+    if not changed and os.path.exists("static/paths.txt") and os.path.exists("static/hierarchy.txt"):
+        return True
     with open("static/paths.txt", "w", encoding="utf-8") as f:
-        file_management_base.list_files_with_full_path(service, file_management_base.TARGET_FOLDER_ID,f=f)
+        index.write_paths(f=f)
     with open("static/hierarchy.txt", "w", encoding="utf-8") as f:
-        file_management_base.list_items_recursively(service,file_management_base.TARGET_FOLDER_ID,f=f)
+        index.write_hierarchy(f=f)
     return True
 
 def request_hierarchy_contents():
@@ -143,11 +207,11 @@ def request_files_for_context(query:str):
 
 
     file_paths=list(query)
+    telemetry.annotate(files=len(file_paths))
 
-    return [
-        file_management_base.get_upload_ready_file_for_llm(file_management_base.get_file_name_from_id(service,fileid),file_management_base.download_file_content(service,fileid))
-        for fileid in [file_management_base.get_file_id_from_path(service,path) for path in file_paths]
-    ]
+    # all files are fetched at once, unchanged ones straight from the text cache
+    with clients.drive_service() as service:
+        return file_management_base.get_upload_ready_files_by_path(service,file_paths)
 
 
 # this is a tool for llm
@@ -188,8 +252,8 @@ def request_files_id_2sharable_link_gemini_rag(query:dict):
                 "tag": "The file type, e.g., '$$SYSTEM$$', '$$USER-NOTES$$', '$$USER-BOOK$$'",
                 "subject": "The main subject,try to write exact subject as given in hierarchy folder names e.g., 'maths', 'cad'",
                 "by_user": "The name of the user who created the notes,DO NOT EDIT THIS VALUE COPY IT AS IT IS FROM user prompt in lowercase e.g., 'deshna'",
-                "lecture_no": "The specific lecture number, e.g., 3",
-                "date": "A specific date or date range !! in format as YYYY-MM-DD only, e.g., '2025-08-12',for range '2025-08-(04-22)'",
+                "lecture_no": "The specific lecture number or range of lectures, e.g., 3, for range '1-4'",
+                "date": "A specific date or date range !! in format as YYYY-MM-DD only, e.g., '2025-08-12',for range '2025-08-04 to 2025-08-22'",
                 "context": "A specific topic within a subject, e.g., 'hyperbolic functions'",
                 "semester": "The semester number, e.g., 1"
             }
@@ -232,7 +296,7 @@ def request_files_id_2sharable_link_gemini_rag(query:dict):
             "subject": "cad",
             "by_user": None,
             "lecture_no": None,
-            "date": "2025-08-(04-25)",
+            "date": "2025-08-04 to 2025-08-25",
             "context": None,
             "semester": None
         }
@@ -289,27 +353,25 @@ def request_files_id_2sharable_link_gemini_rag(query:dict):
     file_paths = match_percent_rag(dict(query))
     #print(file_paths)
     #checking if the link was generated prior to this request
-    with open("static/links.txt","r",encoding="utf-8") as f:
-        already_gen_links = { ast.literal_eval(i.replace('\n',''))[0]:ast.literal_eval(i.replace('\n',''))[1] for i in f.readlines()}
-
+    already_gen_links = link_store.get_links(file_paths)
 
     # filtering which are the new files user requested that we don't have a link of
     file_to_find_id = [path for path in file_paths if path not in already_gen_links]
+    telemetry.annotate(links_cached=len(already_gen_links), links_created=len(file_to_find_id))
 
-
-
-    #print(file_to_find_id)
     #id's of new files requested
-    ids = [file_management_base.get_file_id_from_path(service, path) for path in file_to_find_id]
-    links = [file_management_base.create_sharable_link(service,id) for id in ids]
-    #updating our links file
-    with open("static/links.txt","a+",encoding="utf-8") as f:
-        for link in zip(file_paths, links):
-            if link not in already_gen_links.items():
-                if link[1] != None:
-                    print(link,file=f)
-    # returning final result as all the links+file paths for context
-    return (links+[already_gen_links.get(file) for file in file_paths if file in already_gen_links],file_paths)
+    with clients.drive_service() as service:
+        ids = [file_management_base.get_file_id_from_path(service, path) for path in file_to_find_id]
+        #all permission creates and link lookups go out as batch requests
+        shared = file_management_base.create_sharable_links(service, ids)
+    new_links = [shared.get(id) for id in ids]
+    #storing the new links in one transaction
+    link_store.put_links(zip(file_to_find_id, ids, new_links))
+
+    # returning final result as all the links+file paths for context, in the same order
+    links = {**already_gen_links, **dict(zip(file_to_find_id, new_links))}
+    found_paths = [path for path in file_paths if links.get(path)]
+    return ([links[path] for path in found_paths],found_paths)
 
 
 
@@ -421,115 +483,390 @@ def _parse_arguments(raw_args):
     except Exception:
         return {}
 
-def gemini_main_response(user_prompt: str, gemini_chat):
+def describe_tool_call(fname, args):
+    """A short, user-facing description of a tool call, for progress events."""
+    args = dict(args or {})
+    if fname == "request_files_for_context":
+        names = [os.path.basename(str(path)) for path in list(args.get("query") or [])]
+        return "fetching " + ", ".join(names) if names else "fetching files"
+    if fname == "request_files_id_2sharable_link_gemini_rag":
+        query = dict(args.get("query") or {})
+        subject = query.get("subject") or query.get("context")
+        return f"finding download links for {subject}" if subject else "finding download links"
+    if fname == "read_announcements":
+        return "reading the latest announcements"
+    if fname == "reload_hierarchy":
+        return "refreshing the file list"
+    if fname == "holidays_between":
+        return "checking the holiday calendar"
+    return f"running {fname}"
+
+
+def _chunk_texts(chunk):
+    """The text parts of one streamed chunk."""
+    candidates = _extract_candidates(chunk)
+    if not candidates:
+        return []
+    parts = getattr(getattr(candidates[0], "content", None), "parts", None) or []
+    texts = []
+    for part in parts:
+        text = part.get("text") if isinstance(part, dict) else getattr(part, "text", None)
+        if text:
+            texts.append(text)
+    return texts
+
+
+def _stream_text(response):
+    """Yields the text of every chunk of a streamed response as it arrives."""
+    for chunk in response:
+        yield from _chunk_texts(chunk)
+
+
+async def _stream_text_async(response):
+    """_stream_text for a response from send_message_async."""
+    async for chunk in response:
+        for text in _chunk_texts(chunk):
+            yield text
+
+
+def _usage_attributes(response):
+    """The token counts of a finished response, when the SDK reports its usage_metadata."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return {}
+    prompt_tokens = getattr(usage, "prompt_token_count", None) or 0
+    output_tokens = getattr(usage, "candidates_token_count", None) or 0
+    total = getattr(usage, "total_token_count", None) or prompt_tokens + output_tokens
+    return {"prompt_tokens": prompt_tokens, "output_tokens": output_tokens, "tokens": total}
+
+
+def _extract_function_calls(c):
+    """Every function_call part of a candidate, in order (a turn may ask for several)."""
+    calls = []
+    try:
+        parts = getattr(getattr(c, "content", None), "parts", None) or []
+        for part in parts:
+            if isinstance(part, dict):
+                function_call = part.get("function_call")
+            else:
+                function_call = getattr(part, "function_call", None)
+            if function_call:
+                calls.append(function_call)
+    except Exception:
+        logger.debug("Failed to extract function_calls", exc_info=True)
+    return calls
+
+
+def _call_name_args(function_call):
+    """(name, args dict) of a function_call, whether a dict or a proto."""
+    if isinstance(function_call, dict):
+        return function_call.get("name"), dict(function_call.get("args") or {})
+    return getattr(function_call, "name", None), dict(getattr(function_call, "args", None) or {})
+
+
+def _result_size(result):
+    """How many items and bytes a tool returned, for its span."""
+    try:
+        size = len(json.dumps(result, default=str).encode("utf-8"))
+    except (TypeError, ValueError):
+        size = None
+    return {"results": len(result) if isinstance(result, (list, tuple)) else None, "bytes": size}
+
+
+def _run_tool(fname, args_dict):
+    """Runs one tool in a span of its own and returns its result, or an error dict the model can read."""
+    # the model picks the name; unknown ones share a label so the metrics stay bounded
+    with telemetry.span(f"tool.{fname}" if fname in tool_registry else "tool.unknown") as tool_span:
+        result = _call_tool(fname, args_dict)
+        tool_span.set(**_result_size(result))
+        if _tool_status(result) == "error":
+            tool_span.outcome = "error"
+        return result
+
+
+def _call_tool(fname, args_dict):
+    # guard: empty or whitespace-only name, or a function we do not have
+    if not (isinstance(fname, str) and fname.strip()) or fname not in tool_registry:
+        logger.info("Model requested unknown function '%s'.", fname)
+        return {"error": f"unknown function: {fname}"}
+    print(f'calling function {fname} with arguments {args_dict}')
+    try:
+        # Call the selected function using **dict(args) pattern the project expects.
+        return tool_registry[fname](**args_dict)
+    except TypeError as te:
+        logger.exception("TypeError while calling tool %s with args %r", fname, args_dict)
+        return {"error": f"tool '{fname}' could not be called with provided arguments: {te}"}
+    except Exception as e:
+        logger.exception("Exception while running tool %s", fname)
+        return {"error": f"error running tool {fname}: {e}"}
+
+
+def _tool_status(result):
+    return "error" if isinstance(result, dict) and "error" in result else "done"
+
+
+def _run_tools(calls, deadline):
     """
-    Sends the user prompt to gemini_chat, handles an optional function_call,
-    executes the selected function (if valid) with selected_function(**dict(args)),
-    sends the function result back to the model as a tool-like message,
-    and finally returns the model's final assistant text (string).
+    Runs the function calls of one model turn concurrently.
+
+    Yields progress events as the calls finish, then ("results", list) with
+    one result per call, in the order of the calls. Calls still running at
+    the deadline get a timeout error as their result.
     """
-    # 1) initial model call
-    now = datetime.now()
-    current_datetime_info = {
-        "date": now.strftime("%Y-%m-%d"),
-        "time": now.strftime("%H:%M"),
-        "day": now.strftime("%A")
+    names = []
+    futures = {}
+    for i, function_call in enumerate(calls):
+        fname, args_dict = _call_name_args(function_call)
+        names.append(fname)
+        detail = describe_tool_call(fname, args_dict)
+        yield "tool", {"name": fname, "status": "running", "detail": detail}
+        futures[TOOL_EXECUTOR.submit(telemetry.bind(_run_tool), fname, args_dict)] = (i, detail)
+
+    results = [None] * len(calls)
+    try:
+        for future in as_completed(futures, timeout=max(0.0, deadline - time.monotonic())):
+            i, detail = futures[future]
+            results[i] = future.result()
+            yield "tool", {"name": names[i], "status": _tool_status(results[i]), "detail": detail}
+    except FuturesTimeout:
+        for future, (i, detail) in futures.items():
+            if not future.done():
+                future.cancel()
+                results[i] = {"error": f"{names[i]} did not finish in time"}
+                yield "tool", {"name": names[i], "status": "error", "detail": detail}
+    yield "results", {"names": names, "results": results}
+
+
+async def _run_tools_async(calls, deadline):
+    """
+    _run_tools for the event loop. The tools run in anyio worker threads, under
+    the limiter asgi_app raises to ASGI_THREADS, not in the few TOOL_EXECUTOR
+    threads, so the tools of hundreds of chats do not queue behind each other.
+    """
+    import anyio
+
+    names = []
+    tasks = {}
+    for i, function_call in enumerate(calls):
+        fname, args_dict = _call_name_args(function_call)
+        names.append(fname)
+        detail = describe_tool_call(fname, args_dict)
+        yield "tool", {"name": fname, "status": "running", "detail": detail}
+        # a call that times out is abandoned: its thread finishes on its own and frees its limiter slot
+        task = asyncio.ensure_future(anyio.to_thread.run_sync(
+            telemetry.bind(_run_tool), fname, args_dict, abandon_on_cancel=True))
+        tasks[task] = (i, detail)
+
+    results = [None] * len(calls)
+    pending = set(tasks)
+    while pending:
+        timeout = deadline - time.monotonic()
+        done, pending = await asyncio.wait(pending, timeout=max(0.0, timeout), return_when=asyncio.FIRST_COMPLETED)
+        if not done:
+            break
+        for task in done:
+            i, detail = tasks[task]
+            results[i] = task.result()
+            yield "tool", {"name": names[i], "status": _tool_status(results[i]), "detail": detail}
+    for task in pending:
+        i, detail = tasks[task]
+        task.cancel()
+        results[i] = {"error": f"{names[i]} did not finish in time"}
+        yield "tool", {"name": names[i], "status": "error", "detail": detail}
+    yield "results", {"names": names, "results": results}
+
+
+def _tool_response_content(names, results):
+    """All function results of one round, as one message back to the model."""
+    # Use the exact structure you provided so the model can consume it as tool output.
+    return {
+        "role": "tool",
+        "parts": [
+            {
+                "function_response": {
+                    "name": fname,
+                    "response": {"tool_result": tool_result}
+                }
+            }
+            for fname, tool_result in zip(names, results)
+        ]
     }
-    with open("static/holidays.txt","r",encoding="utf-8") as f:
-        holidays = f.read()
-    response = gemini_chat.send_message([user_prompt,request_hierarchy_contents(),json.dumps(current_datetime_info),holidays])
-
-    # 2) extract candidates and primary candidate
-    candidates = _extract_candidates(response)
-    if not candidates or len(candidates) == 0:
-        # Nothing parsed: return a readable fallback
-        return str(response)
 
-    cand0 = candidates[0]
 
-    # 3) extract assistant text (may be used as fallback)
-    assistant_text = _extract_text_from_candidate(cand0)
+def _tool_round(round_no, deadline):
+    """
+    Decides what happens to the calls of one model turn.
 
-    # 4) extract possible function_call
-    function_call = _extract_function_call_from_candidate(cand0)
+    Returns:
+        str: "run" to run them, "refuse" to answer each with a limit error
+        (the model still needs one response per call), or "stop" when the
+        model kept calling functions after being told to stop.
+    """
+    if round_no > TOOL_MAX_ROUNDS:
+        return "stop"
+    if round_no == TOOL_MAX_ROUNDS or time.monotonic() >= deadline:
+        return "refuse"
+    return "run"
 
-    # 5) if model returned a function_call, validate and attempt to run it
-    if function_call:
-        # normalize name and args
-        if isinstance(function_call, dict):
-            fname = function_call.get("name")
-            raw_args = function_call.get("arguments")
-        else:
-            fname = getattr(function_call, "name", None)
-            raw_args = getattr(function_call, "arguments", None)
 
-        # guard: empty or whitespace-only name -> treat as NO_TOOL
-        if not (isinstance(fname, str) and fname.strip()):
-            logger.info("Model returned empty/whitespace function name -> falling back to assistant text.")
-            return assistant_text or "I couldn't parse the model's response; please rephrase."
+TOOL_LIMIT_RESULT = {"error": "tool limit reached; answer with the information you already have"}
+TOOL_STOPPED_TEXT = "Sorry, I couldn't finish looking that up. Please try again."
+NO_TEXT_FALLBACK = "I couldn't parse the model's response; please rephrase."
 
-        # ensure the tool exists
-        if fname not in tool_registry:
-            logger.info("Model requested unknown function '%s' -> falling back to assistant text.", fname)
-            return assistant_text or f"Model requested unknown function: {fname}"
 
-        # parse args as a dict (we keep the behavior you requested)
-        args_dict = dict(function_call.args)
-        print(f'calling function {fname} with arguments {args_dict}')
+def gemini_response_events(user_prompt: str, gemini_chat):
+    """
+    Streams the answer to user_prompt as events, for the /api/stream endpoint.
+
+    Model text is forwarded as soon as each chunk arrives. When the model asks
+    for functions, every function_call of that turn runs concurrently in
+    TOOL_EXECUTOR, all results go back in one message, and this repeats until
+    the model answers without calling a function. After TOOL_MAX_ROUNDS
+    rounds, or TOOL_TIME_LIMIT seconds, further calls are answered with an
+    error asking the model to reply with what it has.
+
+    Yields:
+        tuple[str, dict]: one of
+            ("token", {"text": str}),
+            ("tool", {"name": str, "status": "running" | "done" | "error", "detail": str}),
+            ("done", {"text": str, "complete": bool})   -- the full answer, always
+            last; complete is False for fallback texts.
+    """
+    texts = []
+    deadline = time.monotonic() + TOOL_TIME_LIMIT
+
+    # 1) initial model call, with the compact date/hierarchy/holidays context (see prompt_context)
+    content = [user_prompt,prompt_context.assemble()]
+    for round_no in range(TOOL_MAX_ROUNDS + 2):
+        # not the current span: the caller runs between the yields
+        with telemetry.span("gemini.turn", current=False, round=round_no) as turn:
+            started, chunks = time.perf_counter(), 0
+            response = gemini_chat.send_message(content, stream=True)
+            for text in _stream_text(response):
+                if not chunks:
+                    telemetry.observe("gemini.first_token", time.perf_counter() - started)
+                chunks += 1
+                texts.append(text)
+                yield "token", {"text": text}
+            turn.set(chunks=chunks, **_usage_attributes(response))
+
+        # 2) extract candidates and every function_call of the primary candidate
+        candidates = _extract_candidates(response)
+        if not candidates or len(candidates) == 0:
+            # Nothing parsed: return a readable fallback
+            yield "done", {"text": "".join(texts) or str(response), "complete": False}
+            return
+        calls = _extract_function_calls(candidates[0])
+
+        # 3) no function_call -> the streamed text is the final answer
+        if not calls:
+            yield "done", {"text": "".join(texts) or NO_TEXT_FALLBACK, "complete": bool(texts)}
+            return
+
+        # 4) run the calls, unless the limits are used up
+        action = _tool_round(round_no, deadline)
+        if action == "stop":
+            yield "done", {"text": "".join(texts) or TOOL_STOPPED_TEXT, "complete": False}
+            return
+        if action == "refuse":
+            names, results = [_call_name_args(c)[0] for c in calls], [TOOL_LIMIT_RESULT] * len(calls)
+            for fname in names:
+                yield "tool", {"name": fname, "status": "error", "detail": "tool limit reached"}
+        else:
+            for event, data in _run_tools(calls, deadline):
+                if event == "results":
+                    names, results = data["names"], data["results"]
+                else:
+                    yield event, data
+
+        # --- SEND ALL RESULTS BACK TO THE MODEL IN ONE TURN ---
+        content = _tool_response_content(names, results)
 
-        # Call the selected function using **dict(args) pattern the project expects.
-        try:
-            selected_function = tool_registry[fname]
-            # ensure we pass a plain dict to satisfy selected_function(**dict(args))
-            # This will raise a TypeError if selected_function doesn't accept kwargs — let it propagate to be handled below.
-            tool_result = selected_function(**args_dict)
-        except TypeError as te:
-            logger.exception("TypeError while calling tool %s with args %r", fname, args_dict)
-            return f"Error: tool '{fname}' could not be called with provided arguments: {te}"
-        except Exception as e:
-            logger.exception("Exception while running tool %s", fname)
-            return f"Error running tool {fname}: {e}"
-
-        # --- SEND THE RESULT BACK TO THE MODEL ---
-        # Use the exact structure you provided so the model can consume it as tool output.
-        func_resp_content = {
-            "role": "tool",
-            "parts": [
-                {
-                    "function_response": {
-                        "name": fname,
-                        "response": {"tool_result": tool_result}
-                    }
-                }
-            ]
-        }
 
-        # send the tool response back to the model; the model will generate the final text reply
-        # (wrap in list for consistency with how you call send_message)
-        final_response = gemini_chat.send_message(func_resp_content)
+async def gemini_response_events_async(user_prompt: str, gemini_chat):
+    """
+    gemini_response_events for the ASGI app (asgi_app.py).
 
-        # parse final_response and return final assistant text
-        final_cands = _extract_candidates(final_response)
-        if final_cands and len(final_cands) > 0:
-            final_text = _extract_text_from_candidate(final_cands[0])
-            return final_text or str(final_response)
+    The model calls go through the SDK's send_message_async, so a waiting chat
+    holds no thread; the tools, which are synchronous, run in anyio worker threads.
+    The events are the same.
+    """
+    texts = []
+    deadline = time.monotonic() + TOOL_TIME_LIMIT
+
+    # building the context may read files, so it runs off the event loop
+    content = [user_prompt, await asyncio.to_thread(prompt_context.assemble)]
+    for round_no in range(TOOL_MAX_ROUNDS + 2):
+        with telemetry.span("gemini.turn", current=False, round=round_no) as turn:
+            started, chunks = time.perf_counter(), 0
+            response = await gemini_chat.send_message_async(content, stream=True)
+            async for text in _stream_text_async(response):
+                if not chunks:
+                    telemetry.observe("gemini.first_token", time.perf_counter() - started)
+                chunks += 1
+                texts.append(text)
+                yield "token", {"text": text}
+            turn.set(chunks=chunks, **_usage_attributes(response))
+
+        candidates = _extract_candidates(response)
+        if not candidates or len(candidates) == 0:
+            yield "done", {"text": "".join(texts) or str(response), "complete": False}
+            return
+        calls = _extract_function_calls(candidates[0])
+        if not calls:
+            yield "done", {"text": "".join(texts) or NO_TEXT_FALLBACK, "complete": bool(texts)}
+            return
+
+        action = _tool_round(round_no, deadline)
+        if action == "stop":
+            yield "done", {"text": "".join(texts) or TOOL_STOPPED_TEXT, "complete": False}
+            return
+        if action == "refuse":
+            names, results = [_call_name_args(c)[0] for c in calls], [TOOL_LIMIT_RESULT] * len(calls)
+            for fname in names:
+                yield "tool", {"name": fname, "status": "error", "detail": "tool limit reached"}
         else:
-            return str(final_response)
+            async for event, data in _run_tools_async(calls, deadline):
+                if event == "results":
+                    names, results = data["names"], data["results"]
+                else:
+                    yield event, data
+
+        content = _tool_response_content(names, results)
+
 
-    # 6) no function_call -> return assistant_text (final answer)
-    return assistant_text or str(response)
+def gemini_main_response(user_prompt: str, gemini_chat):
+    """
+    Sends the user prompt to gemini_chat, runs the function_calls the model
+    asks for with selected_function(**dict(args)) (several at once, over as
+    many rounds as needed), sends the results back to the model as tool-like
+    messages, and finally returns the model's final assistant text (string).
+
+    This is gemini_response_events without the streaming: it returns the
+    text of the final "done" event.
+    """
+    answer = ""
+    with telemetry.span("gemini_main_response") as response_span:
+        tools = 0
+        for event, data in gemini_response_events(user_prompt, gemini_chat):
+            if event == "tool" and data["status"] != "running":
+                tools += 1
+            elif event == "done":
+                answer = data["text"]
+                if not data["complete"]:
+                    response_span.outcome = "incomplete"
+        response_span.set(tool_calls=tools, chars=len(answer))
+    return answer
 #block ends
 
 
 
 def tool_reload_announcements():
     """
-    reloads the announcements file , pulls out the latest announcements from database
-    :return:
+    reloads the announcements , pulls the announcement emails that arrived since the last check into the store
+    :return: the number of new announcements
     """
-    with open("static/announcements.txt", "w", encoding="utf-8") as f:
-        for email in email_body_extractor.read_emails_with_subject_alternative():
-            print(f"{email}",file=f)
+    return announcement_store.refresh(force=True)
 
 
 # this is a llm tool
@@ -542,13 +879,34 @@ def read_announcements(howMany:int)->list:
     :return: list of announcements
     '''
 
-    tool_reload_announcements()
-    announcements = ""
-    with open("static/announcements.txt", "r", encoding="utf-8") as f:
-        announcements = f.readlines()
-    while "\n"in announcements:
-        announcements.remove("\n")
-    return list(reversed(announcements))[:how_many]
+    # the background watcher keeps the newest ones in memory
+    watcher = announcement_watcher.running()
+    if watcher is not None and how_many <= watcher.capacity:
+        telemetry.annotate(source="watcher")
+        return watcher.latest(how_many)
+    telemetry.annotate(source="store")
+    # the watcher of another worker keeps the store current; otherwise the mailbox
+    # is checked only if nobody did in the last ANNOUNCEMENT_REFRESH_INTERVAL seconds
+    if not announcement_watcher.watching_elsewhere():
+        announcement_store.refresh()
+    return announcement_store.latest(how_many)
+
+
+# this is a llm tool
+def holidays_between(fromDate:str, toDate:str)->list:
+    """
+    the public holidays from fromDate to toDate, both included, oldest first. use it for holidays that are not in the
+    holiday list sent with the message , e.g. "holidays in december" or "is 2 october a holiday". covers this year and next year
+    :param fromDate: the first date, YYYY-MM-DD
+    :param toDate: the last date, YYYY-MM-DD
+    :return: list of holidays with their date, name and type
+    """
+    first = interval_index.parse_date_range(fromDate)
+    last = interval_index.parse_date_range(toDate)
+    if first is None or last is None:
+        return ["dates must be given as YYYY-MM-DD"]
+    start, end = datetime.date.fromordinal(min(first[0], last[0])), datetime.date.fromordinal(max(first[1], last[1]))
+    return holiday_store.between(start, end)
 
 
 tool_registry = {
@@ -556,6 +914,7 @@ tool_registry = {
     "reload_hierarchy": reload_hierarchy,
     "read_announcements":read_announcements,
     "request_files_for_context":request_files_for_context,
+    "holidays_between":holidays_between,
 }
 
 
@@ -588,69 +947,31 @@ tool_registry = {
 
 
 def match_percent_rag(query):
+    """
+    Filters static/paths.txt down to the files matching a structured query.
 
-    pprint.pprint(dict(query))
-
-    with open("static/paths.txt", "r", encoding="utf-8") as f:
-        paths = f.readlines()
-
-
-    for path in paths.copy():
-        #filtering based on tag
-        tag =query['tag']
-        if tag !=None:
-            if tag not in path:
-                #print("this path does now match the tag :",path)
-                paths.remove(path)
-
-
-
-    for path in paths.copy():
-        #filtering based on tag
-        sem = query['semester']
-        if sem != None:
-            if f'semester-{int(sem)}' not in path:
-                #print("this path does now match the semester :",path)
-                paths.remove(path)
-
-
-
-
-    for path in paths.copy():
-        #filtering based on tag
-        sub = query['subject']
-        if sub != None:
-            if sub not in path:
-                #print("this path does now match the subject :",path)
-                paths.remove(path)
-
-
-    for path in paths.copy():
-        #filtering based on tag
-        user  = query['by_user']
-        if user != None:
-            if user not in path:
-                #print("this path does now match the by_user :",path)
-                paths.remove(path)
-
-    for path in paths.copy():
-        lecture = query['lecture_no']
-        if lecture != None:
-            if f"lecture-{int(lecture)}" not in path:
-                #print("this path does now match the by_user :", path)
-                paths.remove(path)
-
-    for path in paths.copy():
-        # filtering based on tag
-        date = query['date']
-        if date != None:
-            if date not in path:
-                #print("this path does now match the date :", date)
-                paths.remove(path)
-
-    paths_new = [path.replace("\n","") for path in paths]
+    The paths are parsed once into records with tag, user, subject, lecture,
+    date and semester fields (see filename_index), and each query is an
+    intersection of the per-field indexes. Subject and user names tolerate
+    typos, and context only narrows the result when some files mention it.
+    Keys that are None are not filtered.
 
-    return paths_new
+    :param query: dict with the keys tag, subject, by_user, lecture_no, date, semester and context
+    :return: list of matching paths, in paths.txt order
+    """
+    query = dict(query)
+    pprint.pprint(query)
+
+    index = filename_index.load("static/paths.txt")
+    return index.query(
+        tag=query.get('tag'),
+        semester=query.get('semester'),
+        subject=query.get('subject'),
+        by_user=query.get('by_user'),
+        lecture_no=query.get('lecture_no'),
+        date=query.get('date'),
+        context=query.get('context'),
+    )
 
 
 
@@ -0,0 +1,229 @@
+"""
+Assembles the per-turn context sent along with every user message.
+
+Every turn used to carry the raw holidays.txt (the printed Calendarific
+response, ~38 KB with descriptions and URLs) and the indented hierarchy.txt.
+This module builds a compact version of both instead:
+
+- holidays: only the ones near today, as "YYYY-MM-DD  Name" lines, sliced
+  out of holiday_store's date index;
+- hierarchy: one line per folder path followed by its files, so the shared
+  "DTU/maths/semester-1/" prefix is written once instead of being implied by
+  indentation on every line.
+
+Tokens are counted offline (tiktoken when it is installed and its encoding is
+available locally, otherwise a characters-per-token estimate) and the blocks
+are trimmed to PROMPT_TOKEN_BUDGET. The assembled blocks are cached until
+the holiday store or hierarchy.txt change, or the day rolls over.
+"""
+import datetime
+import hashlib
+import importlib.util
+import json
+import os
+import tempfile
+import threading
+
+import holiday_store
+
+HIERARCHY_FILE = "static/hierarchy.txt"
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+HOLIDAY_DAYS_BEFORE = int(os.getenv("HOLIDAY_DAYS_BEFORE", "7"))
+HOLIDAY_DAYS_AFTER = int(os.getenv("HOLIDAY_DAYS_AFTER", "60"))
+
+# share of the budget the hierarchy may use before holidays are trimmed
+HIERARCHY_SHARE = 0.75
+# last hierarchy line when it is cut to fit, so the model knows to look further
+HIERARCHY_MORE = ("... {} more lines not shown. A file that is not listed here may still exist: search for it "
+                  "with request_files_id_2sharable_link_gemini_rag, or call reload_hierarchy if the drive "
+                  "has changed.")
+TIKTOKEN_URL = "https://openaipublic.blob.core.windows.net/encodings/cl100k_base.tiktoken"
+# average characters per token for the fallback estimate
+CHARS_PER_TOKEN = 3.5
+
+_lock = threading.Lock()
+_cache = {}
+_encoding = None
+_encoding_failed = False
+
+
+def _tiktoken_cached():
+    """
+    True if tiktoken is installed and cl100k_base is already in its local cache.
+
+    tiktoken downloads an encoding on first use; counting must never touch the
+    network, so without a cached copy the estimate is used instead.
+    """
+    if importlib.util.find_spec("tiktoken") is None:
+        return False
+    cache_dir = os.getenv("TIKTOKEN_CACHE_DIR") or os.getenv("DATA_GYM_CACHE_DIR") or os.path.join(
+        tempfile.gettempdir(), "data-gym-cache")
+    return os.path.exists(os.path.join(cache_dir, hashlib.sha1(TIKTOKEN_URL.encode()).hexdigest()))
+
+
+def count_tokens(text):
+    """
+    Counts the tokens of text without calling the model API.
+
+    tiktoken's cl100k_base is used when available; it is not Gemini's
+    tokenizer but is close enough for budgeting. Otherwise the count is
+    estimated from the length of the text.
+    """
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        _encoding_failed = True
+        try:
+            if _tiktoken_cached():
+                import tiktoken
+                _encoding = tiktoken.get_encoding("cl100k_base")
+                _encoding_failed = False
+        except Exception as e:
+            print(f"tiktoken is not available, estimating token counts instead: {e}")
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+def fit_lines(lines, budget, header="", more="... {} more not shown"):
+    """
+    Keeps as many lines as fit in budget tokens, in order.
+
+    Args:
+        lines (list[str]): The lines, most important first.
+        budget (int): The most tokens the block may use.
+        header (str): A first line that is always kept.
+        more (str): The last line when some are cut; {} is replaced by how many.
+
+    Returns:
+        tuple[str, int]: (the block text, its token count)
+    """
+    kept = [header] if header else []
+    used = count_tokens(header) if header else 0
+    # room kept for the note while more lines follow, so a cut block stays in budget
+    note_cost = count_tokens(more.format(len(lines))) + 1
+    for i, line in enumerate(lines):
+        cost = count_tokens(line) + 1
+        if used + cost > budget - (note_cost if i + 1 < len(lines) else 0):
+            note = more.format(len(lines) - i)
+            kept.append(note)
+            used += count_tokens(note) + 1
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(kept), used
+
+
+def nearby_holidays(today, days_before=HOLIDAY_DAYS_BEFORE, days_after=HOLIDAY_DAYS_AFTER):
+    """
+    The holidays near today, from the holiday store.
+
+    Args:
+        today (datetime.date): The current date.
+        days_before (int): How many past days to include.
+        days_after (int): How many upcoming days to include.
+
+    Returns:
+        list[str]: "YYYY-MM-DD  Name" lines, nearest to today first.
+    """
+    start = today - datetime.timedelta(days=days_before)
+    end = today + datetime.timedelta(days=days_after)
+    nearby = [(datetime.date.fromisoformat(record["date"]), record["name"])
+              for record in holiday_store.index(today).between(start, end)]
+    nearby.sort(key=lambda item: (abs((item[0] - today).days), item[0]))
+    return [f"{day.isoformat()}  {name}" for day, name in nearby]
+
+
+def collapse_hierarchy(lines):
+    """
+    Rewrites the indented hierarchy.txt tree as folder paths with their files.
+
+    Folder names end with "/" in hierarchy.txt; in files written before that,
+    a name is taken as a folder when the next line is indented deeper, so an
+    empty folder there still reads as a file.
+
+    Args:
+        lines (list[str]): Lines of hierarchy.txt ("    " * depth + "├── name").
+
+    Returns:
+        list[str]: "folder/path/" lines, each followed by its files indented
+        by two spaces. Files at the top of the tree come first.
+    """
+    entries = []
+    for line in lines:
+        if "├── " not in line:
+            continue
+        indent, name = line.rstrip("\n").split("├── ", 1)
+        entries.append((len(indent) // 4, name))
+
+    folders = {"": []}
+    parents = set()
+    stack = []
+    for i, (depth, name) in enumerate(entries):
+        del stack[depth:]
+        has_children = i + 1 < len(entries) and entries[i + 1][0] > depth
+        if has_children or name.endswith("/"):
+            if stack:
+                parents.add("/".join(stack) + "/")
+            stack.append(name.rstrip("/"))
+            folders.setdefault("/".join(stack) + "/", [])
+        else:
+            folders.setdefault("/".join(stack) + "/" if stack else "", []).append(name)
+
+    collapsed = []
+    for folder, files in folders.items():
+        if not files and folder in parents:
+            continue  # its path shows up in the paths of its subfolders
+        if folder:
+            collapsed.append(folder)
+        collapsed.extend(f"  {name}" for name in files)
+    return collapsed
+
+
+def _source_version(path):
+    try:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+    except FileNotFoundError:
+        return None
+
+
+def _assemble_static(today, budget):
+    try:
+        with open(HIERARCHY_FILE, "r", encoding="utf-8") as f:
+            hierarchy_lines = collapse_hierarchy(f.readlines())
+    except FileNotFoundError:
+        hierarchy_lines = []
+    hierarchy, hierarchy_tokens = fit_lines(
+        hierarchy_lines, int(budget * HIERARCHY_SHARE), header="Available files (folder path, then its files):",
+        more=HIERARCHY_MORE)
+    holidays, holidays_tokens = fit_lines(
+        nearby_holidays(today), budget - hierarchy_tokens,
+        header=f"Holidays from {HOLIDAY_DAYS_BEFORE} days ago to {HOLIDAY_DAYS_AFTER} days ahead (date, name):")
+    return f"{hierarchy}\n\n{holidays}", hierarchy_tokens + holidays_tokens
+
+
+def assemble(now=None, budget=None):
+    """
+    Builds the context block for one turn.
+
+    The hierarchy and holiday blocks are cached until their files change or
+    the date changes; the current date and time are added fresh every turn.
+
+    Args:
+        now (datetime.datetime): The current time; defaults to now.
+        budget (int): The token budget; defaults to PROMPT_TOKEN_BUDGET.
+
+    Returns:
+        str: The context text to send with the user message.
+    """
+    now = now or datetime.datetime.now()
+    budget = PROMPT_TOKEN_BUDGET if budget is None else budget
+    current = json.dumps({"date": now.strftime("%Y-%m-%d"), "time": now.strftime("%H:%M"), "day": now.strftime("%A")})
+    key = (now.date(), budget, _source_version(HIERARCHY_FILE), holiday_store.version(now.date()))
+    with _lock:
+        cached = _cache.get("static")
+        if cached is None or cached[0] != key:
+            text, tokens = _assemble_static(now.date(), budget - count_tokens(current))
+            cached = _cache["static"] = (key, text, tokens)
+    return f"Current date and time: {current}\n\n{cached[1]}"
@@ -0,0 +1,338 @@
+"""
+Timing spans for the request path, and the metrics behind /metrics.
+
+    with telemetry.span("drive.download", file_id=file_id) as s:
+        content = download(...)
+        s.set(bytes=len(content))
+
+Every span is timed into the college_guide_stage_seconds histogram (labels
+stage and outcome), whether or not OpenTelemetry is installed. The counts in
+COUNTED (bytes, files, tokens, emails) are also added to per-stage counters,
+and cache="hit" / "miss" counts cache lookups per stage.
+
+The spans also go to OpenTelemetry when a tracer provider is already set up
+(e.g. under opentelemetry-instrument), or when OTEL_EXPORTER_OTLP_ENDPOINT is
+set and the SDK and OTLP exporter are installed; OTEL_TRACES_EXPORTER=console
+prints them instead. TRACING=off keeps only the metrics. opentelemetry is
+imported the first time a span starts, never at import.
+
+Work handed to a thread pool should go through bind(), so its spans nest
+under the request that started it.
+
+The metrics live in this process. Under gunicorn with several workers, a
+/metrics scrape only shows the worker that answered it, so the counts are a
+sample of the traffic, not totals. For complete numbers run one worker per
+scrape target (e.g. one uvicorn process per port), or rely on the spans,
+which every worker exports to the collector.
+"""
+import contextlib
+import contextvars
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# "off" never sends spans to OpenTelemetry; the metrics are kept either way
+TRACING = os.getenv("TRACING", "on")
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "college-guide")
+# seconds; the model turns and whole requests take up to a minute
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# span attributes that are also summed into college_guide_stage_<name>_total counters
+COUNTED = ("bytes", "files", "tokens", "emails")
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+HELP = {
+    "college_guide_stage_seconds": "Time spent in each stage of answering a request.",
+    "college_guide_stage_bytes_total": "Bytes handled by each stage (downloads, extraction, tool results).",
+    "college_guide_stage_files_total": "Files handled by each stage.",
+    "college_guide_stage_tokens_total": "Gemini tokens, prompt and output, per stage.",
+    "college_guide_stage_emails_total": "Announcement emails fetched per stage.",
+    "college_guide_cache_lookups_total": "Cache lookups per stage and result.",
+}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    """
+    Histograms and counters keyed by (name, labels), rendered in the Prometheus text format.
+
+    One per process: it is not shared between gunicorn workers (see the module docstring).
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._collectors = []
+
+    def observe(self, name, value, **labels):
+        """Adds one observation to a histogram."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # one count per bucket (not cumulative), then sum and count
+                histogram = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            i = bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                histogram[0][i] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def inc(self, name, value=1, **labels):
+        """Adds value to a counter."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def register(self, collector, help=None):
+        """
+        Adds a callable that reports gauges when the metrics are rendered.
+
+        Args:
+            collector (callable): collector() returns (name, value, labels dict)
+                tuples, e.g. the size of a cache.
+            help (dict): name -> the HELP text of each gauge.
+        """
+        HELP.update(help or {})
+        self._collectors.append(collector)
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def render(self):
+        """
+        Returns:
+            str: Every metric in the Prometheus text exposition format.
+        """
+        with self._lock:
+            histograms = {key: (list(counts), total, count) for key, (counts, total, count) in self._histograms.items()}
+            counters = dict(self._counters)
+        lines = []
+        for name in sorted({name for name, _ in histograms}):
+            lines += [f"# HELP {name} {HELP.get(name, name)}", f"# TYPE {name} histogram"]
+            for (_, labels), (counts, total, count) in sorted(item for item in histograms.items() if item[0][0] == name):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_bucket{_labels(labels, [('le', '+Inf')])} {count}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+        for name in sorted({name for name, _ in counters}):
+            lines += [f"# HELP {name} {HELP.get(name, name)}", f"# TYPE {name} counter"]
+            for (_, labels), value in sorted(item for item in counters.items() if item[0][0] == name):
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        gauges = {}
+        for collector in self._collectors:
+            try:
+                for name, value, labels in collector():
+                    gauges.setdefault(name, []).append((tuple(sorted(labels.items())), value))
+            except Exception as e:
+                print(f"A metrics collector failed: {e}")
+        for name in sorted(gauges):
+            lines += [f"# HELP {name} {HELP.get(name, name)}", f"# TYPE {name} gauge"]
+            for labels, value in sorted(gauges[name]):
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+_UNSET = object()
+_tracer = _UNSET
+_tracer_lock = threading.Lock()
+
+
+def _make_provider():
+    """An SDK tracer provider with the exporter the OTEL_* variables ask for, or None."""
+    exporter_name = os.getenv("OTEL_TRACES_EXPORTER",
+                              "otlp" if os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT") else "none")
+    if exporter_name == "none":
+        return None
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+        if exporter_name == "console":
+            exporter = ConsoleSpanExporter()
+        else:
+            from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+            exporter = OTLPSpanExporter()
+    except ImportError as e:
+        print(f"Tracing is off, the OpenTelemetry SDK or exporter is not installed: {e}")
+        return None
+    provider = TracerProvider(resource=Resource.create({"service.name": SERVICE_NAME}))
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    return provider
+
+
+def tracer():
+    """
+    The OpenTelemetry tracer, set up on first use.
+
+    Returns:
+        opentelemetry.trace.Tracer: The tracer, or None when spans are not exported.
+    """
+    global _tracer
+    if _tracer is _UNSET:
+        with _tracer_lock:
+            if _tracer is _UNSET:
+                _tracer = None
+                if TRACING != "off":
+                    try:
+                        from opentelemetry import trace
+                    except ImportError:
+                        return None
+                    # a provider set up outside (opentelemetry-instrument, OTEL_PYTHON_TRACER_PROVIDER) wins
+                    if isinstance(trace.get_tracer_provider(), trace.ProxyTracerProvider):
+                        provider = _make_provider()
+                        if provider is not None:
+                            trace.set_tracer_provider(provider)
+                    if not isinstance(trace.get_tracer_provider(), trace.ProxyTracerProvider):
+                        _tracer = trace.get_tracer("college_guide")
+    return _tracer
+
+
+def _attribute(value):
+    # OpenTelemetry attributes are str, bool, int, float or lists of them
+    if isinstance(value, (str, bool, int, float)):
+        return value
+    if isinstance(value, (list, tuple)) and all(isinstance(item, (str, bool, int, float)) for item in value):
+        return list(value)
+    return str(value)
+
+
+class Span:
+    """
+    One timed stage. set() adds attributes; outcome ("ok", "error", ...) labels the latency histogram.
+    """
+
+    def __init__(self, stage, otel_span=None):
+        self.stage = stage
+        self.outcome = "ok"
+        self.attributes = {}
+        self._otel_span = otel_span
+
+    def set(self, **attributes):
+        """Sets attributes; None values are skipped."""
+        attributes = {key: value for key, value in attributes.items() if value is not None}
+        self.attributes.update(attributes)
+        if self._otel_span is not None and attributes:
+            self._otel_span.set_attributes({key: _attribute(value) for key, value in attributes.items()})
+
+    def _finish(self, seconds):
+        REGISTRY.observe("college_guide_stage_seconds", seconds, stage=self.stage, outcome=self.outcome)
+        for key in COUNTED:
+            if isinstance(self.attributes.get(key), (int, float)):
+                REGISTRY.inc(f"college_guide_stage_{key}_total", self.attributes[key], stage=self.stage)
+        if self.attributes.get("cache"):
+            REGISTRY.inc("college_guide_cache_lookups_total", stage=self.stage, result=self.attributes["cache"])
+
+
+_current = contextvars.ContextVar("telemetry_span", default=None)
+
+
+@contextlib.contextmanager
+def span(stage, current=True, **attributes):
+    """
+    Times a stage and, when tracing is on, records it as an OpenTelemetry span.
+
+    Args:
+        stage (str): The stage name, e.g. "drive.download"; the histogram's stage label.
+        current (bool): Make this the parent of the spans started inside it. Pass
+            False for a span held open across the yields of a generator, whose
+            caller may run other code (or another task) in between.
+        **attributes: Initial attributes, see Span.set().
+
+    Yields:
+        Span: The span, to add attributes or set its outcome.
+    """
+    otel_tracer = tracer()
+    otel_span = otel_tracer.start_span(stage) if otel_tracer is not None else None
+    record = Span(stage, otel_span)
+    record.set(**attributes)
+    token = _current.set(record) if current else None
+    otel_token = None
+    if current and otel_span is not None:
+        from opentelemetry import context, trace
+        otel_token = context.attach(trace.set_span_in_context(otel_span))
+    started = time.perf_counter()
+    try:
+        yield record
+    except (GeneratorExit, KeyboardInterrupt):
+        record.outcome = "cancelled"
+        raise
+    except BaseException as e:
+        # asyncio.CancelledError is a BaseException too: the client went away
+        record.outcome = "cancelled" if type(e).__name__ == "CancelledError" else "error"
+        if otel_span is not None and record.outcome == "error":
+            otel_span.record_exception(e)
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        if otel_token is not None:
+            from opentelemetry import context
+            context.detach(otel_token)
+        if token is not None:
+            try:
+                _current.reset(token)
+            except ValueError:
+                # a generator closed from another context; that context never saw the span
+                pass
+        record._finish(seconds)
+        if otel_span is not None:
+            if record.outcome != "ok":
+                otel_span.set_attribute("outcome", record.outcome)
+            if record.outcome == "error":
+                from opentelemetry.trace import Status, StatusCode
+                otel_span.set_status(Status(StatusCode.ERROR))
+            otel_span.end()
+
+
+def annotate(**attributes):
+    """Sets attributes on the innermost current span, if there is one."""
+    record = _current.get()
+    if record is not None:
+        record.set(**attributes)
+
+
+def observe(stage, seconds, outcome="ok"):
+    """Records a duration measured elsewhere, e.g. the time to the first token."""
+    REGISTRY.observe("college_guide_stage_seconds", seconds, stage=stage, outcome=outcome)
+
+
+def bind(func):
+    """
+    func, to run in another thread inside the current context, so its spans
+    nest under the current one. Bind once per call: a context runs in one thread at a time.
+    """
+    return functools.partial(contextvars.copy_context().run, func)
+
+
+def register(collector, help=None):
+    REGISTRY.register(collector, help)
+
+
+def render():
+    """The metrics for /metrics, in the Prometheus text format."""
+    return REGISTRY.render()
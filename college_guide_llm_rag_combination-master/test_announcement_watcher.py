@@ -0,0 +1,128 @@
+"""
+The announcement watcher and the store's watermark, against fake_imap.
+
+Run it from this folder:
+
+    python -m pytest -q test_announcement_watcher.py
+"""
+import time
+
+import pytest
+
+import announcement_store
+import announcement_watcher
+import email_body_extractor
+import fake_imap
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def _contents(announcements):
+    return [announcement["content"] for announcement in announcements]
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "announcements.db")
+
+
+@pytest.fixture
+def server():
+    return fake_imap.FakeImapServer()
+
+
+@pytest.fixture
+def backoffs(monkeypatch):
+    """The failure counts the watcher backed off for; it reconnects at once."""
+    calls = []
+    monkeypatch.setattr(announcement_watcher, "backoff_delay", lambda failures: calls.append(failures) or 0.01)
+    return calls
+
+
+@pytest.fixture
+def watcher(server, db_path, backoffs, monkeypatch):
+    """A running process-wide watcher, connected."""
+    monkeypatch.setattr(announcement_watcher, "ANNOUNCEMENT_WATCHER", "on")
+    watcher = announcement_watcher.start(connect=server.connect, db_path=db_path, idle_timeout=0.2)
+    _wait_for(lambda: watcher.connected)
+    yield watcher
+    announcement_watcher.stop()
+
+
+def test_a_message_without_text_moves_the_watermark(server, db_path):
+    watcher = announcement_watcher.AnnouncementWatcher(connect=server.connect, db_path=db_path)
+    server.deliver("Lab 3 is moved to Friday")
+    server.deliver("")
+    with server.connect() as mailbox:
+        assert watcher.check(mailbox) == 1
+        assert watcher.last_uid == 2
+        assert announcement_store.watermark(db_path) == (1, 2)
+
+        server.deliver("")
+        watcher.check(mailbox)
+        fetches = server.fetches
+        watcher.check(mailbox)
+        assert server.fetches == fetches
+        assert announcement_store.watermark(db_path) == (1, 3)
+    assert _contents(watcher.latest(5)) == ["Lab 3 is moved to Friday"]
+
+
+def test_the_store_moves_the_watermark_without_text(server, db_path):
+    def fetch(last_uid, last_validity):
+        with server.connect() as mailbox:
+            return email_body_extractor.fetch_new_from_mailbox(mailbox, last_uid, last_validity)
+
+    server.deliver("")
+    assert announcement_store.refresh(force=True, fetch=fetch, db_path=db_path) == 0
+    assert announcement_store.watermark(db_path) == (1, 1)
+    fetches = server.fetches
+    announcement_store.refresh(force=True, fetch=fetch, db_path=db_path)
+    assert server.fetches == fetches
+
+
+def test_watcher_backs_off_and_reconnects(server, watcher, backoffs):
+    server.fail_logins(2)
+    server.drop_connections()
+    _wait_for(lambda: server.logins == 2 and watcher.connected)
+    # the dropped session, then two failed logins
+    assert backoffs == [1, 2, 3]
+    assert watcher.last_error["message"] == "login failed"
+
+    server.deliver("Lab 3 is moved to Friday")
+    _wait_for(lambda: watcher.latest(1))
+    assert _contents(watcher.latest(5)) == ["Lab 3 is moved to Friday"]
+    assert watcher.failures == 0
+
+
+def test_uid_validity_reset_refetches_everything(server, watcher, db_path):
+    server.deliver("first")
+    server.deliver("second")
+    _wait_for(lambda: len(watcher.latest(5)) == 2)
+
+    server.reset_uid_validity(7)
+    server.deliver("third")
+    _wait_for(lambda: watcher.validity == 7 and len(watcher.latest(5)) == 3)
+    assert _contents(watcher.latest(5)) == ["third", "second", "first"]
+    assert announcement_store.watermark(db_path) == (7, 3)
+    assert _contents(announcement_store.latest(5, db_path)) == ["third", "second", "first"]
+
+
+def test_only_one_process_runs_the_watcher(server, db_path, monkeypatch):
+    fcntl = pytest.importorskip("fcntl")
+    monkeypatch.setattr(announcement_watcher, "ANNOUNCEMENT_WATCHER", "on")
+    # another worker holds the lock
+    with open(f"{db_path}.watcher.lock", "a") as other:
+        fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        assert announcement_watcher.start(connect=server.connect, db_path=db_path) is None
+        assert announcement_watcher.watching_elsewhere(db_path)
+    assert not announcement_watcher.watching_elsewhere(db_path)
+    try:
+        assert announcement_watcher.start(connect=server.connect, db_path=db_path, idle_timeout=0.2) is not None
+        assert not announcement_watcher.watching_elsewhere(db_path)
+    finally:
+        announcement_watcher.stop()
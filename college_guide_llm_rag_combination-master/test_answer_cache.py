@@ -0,0 +1,85 @@
+"""
+Near-duplicate lookups, invalidation and TTLs of answer_cache.
+
+Run it from this folder:
+
+    python -m pytest -q test_answer_cache.py
+"""
+import pytest
+
+import announcement_store
+import answer_cache
+import holiday_store
+
+QUESTION = "Where is room 6320?"
+
+
+@pytest.fixture
+def sources(tmp_path, monkeypatch):
+    """A fresh cache whose version parts the tests can change."""
+    paths = tmp_path / "paths.txt"
+    paths.write_text("DTU/maths/$$SYSTEM$$Syllabus.pdf\n", encoding="utf-8")
+    state = {"date": "2025-08-11", "announcements": (1, 10), "holidays": 1}
+    monkeypatch.setattr(answer_cache, "cache", answer_cache.AnswerCache())
+    monkeypatch.setattr(answer_cache, "SOURCE_FILES", (str(paths),))
+    monkeypatch.setattr(answer_cache.time, "strftime", lambda fmt: state["date"])
+    monkeypatch.setattr(announcement_store, "version", lambda: state["announcements"])
+    monkeypatch.setattr(holiday_store, "version", lambda: state["holidays"])
+    state["paths"] = paths
+    return state
+
+
+def test_filler_words_and_punctuation_hit(sources):
+    answer_cache.put(QUESTION, "In the new academic block.")
+    assert answer_cache.get("where's room 6320") == "In the new academic block."
+    assert answer_cache.get("where is the room 6320 please") == "In the new academic block."
+    assert answer_cache.cache.stats()["hits"] == 2
+
+
+def test_a_typo_is_a_near_duplicate_but_another_word_is_not():
+    cache = answer_cache.AnswerCache()
+    cache.put("what is the timetable of computer science engineering semester 1", "Monday ...", version=1)
+    assert cache.get("what is the timetable of computer sciense engineering semester 1", version=1) == "Monday ..."
+    assert cache.stats()["near_hits"] == 1
+    assert cache.get("what is the timetable of computer science engineering batch semester 1", version=1) is None
+
+
+def test_different_numbers_miss():
+    cache = answer_cache.AnswerCache()
+    cache.put("syllabus of maths sem 1", "Units 1 to 5", version=1)
+    assert cache.get("syllabus of maths sem 2", version=1) is None
+
+
+@pytest.mark.parametrize("change", [
+    lambda state: state.update(date="2025-08-12"),
+    lambda state: state.update(announcements=(1, 11)),
+    lambda state: state.update(holidays=2),
+    lambda state: state["paths"].write_text("DTU/maths/notes.pdf\n", encoding="utf-8"),
+], ids=["date", "announcements", "holidays", "paths"])
+def test_a_source_change_misses(sources, change):
+    answer_cache.put(QUESTION, "In the new academic block.")
+    change(sources)
+    assert answer_cache.get(QUESTION) is None
+    assert answer_cache.cache.stats()["invalidations"] == 1
+
+
+def test_rewriting_the_same_paths_still_hits(sources):
+    answer_cache.put(QUESTION, "In the new academic block.")
+    sources["paths"].write_text(sources["paths"].read_text(encoding="utf-8"), encoding="utf-8")
+    assert answer_cache.get(QUESTION) == "In the new academic block."
+
+
+def test_answers_expire():
+    cache = answer_cache.AnswerCache(ttl=-1)
+    cache.put(QUESTION, "In the new academic block.", version=1)
+    assert cache.get(QUESTION, version=1) is None
+
+
+def test_time_dependent_answers_get_a_short_ttl(monkeypatch):
+    monkeypatch.setattr(answer_cache.announcement_watcher, "running", lambda: None)
+    assert answer_cache.answer_ttl({"request_files_for_context"}, "syllabus of maths sem 1") is None
+    assert answer_cache.answer_ttl({"holidays_between"}, "holidays in december") == answer_cache.ANSWER_CACHE_TIME_TTL
+    assert answer_cache.answer_ttl({"request_files_for_context"}, "is the library open now?") == \
+        answer_cache.ANSWER_CACHE_TIME_TTL
+    assert answer_cache.answer_ttl({"read_announcements", "holidays_between"}) == min(
+        answer_cache.ANSWER_CACHE_TIME_TTL, announcement_store.ANNOUNCEMENT_REFRESH_INTERVAL)
@@ -0,0 +1,96 @@
+"""
+History compaction and the stores of conversation_store.
+
+Run it from this folder:
+
+    python -m pytest -q test_conversation_store.py
+"""
+import pytest
+
+import conversation_store
+
+
+def _turn(i):
+    return [{"role": "user", "parts": [f"question {i}"]}, {"role": "model", "parts": [f"answer {i}"]}]
+
+
+def _conversation(turns):
+    conversation = conversation_store.empty_conversation()
+    for i in range(turns):
+        conversation["turns"].extend(_turn(i))
+    return conversation
+
+
+def test_short_history_is_kept_verbatim():
+    conversation = conversation_store.compact(_conversation(3), max_turns=6)
+    assert len(conversation["turns"]) == 6
+    assert conversation["summary"] == ""
+
+
+def test_older_turns_are_summarized():
+    conversation = conversation_store.compact(_conversation(8), max_turns=6)
+    assert [entry["parts"][0] for entry in conversation["turns"][::2]] == [f"question {i}" for i in range(2, 8)]
+    assert conversation["summary"].splitlines() == [
+        "- Student asked: question 0 | Assistant answered: answer 0",
+        "- Student asked: question 1 | Assistant answered: answer 1",
+    ]
+
+
+def test_summary_drops_its_oldest_lines_past_the_cap():
+    conversation = conversation_store.compact(_conversation(20), max_turns=2, summary_max_chars=200)
+    assert len(conversation["summary"]) <= 200
+    assert conversation["summary"].splitlines()[-1].startswith("- Student asked: question 17 ")
+
+
+def test_model_history_puts_the_summary_first():
+    conversation = conversation_store.compact(_conversation(8), max_turns=6)
+    history = conversation_store.model_history(conversation)
+    assert [entry["role"] for entry in history[:3]] == ["user", "model", "user"]
+    assert history[0]["parts"][0].startswith("Summary of our earlier conversation:")
+    assert history[2:] == conversation["turns"]
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path, monkeypatch):
+    if request.param == "memory":
+        store = conversation_store.MemoryStore()
+    else:
+        store = conversation_store.SqliteStore(str(tmp_path / "conversations.db"))
+    monkeypatch.setattr(conversation_store, "store", store)
+    return store
+
+
+def test_append_saves_and_compacts(store):
+    conversation = conversation_store.load("sid")
+    for i in range(8):
+        conversation_store.append("sid", conversation, _turn(i))
+    saved = conversation_store.load("sid")
+    assert len(saved["turns"]) == 2 * conversation_store.MAX_TURNS
+    assert saved["summary"]
+    assert saved == conversation
+
+
+def test_entries_without_text_are_not_stored(store):
+    conversation = conversation_store.load("sid")
+    conversation_store.append("sid", conversation, [{"role": "model", "parts": [""]}] + _turn(0))
+    assert len(conversation_store.load("sid")["turns"]) == 2
+
+
+def test_loaded_conversations_are_copies(store):
+    conversation_store.append("sid", conversation_store.load("sid"), _turn(0))
+    conversation_store.load("sid")["turns"].clear()
+    assert len(conversation_store.load("sid")["turns"]) == 2
+
+
+def test_appends_from_two_requests_are_both_kept(store):
+    first, second = conversation_store.load("sid"), conversation_store.load("sid")
+    conversation_store.append("sid", first, _turn(0))
+    conversation_store.append("sid", second, _turn(1))
+    assert len(conversation_store.load("sid")["turns"]) == 4
+
+
+def test_expired_conversations_start_over(tmp_path, monkeypatch):
+    store = conversation_store.MemoryStore(ttl=-1)
+    monkeypatch.setattr(conversation_store, "store", store)
+    conversation_store.append("sid", conversation_store.load("sid"), _turn(0))
+    assert conversation_store.load("sid")["turns"] == []
@@ -0,0 +1,98 @@
+"""
+The token bucket, single-flight and retries of drive_scheduler.
+
+Run it from this folder:
+
+    python -m pytest -q test_drive_scheduler.py
+"""
+import threading
+import time
+
+import pytest
+
+import drive_scheduler
+import fake_drive
+
+
+def test_bucket_admits_the_burst_without_waiting():
+    bucket = drive_scheduler.TokenBucket(rate=10, burst=5)
+    assert sum(bucket.acquire() for _ in range(5)) == 0
+
+
+def test_bucket_spaces_calls_over_the_burst():
+    bucket = drive_scheduler.TokenBucket(rate=50, burst=2)
+    started = time.monotonic()
+    for _ in range(7):
+        bucket.acquire()
+    # 2 from the burst, then 5 at 50 per second
+    assert time.monotonic() - started == pytest.approx(0.1, abs=0.05)
+
+
+def test_bucket_caps_a_batch_at_the_burst():
+    bucket = drive_scheduler.TokenBucket(rate=100, burst=5)
+    bucket.acquire(5)
+    assert bucket.acquire(50) == pytest.approx(0.05, abs=0.02)
+
+
+def test_bucket_with_no_rate_never_waits():
+    bucket = drive_scheduler.TokenBucket(rate=0, burst=1)
+    assert sum(bucket.acquire() for _ in range(100)) == 0
+
+
+def test_single_flight_shares_one_call():
+    flights = drive_scheduler.SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def slow_call():
+        calls.append(1)
+        release.wait(5)
+        return "content"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flights.do("key", slow_call))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert sorted(results) == [("content", False)] + [("content", True)] * 4
+
+
+def test_single_flight_shares_the_error_and_then_forgets_it():
+    flights = drive_scheduler.SingleFlight()
+
+    def failing_call():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        flights.do("key", failing_call)
+    assert flights.do("key", lambda: "later") == ("later", False)
+
+
+def test_scheduler_retries_rate_limits_but_not_other_errors(monkeypatch):
+    # the backoff factor is read when the scheduler is made
+    monkeypatch.setattr(drive_scheduler, "RETRY_BASE", 0.001)
+    scheduler = drive_scheduler.DriveScheduler(rate=0, max_tries=3)
+    drive = fake_drive.FakeDrive()
+    file_id = drive.create_file("a.pdf", drive.root_id)
+    drive.fail_calls(403, count=2, reason="userRateLimitExceeded")
+    assert scheduler.call(None, lambda: drive.files().get(fileId=file_id).execute())["id"] == file_id
+    assert scheduler.stats()["retries"] == 2
+
+    drive.fail_calls(403, count=1, reason="insufficientFilePermissions")
+    with pytest.raises(fake_drive.FakeHttpError):
+        scheduler.call(None, lambda: drive.files().get(fileId=file_id).execute())
+    assert scheduler.stats()["retries"] == 2
+
+
+def test_is_retryable():
+    assert drive_scheduler.is_retryable(fake_drive.FakeHttpError(429))
+    assert drive_scheduler.is_retryable(fake_drive.FakeHttpError(503))
+    assert drive_scheduler.is_retryable(fake_drive.FakeHttpError(403, "rateLimitExceeded"))
+    assert not drive_scheduler.is_retryable(fake_drive.FakeHttpError(403, "forbidden"))
+    assert not drive_scheduler.is_retryable(fake_drive.FakeHttpError(404))
+    assert drive_scheduler.is_retryable(ConnectionResetError())
+    assert not drive_scheduler.is_retryable(ValueError())
@@ -0,0 +1,135 @@
+"""
+The incremental drive sync and the batched calls, against fake_drive.
+
+Run it from this folder:
+
+    python -m pytest -q test_drive_sync.py
+"""
+import pytest
+
+import drive_batch
+import drive_sync
+import fake_drive
+
+
+@pytest.fixture
+def drive():
+    drive = fake_drive.FakeDrive()
+    dtu = drive.create_folder("DTU", drive.root_id)
+    maths = drive.create_folder("maths", dtu)
+    drive.create_file("$$SYSTEM$$Syllabus.pdf", maths, b"units 1 to 5")
+    return drive
+
+
+@pytest.fixture
+def state_path(tmp_path):
+    return str(tmp_path / "drive_index.json")
+
+
+def _synced(drive, state_path):
+    """A first, full sync; returns the index."""
+    index, changed = drive_sync.sync(drive, drive.root_id, path=state_path)
+    assert changed == -1
+    return index
+
+
+def test_first_sync_walks_the_tree(drive, state_path):
+    index = _synced(drive, state_path)
+    assert index.get_id("DTU/maths/$$SYSTEM$$Syllabus.pdf") is not None
+
+
+def test_changes_apply_an_upsert(drive, state_path):
+    index = _synced(drive, state_path)
+    maths = index.get_id("DTU/maths")
+    notes = drive.create_file("notes.pdf", maths, b"lecture 1")
+    drive.rename(index.get_id("DTU/maths/$$SYSTEM$$Syllabus.pdf"), "syllabus-2025.pdf")
+
+    index, changed = drive_sync.sync(drive, drive.root_id, path=state_path)
+    assert changed == 2
+    assert index.get_id("DTU/maths/notes.pdf") == notes
+    assert index.get_id("DTU/maths/syllabus-2025.pdf") is not None
+    assert index.get_id("DTU/maths/$$SYSTEM$$Syllabus.pdf") is None
+
+
+def test_changes_apply_a_move(drive, state_path):
+    index = _synced(drive, state_path)
+    physics = drive.create_folder("physics", index.get_id("DTU"))
+    syllabus = index.get_id("DTU/maths/$$SYSTEM$$Syllabus.pdf")
+    drive.move(syllabus, physics)
+
+    index, _ = drive_sync.sync(drive, drive.root_id, path=state_path)
+    assert index.get_id("DTU/physics/$$SYSTEM$$Syllabus.pdf") == syllabus
+    assert index.list_folder("DTU/maths") == []
+
+
+def test_changes_apply_a_trash(drive, state_path):
+    index = _synced(drive, state_path)
+    drive.trash(index.get_id("DTU/maths"))
+
+    index, changed = drive_sync.sync(drive, drive.root_id, path=state_path)
+    assert changed == 1
+    assert index.get_id("DTU/maths") is None
+    assert index.get_id("DTU/maths/$$SYSTEM$$Syllabus.pdf") is None
+
+
+def test_out_of_tree_change_still_saves_the_token(drive, state_path):
+    _synced(drive, state_path)
+    _, old_token = drive_sync.load_state(state_path)
+    elsewhere = drive.create_folder("someone else's folder", "other-root")
+    drive.create_file("unrelated.pdf", elsewhere)
+
+    index, changed = drive_sync.sync(drive, drive.root_id, path=state_path)
+    assert changed == 0
+    assert index.get_id("someone else's folder") is None
+    _, new_token = drive_sync.load_state(state_path)
+    assert new_token != old_token
+
+    # the next sync starts after those changes
+    calls = drive.calls
+    assert drive_sync.sync(drive, drive.root_id, path=state_path)[1] == 0
+    assert drive.calls == calls + 1
+
+
+def test_batch_retries_failed_parts(drive):
+    ids = [drive.create_file(f"file-{i}.pdf", drive.root_id) for i in range(5)]
+    drive.fail_parts(503, count=2)
+    requests = {file_id: drive.files().get(fileId=file_id, fields="id") for file_id in ids}
+
+    results, errors = drive_batch.execute(drive, requests, backoff_base=0)
+    assert sorted(results) == sorted(ids)
+    assert errors == {}
+    assert drive.batch_calls == 2
+
+
+def test_batch_does_not_retry_permanent_errors(drive):
+    ids = [drive.create_file(f"file-{i}.pdf", drive.root_id) for i in range(3)]
+    drive.fail_parts(404, count=1)
+    requests = {file_id: drive.files().get(fileId=file_id, fields="id") for file_id in ids}
+
+    results, errors = drive_batch.execute(drive, requests, backoff_base=0)
+    assert len(results) == 2
+    assert [drive_batch.drive_scheduler.status_of(e) for e in errors.values()] == [404]
+    assert drive.batch_calls == 1
+
+
+def test_a_partial_walk_is_not_saved(drive, state_path, monkeypatch):
+    maths = next(file_id for file_id, item in drive.files_by_id.items() if item["name"] == "maths")
+    list_page = drive._list
+
+    def failing_list(q, page_size, page_token):
+        if f"'{maths}' in parents" in q:
+            raise fake_drive.FakeHttpError(404, "listing failed")
+        return list_page(q, page_size, page_token)
+
+    monkeypatch.setattr(drive, "_list", failing_list)
+    index, changed = drive_sync.sync(drive, drive.root_id, path=state_path)
+    assert index.incomplete
+    assert index.get_id("DTU/maths/$$SYSTEM$$Syllabus.pdf") is None
+    assert drive_sync.load_state(state_path) == (None, None)
+
+    # once the folder can be listed, the next sync walks the whole tree again
+    monkeypatch.setattr(drive, "_list", list_page)
+    index, changed = drive_sync.sync(drive, drive.root_id, path=state_path)
+    assert changed == -1
+    assert not index.incomplete
+    assert index.get_id("DTU/maths/$$SYSTEM$$Syllabus.pdf") is not None
@@ -0,0 +1,69 @@
+"""
+Typo-tolerant lookups of filename_index against the real static/hierarchy.txt.
+
+Run it from this folder:
+
+    python -m pytest -q test_filename_index.py
+"""
+import os
+
+import pytest
+
+import filename_index
+
+HIERARCHY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "hierarchy.txt")
+
+
+def paths_from_hierarchy(lines):
+    """The file paths of the tree view written by DriveIndex.write_hierarchy."""
+    folders, paths = [], []
+    for line in lines:
+        indent, _, name = line.rstrip("\n").partition("├── ")
+        if not name:
+            continue
+        depth = len(indent) // 4
+        del folders[depth:]
+        # folders end with "/" or, in older files, have no extension
+        if name.endswith("/"):
+            folders.append(name.rstrip("/"))
+        elif "." in name or name.startswith("$$"):
+            paths.append("/".join(folders + [name]))
+        else:
+            folders.append(name)
+    return paths
+
+
+@pytest.fixture(scope="module")
+def index():
+    with open(HIERARCHY_FILE, "r", encoding="utf-8") as f:
+        return filename_index.FilenameIndex(paths_from_hierarchy(f))
+
+
+def _names(paths):
+    return {path.rsplit("/", 1)[-1] for path in paths}
+
+
+def test_subject_finds_correct_and_misspelt_spellings(index):
+    names = _names(index.query(subject="cad engineering drawing"))
+    assert "$$USER-NOTES$$by-tonvee_cad-engineering-drawing_lecture-1_2025-08-05_Notes-scale-size-dimentioning-system-and-rules.pdf" in names
+    assert "$$USER-NOTES$$by-unknown_cad-engneering-drawing_lecture-1-to-3_2025-08-(04-11)_Complete-Notes.pdf" in names
+    assert "$$USER-NOTES$$by-indrina_cad-engneering-drawing_lecture-3_2025-08-11_Notes-lettering-types-of-lines.pdf" in names
+    # only the folder name, cad_or_engneeringDrawing, names the subject
+    assert "$$SYSTEM$$Syllabus.pdf" in names
+
+
+def test_subject_finds_misspelt_folder(index):
+    paths = index.query(subject="electrical engineering")
+    assert any("/electrical engneering/" in path for path in paths)
+    assert any("/electrical_engneering/" in path for path in paths)
+
+
+def test_misspelt_query_finds_folder(index):
+    paths = index.query(subject="environmental chemistry")
+    assert paths
+    assert all("/Environmetal_and_green_chemistry/" in path for path in paths)
+
+
+def test_suggest_ranks_closest_word_first(index):
+    assert index.suggest("subject", "engneering")[0][0] == "engneering"
+    assert "engineering" in [word for word, _ in index.suggest("subject", "engneering")]
@@ -0,0 +1,56 @@
+"""
+The sqlite link store and its one-time import of the old links.txt.
+
+Run it from this folder:
+
+    python -m pytest -q test_link_store.py
+"""
+import pytest
+
+import link_store
+
+
+@pytest.fixture
+def links_txt(tmp_path):
+    path = tmp_path / "links.txt"
+    path.write_text(
+        "('DTU/maths/$$SYSTEM$$Syllabus.pdf', 'https://drive.google.com/file/d/a/view')\n"
+        "not a tuple\n"
+        "\n"
+        "('DTU/cad/notes.pdf', 'https://drive.google.com/file/d/b/view')\n",
+        encoding="utf-8",
+    )
+    return str(path)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "links.db")
+
+
+def test_parse_skips_unreadable_lines(links_txt):
+    assert [path for path, _ in link_store.parse_links_txt(links_txt)] == [
+        "DTU/maths/$$SYSTEM$$Syllabus.pdf", "DTU/cad/notes.pdf"]
+
+
+def test_migration_runs_once(links_txt, db_path):
+    assert link_store.migrate_links_txt(links_txt, db_path) == 2
+    assert link_store.migrate_links_txt(links_txt, db_path) == 0
+    assert link_store.get_link("DTU/cad/notes.pdf", db_path) == "https://drive.google.com/file/d/b/view"
+
+
+def test_migration_keeps_links_already_stored(links_txt, db_path):
+    link_store.put_links([("DTU/cad/notes.pdf", "b", "https://new-link")], db_path)
+    assert link_store.migrate_links_txt(links_txt, db_path) == 1
+    assert link_store.get_link("DTU/cad/notes.pdf", db_path) == "https://new-link"
+
+
+def test_other_databases_do_not_import_links_txt(db_path):
+    # static/links.txt only goes into the store at LINK_DB
+    assert link_store.get_links(["DTU/maths/$$SYSTEM$$Syllabus.pdf"], db_path) == {}
+
+
+def test_put_links_updates_and_skips_empty_links(db_path):
+    assert link_store.put_links([("a.pdf", "1", "https://one"), ("b.pdf", "2", None)], db_path) == 1
+    link_store.put_links([("a.pdf", "1", "https://two")], db_path)
+    assert link_store.get_links(["a.pdf", "b.pdf"], db_path) == {"a.pdf": "https://two"}
@@ -0,0 +1,48 @@
+"""
+The hierarchy block of prompt_context: folders, empty folders and truncation.
+
+Run it from this folder:
+
+    python -m pytest -q test_prompt_context.py
+"""
+import io
+
+import drive_index
+import fake_drive
+import prompt_context
+
+
+def _hierarchy(drive):
+    tree = io.StringIO()
+    drive_index.DriveIndex.build(drive, drive.root_id).write_hierarchy(f=tree)
+    return tree.getvalue().splitlines()
+
+
+def test_folders_end_with_a_slash():
+    drive = fake_drive.FakeDrive()
+    dtu = drive.create_folder("DTU", drive.root_id)
+    maths = drive.create_folder("maths", dtu)
+    drive.create_file("$$SYSTEM$$Syllabus.pdf", maths)
+    drive.create_folder("books", dtu)
+    drive.create_file("README.txt", drive.root_id)
+
+    collapsed = prompt_context.collapse_hierarchy(_hierarchy(drive))
+    assert collapsed == ["  README.txt", "DTU/maths/", "  $$SYSTEM$$Syllabus.pdf", "DTU/books/"]
+
+
+def test_older_hierarchy_files_still_collapse():
+    lines = ["├── DTU", "    ├── maths", "        ├── notes.pdf", "    ├── timetable.json"]
+    assert prompt_context.collapse_hierarchy(lines) == ["DTU/", "  timetable.json", "DTU/maths/", "  notes.pdf"]
+
+
+def test_cut_hierarchy_points_to_the_tools():
+    lines = [f"  notes-{i}.pdf" for i in range(200)]
+    text, tokens = prompt_context.fit_lines(lines, 150, header="Available files:", more=prompt_context.HIERARCHY_MORE)
+    assert tokens <= 150
+    assert "reload_hierarchy" in text.splitlines()[-1]
+    assert text.splitlines()[-1].startswith(f"... {200 - (len(text.splitlines()) - 2)} more lines not shown")
+
+
+def test_nothing_is_added_when_everything_fits():
+    text, _ = prompt_context.fit_lines(["a", "b"], 100, more=prompt_context.HIERARCHY_MORE)
+    assert text == "a\nb"
@@ -0,0 +1,124 @@
+"""
+On-disk cache of text extracted from Drive files.
+
+Entries are keyed by the Drive file id plus a version string (the file's
+md5Checksum, or its modifiedTime for Google Docs that have no checksum), so
+an edited file simply misses the cache. The cache is shared by every gunicorn
+worker on the machine:
+
+- entries are written to a temporary file and renamed into place, so readers
+  never see half-written text;
+- a read bumps the entry's mtime, which is what LRU eviction goes by;
+- eviction holds an exclusive lock file so only one worker trims at a time.
+"""
+import hashlib
+import os
+import tempfile
+
+try:
+    import fcntl
+except ImportError:  # Windows: eviction still works, just without the lock
+    fcntl = None
+
+CACHE_DIR = os.getenv("TEXT_CACHE_DIR", "cache/text")
+MAX_BYTES = int(os.getenv("TEXT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+def cache_key(file_id, version):
+    """Returns the content address for one version of one file."""
+    return hashlib.sha256(f"{file_id}:{version}".encode("utf-8")).hexdigest()
+
+
+def _entry_path(file_id, version, cache_dir):
+    return os.path.join(cache_dir, cache_key(file_id, version) + ".txt")
+
+
+def get(file_id, version, cache_dir=CACHE_DIR):
+    """
+    Looks up the extracted text of a file version.
+
+    Args:
+        file_id (str): The Drive file id.
+        version (str): The md5Checksum or modifiedTime of the file.
+        cache_dir (str): The cache directory.
+
+    Returns:
+        str: The cached text, or None on a miss.
+    """
+    path = _entry_path(file_id, version, cache_dir)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+    except (FileNotFoundError, UnicodeDecodeError):
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass  # evicted by another worker right after we read it
+    return text
+
+
+def put(file_id, version, text, cache_dir=CACHE_DIR, max_bytes=MAX_BYTES):
+    """
+    Stores the extracted text of a file version and trims the cache if needed.
+
+    Args:
+        file_id (str): The Drive file id.
+        version (str): The md5Checksum or modifiedTime of the file.
+        text (str): The extracted text.
+        cache_dir (str): The cache directory.
+        max_bytes (int): The most bytes the cache may hold on disk.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, _entry_path(file_id, version, cache_dir))
+    except OSError as e:
+        print(f"Could not write the text cache entry for {file_id}: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return
+    evict(cache_dir, max_bytes)
+
+
+def evict(cache_dir=CACHE_DIR, max_bytes=MAX_BYTES):
+    """
+    Deletes least recently used entries until the cache fits in max_bytes.
+
+    Returns:
+        int: The number of entries deleted.
+    """
+    entries = []
+    total = 0
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith(".txt"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+    if total <= max_bytes:
+        return 0
+
+    with open(os.path.join(cache_dir, ".lock"), "w") as lock:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return 0  # another worker is already trimming
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        return removed
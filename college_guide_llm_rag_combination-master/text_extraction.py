@@ -0,0 +1,179 @@
+"""
+PDF and DOCX text extraction in a process pool.
+
+pypdf and python-docx are pure Python, so parsing a large scanned-notes PDF
+in the request thread holds the GIL for the whole parse and stalls every
+other request in the worker. Here the parsing runs in separate processes:
+
+- a PDF is written once to a temporary file and split into runs of pages;
+  each run is parsed by a pool process, which opens the document once and
+  keeps its reader for the next runs, so the bytes are not sent and the
+  document is not parsed again for every run;
+- pages are streamed back in order as their run finishes and joined once;
+- with a page or character budget, no more runs are started once the budget
+  is reached.
+
+If the pool cannot be started, the same code runs in the calling thread.
+"""
+import hashlib
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+PROCESS_WORKERS = int(os.getenv("EXTRACT_PROCESSES", str(min(4, os.cpu_count() or 1))))
+PAGES_PER_TASK = int(os.getenv("EXTRACT_PAGES_PER_TASK", "8"))
+# PDF readers each process keeps open between runs of pages
+READERS_PER_PROCESS = 2
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    """Starts the process pool on first use; returns None if that is not possible."""
+    global _pool
+    with _pool_lock:
+        if _pool is None and PROCESS_WORKERS > 0:
+            try:
+                # spawn, not fork: forking a threaded web worker can deadlock
+                _pool = ProcessPoolExecutor(max_workers=PROCESS_WORKERS,
+                                            mp_context=multiprocessing.get_context("spawn"))
+            except Exception as e:
+                print(f"Could not start the extraction process pool, extracting in-thread: {e}")
+                return None
+        return _pool
+
+
+def _reset_pool(broken):
+    """Drops a broken pool so the next call starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False)
+
+
+def _submit(func, *args):
+    """Runs func in the pool and returns a callable giving its result."""
+    pool = _get_pool()
+    if pool is not None:
+        try:
+            future = pool.submit(func, *args)
+        except (BrokenProcessPool, RuntimeError) as e:
+            print(f"Extraction process pool unavailable, extracting in-thread: {e}")
+            _reset_pool(pool)
+        else:
+            def _result():
+                try:
+                    return future.result()
+                except BrokenProcessPool as e:  # e.g. a pool process was killed
+                    print(f"Extraction process pool broke, extracting in-thread: {e}")
+                    _reset_pool(pool)
+                    return func(*args)
+            return _result
+    result = func(*args)
+    return lambda: result
+
+
+# --- functions run inside the pool processes ---
+# digest of the PDF -> its PdfReader, least recently used first
+_readers = OrderedDict()
+
+
+def _pdf_reader(digest, path):
+    """The reader of the PDF at path, parsed once per process and kept for its next runs."""
+    reader = _readers.pop(digest, None)
+    if reader is None:
+        from pypdf import PdfReader
+        # pypdf reads the whole file into memory, so the file may be removed afterwards
+        reader = PdfReader(path)
+    _readers[digest] = reader
+    while len(_readers) > READERS_PER_PROCESS:
+        _readers.popitem(last=False)
+    return reader
+
+
+def _pdf_page_count(digest, path):
+    return len(_pdf_reader(digest, path).pages)
+
+
+def _pdf_pages(digest, path, start, stop):
+    reader = _pdf_reader(digest, path)
+    # 'or ""' handles pages with no extractable text
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def _docx_text(raw_data):
+    from docx import Document
+    document = Document(io.BytesIO(raw_data))
+    return "\n".join(p.text for p in document.paragraphs)
+
+
+# --- API used by file_management_base ---
+def iter_pdf_pages(raw_data, max_pages=None):
+    """
+    Yields the text of each PDF page, in order, as soon as it is available.
+
+    At most one run of pages per pool process is in flight, so a consumer
+    that stops early does not leave the rest of the document being parsed.
+
+    Args:
+        raw_data (bytes): The PDF file.
+        max_pages (int, optional): Stop after this many pages.
+    """
+    # the pool processes get the file's path, not a copy of its bytes per run
+    digest = hashlib.sha256(raw_data).hexdigest()
+    fd, path = tempfile.mkstemp(prefix="extract_", suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(raw_data)
+        page_count = _submit(_pdf_page_count, digest, path)()
+        if max_pages is not None:
+            page_count = min(page_count, max_pages)
+
+        runs = [(start, min(start + PAGES_PER_TASK, page_count)) for start in range(0, page_count, PAGES_PER_TASK)]
+        window = max(1, PROCESS_WORKERS)
+        in_flight = [_submit(_pdf_pages, digest, path, start, stop) for start, stop in runs[:window]]
+        next_run = len(in_flight)
+        while in_flight:
+            pages = in_flight.pop(0)()
+            if next_run < len(runs):
+                in_flight.append(_submit(_pdf_pages, digest, path, *runs[next_run]))
+                next_run += 1
+            yield from pages
+    finally:
+        os.remove(path)
+
+
+def extract_pdf_text(raw_data, max_pages=None, max_chars=None):
+    """
+    Extracts the text of a PDF in the process pool.
+
+    Args:
+        raw_data (bytes): The PDF file.
+        max_pages (int, optional): Only read this many pages.
+        max_chars (int, optional): Stop once this many characters are extracted.
+
+    Returns:
+        str: The text of the pages joined together.
+    """
+    pages = []
+    total = 0
+    for text in iter_pdf_pages(raw_data, max_pages=max_pages):
+        pages.append(text)
+        total += len(text)
+        if max_chars is not None and total >= max_chars:
+            break
+    text_content = "".join(pages)
+    return text_content[:max_chars] if max_chars is not None else text_content
+
+
+def extract_docx_text(raw_data, max_chars=None):
+    """Extracts the paragraphs of a DOCX file in the process pool."""
+    text_content = _submit(_docx_text, raw_data)()
+    return text_content[:max_chars] if max_chars is not None else text_content
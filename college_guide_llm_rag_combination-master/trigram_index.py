@@ -0,0 +1,69 @@
+"""
+Character-trigram index for typo-tolerant word lookups.
+
+Folder and file names in the drive are hand typed ('engneering',
+'Environmetal', ...), and so are the subject and user names the model passes
+on from the student. Each known word is split into padded trigrams once; a
+lookup counts shared trigrams through the posting lists and ranks candidates
+by the Dice coefficient, 2 * shared / (grams in query + grams in word).
+"""
+from collections import Counter, defaultdict
+
+
+def trigrams(word):
+    """Padded trigrams, so short words and word starts weigh in: 'cad' -> '  c', ' ca', 'cad', 'ad '."""
+    padded = f"  {word.lower()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """A vocabulary of words searchable by trigram similarity."""
+
+    def __init__(self, words=()):
+        self.words = []
+        self._ids = {}
+        self._gram_counts = []
+        self._postings = defaultdict(list)
+        for word in words:
+            self.add(word)
+
+    def __len__(self):
+        return len(self.words)
+
+    def add(self, word):
+        """Adds a word to the vocabulary (once) and returns its id."""
+        word = word.lower()
+        if word in self._ids:
+            return self._ids[word]
+        word_id = len(self.words)
+        self._ids[word] = word_id
+        self.words.append(word)
+        grams = trigrams(word)
+        self._gram_counts.append(len(grams))
+        for gram in grams:
+            self._postings[gram].append(word_id)
+        return word_id
+
+    def search(self, query, limit=3, min_similarity=0.5):
+        """
+        Finds the known words most similar to query.
+
+        Args:
+            query (str): The word to look up.
+            limit (int): The most candidates to return.
+            min_similarity (float): The lowest Dice score to accept, 0 to 1.
+
+        Returns:
+            list[tuple[str, float]]: (word, score) pairs, best first.
+        """
+        grams = trigrams(query)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+        scored = []
+        for word_id, count in shared.items():
+            score = 2 * count / (len(grams) + self._gram_counts[word_id])
+            if score >= min_similarity:
+                scored.append((score, self.words[word_id]))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [(word, score) for score, word in scored[:limit]]